@@ -0,0 +1,131 @@
+############################################################################
+#  This Python file is part of PyFEM, the code that accompanies the book:  #
+#                                                                          #
+#    'Non-Linear Finite Element Analysis of Solids and Structures'         #
+#    R. de Borst, M.A. Crisfield, J.J.C. Remmers and C.V. Verhoosel        #
+#    John Wiley and Sons, 2012, ISBN 978-0470666449                        #
+#                                                                          #
+#  The code is written by J.J.C. Remmers, C.V. Verhoosel and R. de Borst.  #
+#                                                                          #
+#  The latest stable version can be downloaded from the web-site:          #
+#     http://www.wiley.com/go/deborst                                      #
+#                                                                          #
+#  A github repository, with the most up to date version of the code,      #
+#  can be found here:                                                      #
+#     https://github.com/jjcremmers/PyFEM                                  #
+#                                                                          #
+#  The code is open source and intended for educational and scientific     #
+#  purposes only. If you use PyFEM in your research, the developers would  #
+#  be grateful if you could cite the book.                                 #  
+#                                                                          #
+#  Disclaimer:                                                             #
+#  The authors reserve all rights but do not guarantee that the code is    #
+#  free from errors. Furthermore, the authors shall not be liable in any   #
+#  event caused by the use of the program.                                 #
+############################################################################
+#  Description: Compares the assembly of the tangent stiffness matrix in   #
+#               pyfem.fem.Assembly with the original implementation, in    #
+#               which the triplet arrays were grown with numpy.append.     #
+#                                                                          #
+#  Use:         python AssemblyBenchmark.py [nElem1 nElem2 ...]            #
+#               The original implementation is only timed for meshes up    #
+#               to maxLegacy elements, since its cost grows quadratically. #
+############################################################################
+
+from meshGenerator import createQuadMeshBySize
+
+from pyfem.fem.Assembly        import assembleTangentStiffness
+from pyfem.util.dataStructures import elementData
+
+from numpy import zeros, append, repeat, array
+from scipy.sparse import coo_matrix
+from scipy.sparse.linalg import norm
+
+import sys,time
+
+maxLegacy = 10000
+
+#-------------------------------------------------------------------------------
+#  Original assembly of the tangent stiffness matrix
+#-------------------------------------------------------------------------------
+
+def legacyAssembleTangentStiffness( props , globdat ):
+
+  nDof = len(globdat.dofs)
+  B    = zeros( nDof )
+
+  val  = array([],dtype=float)
+  row  = array([],dtype=int)
+  col  = array([],dtype=int)
+
+  globdat.resetNodalOutput()
+
+  for elementGroup in globdat.elements.iterGroupNames():
+    el_props = getattr( props, elementGroup )
+
+    for iElm,element in enumerate(globdat.elements.iterElementGroup( elementGroup )):
+      el_nodes = element.getNodes()
+      el_dofs  = globdat.dofs.getForTypes( el_nodes , element.dofTypes )
+
+      elemdat = elementData( globdat.state[el_dofs] , globdat.Dstate[el_dofs] )
+
+      elemdat.coords = globdat.nodes.getNodeCoords( el_nodes )
+      elemdat.nodes  = el_nodes
+      elemdat.props  = el_props
+      elemdat.iElm   = iElm
+
+      element.globdat = globdat
+      element.mat.reset()
+
+      element.getTangentStiffness( elemdat )
+
+      row = append(row,repeat(el_dofs,len(el_dofs)))
+
+      for i in range(len(el_dofs)):
+        col=append(col,el_dofs)
+
+      val = append(val,elemdat.stiff.reshape(len(el_dofs)*len(el_dofs)))
+
+      B[el_dofs] += elemdat.fint
+
+  return coo_matrix((val,(row,col)), shape=(nDof,nDof)),B
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+def timeIt( func , props , globdat ):
+
+  t0  = time.perf_counter()
+  K,f = func( props , globdat )
+  
+  return time.perf_counter()-t0 , K.tocsr()
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+if len(sys.argv) > 1:
+  sizes = [ int(n) for n in sys.argv[1:] ]
+else:
+  sizes = [ 1000 , 10000 , 100000 , 1000000 ]
+
+print('   nElem |   nDof    | legacy [s] | current [s] | speedup | rel.diff')
+print('-'*72)
+
+for nElem in sizes:
+  props,globdat = createQuadMeshBySize( nElem )
+
+  globdat.state[:] = 1.0e-3
+
+  tNew,Knew = timeIt( assembleTangentStiffness , props , globdat )
+
+  print(' %7i | %9i |' % ( len(globdat.elements) , len(globdat.dofs) ), end=' ')
+
+  if len(globdat.elements) <= maxLegacy:
+    tOld,Kold = timeIt( legacyAssembleTangentStiffness , props , globdat )
+    diff      = norm( Knew - Kold ) / norm( Kold )
+    
+    print('%10.3f | %11.3f | %7.1f | %8.1e' % ( tOld , tNew , tOld/tNew , diff ))
+  else:
+    print('%10s | %11.3f | %7s | %8s' % ( '-' , tNew , '-' , '-' ))
@@ -0,0 +1,326 @@
+############################################################################
+#  This Python file is part of PyFEM, the code that accompanies the book:  #
+#                                                                          #
+#    'Non-Linear Finite Element Analysis of Solids and Structures'         #
+#    R. de Borst, M.A. Crisfield, J.J.C. Remmers and C.V. Verhoosel        #
+#    John Wiley and Sons, 2012, ISBN 978-0470666449                        #
+#                                                                          #
+#  The code is written by J.J.C. Remmers, C.V. Verhoosel and R. de Borst.  #
+#                                                                          #
+#  The latest stable version can be downloaded from the web-site:          #
+#     http://www.wiley.com/go/deborst                                      #
+#                                                                          #
+#  A github repository, with the most up to date version of the code,      #
+#  can be found here:                                                      #
+#     https://github.com/jjcremmers/PyFEM                                  #
+#                                                                          #
+#  The code is open source and intended for educational and scientific     #
+#  purposes only. If you use PyFEM in your research, the developers would  #
+#  be grateful if you could cite the book.                                 #
+#                                                                          #
+#  Disclaimer:                                                             #
+#  The authors reserve all rights but do not guarantee that the code is    #
+#  free from errors. Furthermore, the authors shall not be liable in any   #
+#  event caused by the use of the program.                                 #
+############################################################################
+#  Description: Checks pyfem.fem.Constrainer against the original          #
+#               implementation, in which C was built with a loop over all  #
+#               dofs, for constraints with two labels, a dof that is       #
+#               prescribed twice and ties between dofs. The constrained    #
+#               matrices, vectors and solutions are compared. Next, the    #
+#               factorization of DofSpace.factorize is checked: it has to  #
+#               be reused for the same matrix and recomputed after an      #
+#               in-place change of K.data and after a change of the tie    #
+#               factors. Changed load factors do not require a new         #
+#               factorization.                                             #
+#                                                                          #
+#  Use:         python ConstrainerCheck.py [nElem]                         #
+#               The script exits with status 1 when a check fails.         #
+############################################################################
+
+from meshGenerator import createQuadMesh
+
+from pyfem.fem.Assembly        import assembleTangentStiffness
+from pyfem.fem.Constrainer     import Constrainer
+from pyfem.util.fileParser     import nodeTable
+
+from numpy import array, zeros, column_stack
+from numpy.linalg import norm
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.linalg import spsolve
+from scipy.sparse.linalg import norm as sparseNorm
+
+import sys
+
+tol = 1.0e-10
+
+#-------------------------------------------------------------------------------
+#  Original constrainer, in which C is built with a loop over all dofs
+#-------------------------------------------------------------------------------
+
+class LegacyConstrainer:
+
+  def __init__( self , nDofs ):
+
+    self.nDofs           = nDofs
+    self.constrainData   = {}
+
+    self.constrainedDofs = {}
+    self.constrainedVals = {}
+    self.constrainedFac  = {}
+
+  def addLabel( self , label ):
+
+    self.constrainedDofs[label] = []
+    self.constrainedVals[label] = []
+    self.constrainedFac [label] = 1.0
+
+  def addConstraint( self , dofID , val , label ):
+
+    self.constrainData[dofID] = val
+
+    if dofID in self.constrainedDofs[label]:
+      idx = self.constrainedDofs[label].index(dofID)
+      self.constrainedVals[label][idx] = val
+      return
+
+    self.constrainedDofs[label].append( dofID )
+
+    if type(val) is list:
+      if len(val) == 3:
+        self.constrainedVals[label].append( val[0] )
+    else:
+      self.constrainedVals[label].append( val )
+
+    if type(val) is list:
+      if len(val) == 3:
+        self.constrainData[val[1]] = "S"
+
+  def flush( self ):
+
+    row = []
+    col = []
+    val = []
+
+    j = 0
+
+    for i in range(self.nDofs):
+
+      if i in self.constrainData:
+        if type(self.constrainData[i]) is not list:
+          continue
+        else:
+          slaves = self.constrainData[i]
+
+          row.append(slaves[1])
+          col.append(j)
+          val.append(slaves[2])
+
+      row.append(i)
+      col.append(j)
+      val.append(1.)
+
+      j+=1
+
+    self.C = coo_matrix((val,(row,col)), shape=(self.nDofs,j))
+
+  def addConstrainedValues( self , a ):
+
+    for name in self.constrainedDofs.keys():
+      a[self.constrainedDofs[name]] += self.constrainedFac[name] * array(self.constrainedVals[name])
+
+  def solve( self , A , b ):
+
+    a = zeros( self.nDofs )
+
+    self.addConstrainedValues( a )
+
+    x = self.C * spsolve( self.C.transpose() * ( A * self.C ) , self.C.transpose() * ( b - A * a ) )
+
+    return x + a
+
+#-------------------------------------------------------------------------------
+#  Constraint tables of a mesh of nx x ny elements. The label 'Main' clamps
+#  the left edge, the label 'Pull' prescribes the displacement of the right
+#  edge in x-direction. The right bottom node is prescribed in both labels
+#  and twice in 'Pull'. With ties, the y-displacement of the other nodes of
+#  the right edge equals factor times the one of their left neighbour.
+#-------------------------------------------------------------------------------
+
+def getNodeTables( nx , ny , factor = None ):
+
+  main = nodeTable( "NodeConstraints" , "Main" )
+  pull = nodeTable( "NodeConstraints" , "Pull" )
+
+  for j in range(ny+1):
+    main.data.append( [ 'u' , j*(nx+1) , 0.0 ] )
+    main.data.append( [ 'v' , j*(nx+1) , 0.0 ] )
+    pull.data.append( [ 'u' , j*(nx+1)+nx , 0.01 ] )
+
+  main.data.append( [ 'v' , nx , 0.002 ] )
+  pull.data.append( [ 'v' , nx , 0.003 ] )
+  pull.data.append( [ 'v' , nx , 0.004 ] )
+
+  if factor is not None:
+    for j in range(1,ny+1):
+      pull.data.append( [ 'v' , j*(nx+1)+nx-1 , 0.0 , 'v' , j*(nx+1)+nx , factor ] )
+
+  return [ main , pull ]
+
+#-------------------------------------------------------------------------------
+#  Adds the constraints of the tables to the constrainer cons, as in
+#  DofSpace.createConstrainer
+#-------------------------------------------------------------------------------
+
+def addConstraints( cons , dofs , nodeTables ):
+
+  for table in nodeTables:
+    cons.addLabel( table.subLabel )
+
+    for item in table.data:
+      dofID = dofs.getForType( item[1] , item[0] )
+
+      if len(item) == 3:
+        cons.addConstraint( dofID , item[2] , table.subLabel )
+      else:
+        slaveDof = dofs.getForType( item[4] , item[3] )
+        cons.addConstraint( dofID , [ item[2] , slaveDof , item[5] ] , table.subLabel )
+
+  cons.flush()
+
+  return cons
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+failures = 0
+
+def check( name , diff ):
+
+  global failures
+
+  if diff < tol:
+    print('  %-58s OK   %8.1e' % ( name , diff ))
+  else:
+    print('  %-58s FAIL %8.1e' % ( name , diff ))
+    failures += 1
+
+def relDiff( x , y ):
+
+  return norm( x - y ) / max( norm( y ) , 1.0 )
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+if len(sys.argv) > 1:
+  nx = int(sys.argv[1])
+else:
+  nx = 20
+
+ny = max( nx // 4 , 2 )
+
+props,globdat = createQuadMesh( nx , ny , lx = 10.0 , ly = 10.0*ny/nx )
+
+dofs = globdat.dofs
+nDof = len(dofs)
+
+globdat.state[:] = 1.0e-3
+
+K,fint = assembleTangentStiffness( props , globdat )
+
+K = csr_matrix( K )
+f = globdat.fhat
+
+print('Constrainer, %i dofs' % nDof)
+
+for factor in [ None , 0.5 ]:
+
+  tables = getNodeTables( nx , ny , factor )
+
+  cons   = addConstraints( Constrainer( nDof )       , dofs , tables )
+  legacy = addConstraints( LegacyConstrainer( nDof ) , dofs , tables )
+
+  if factor is None:
+    case = 'no ties'
+  else:
+    case = 'ties'
+
+  cons.setConstrainFactor( 0.5 , "Pull" )
+  legacy.constrainedFac["Pull"] = 0.5
+
+  C = legacy.C
+
+  check( 'C, ' + case , sparseNorm( cons.C - C ) )
+  check( 'getConstrainedMatrix, ' + case , \
+         sparseNorm( cons.getConstrainedMatrix( K ) - C.transpose() * ( K * C ) ) / sparseNorm( K ) )
+  check( 'getConstrainedVector, ' + case , relDiff( cons.getConstrainedVector( f ) , C.transpose() * f ) )
+
+  x = zeros( C.shape[1] )
+  x[::3] = 1.0
+
+  check( 'getFullVector, ' + case , relDiff( cons.getFullVector( x ) , C * x ) )
+
+  a = zeros( nDof )
+  b = zeros( nDof )
+
+  cons  .addConstrainedValues( a )
+  legacy.addConstrainedValues( b )
+
+  check( 'addConstrainedValues, ' + case , relDiff( a , b ) )
+
+  dofs.cons = cons
+
+  check( 'DofSpace.solve, ' + case , relDiff( dofs.solve( K , f ) , legacy.solve( K , f ) ) )
+
+#-------------------------------------------------------------------------------
+#  Factorization
+#-------------------------------------------------------------------------------
+
+print('Factorization')
+
+f2 = zeros( nDof )
+f2[dofs.getForType( nx , 'u' )] = 1.0
+
+dofs.cons = addConstraints( Constrainer( nDof ) , dofs , getNodeTables( nx , ny , 0.5 ) )
+
+fac = dofs.factorize( K )
+
+check( 'solve' , relDiff( fac.solve( f ) , dofs.solve( K , f ) ) )
+check( 'solve with two right-hand sides' , \
+       relDiff( fac.solve( column_stack( [ f , f2 ] ) )[:,1] , dofs.solve( K , f2 ) ) )
+check( 'reused for the same matrix' , float( dofs.factorize( K ) is not fac ) )
+
+dofs.setConstrainFactor( 0.25 , "Pull" )
+
+check( 'reused after setConstrainFactor' , float( dofs.factorize( K ) is not fac ) )
+check( 'solve after setConstrainFactor' , relDiff( fac.solve( f ) , dofs.solve( K , f ) ) )
+
+K.data *= 2.0
+
+fac2 = dofs.factorize( K )
+
+check( 'recomputed after an in-place change of K.data' , float( fac2 is fac ) )
+check( 'solve after an in-place change of K.data' , relDiff( fac2.solve( f ) , dofs.solve( K , f ) ) )
+
+tables = getNodeTables( nx , ny , 0.75 )
+
+for item in tables[1].data:
+  if len(item) > 3:
+    slaveDof = dofs.getForType( item[4] , item[3] )
+    dofs.cons.addConstraint( dofs.getForType( item[1] , item[0] ) , [ item[2] , slaveDof , item[5] ] , "Pull" )
+
+dofs.cons.flush()
+
+legacy = addConstraints( LegacyConstrainer( nDof ) , dofs , tables )
+legacy.constrainedFac["Pull"] = 0.25
+
+fac3 = dofs.factorize( K )
+
+check( 'recomputed after a change of the tie factors' , float( fac3 is fac2 ) )
+check( 'solve after a change of the tie factors' , relDiff( fac3.solve( f ) , legacy.solve( K , f ) ) )
+
+if failures > 0:
+  print('%i checks failed' % failures)
+  sys.exit(1)
@@ -0,0 +1,118 @@
+############################################################################
+#  This Python file is part of PyFEM, the code that accompanies the book:  #
+#                                                                          #
+#    'Non-Linear Finite Element Analysis of Solids and Structures'         #
+#    R. de Borst, M.A. Crisfield, J.J.C. Remmers and C.V. Verhoosel        #
+#    John Wiley and Sons, 2012, ISBN 978-0470666449                        #
+#                                                                          #
+#  The code is written by J.J.C. Remmers, C.V. Verhoosel and R. de Borst.  #
+#                                                                          #
+#  The latest stable version can be downloaded from the web-site:          #
+#     http://www.wiley.com/go/deborst                                      #
+#                                                                          #
+#  A github repository, with the most up to date version of the code,      #
+#  can be found here:                                                      #
+#     https://github.com/jjcremmers/PyFEM                                  #
+#                                                                          #
+#  The code is open source and intended for educational and scientific     #
+#  purposes only. If you use PyFEM in your research, the developers would  #
+#  be grateful if you could cite the book.                                 #  
+#                                                                          #
+#  Disclaimer:                                                             #
+#  The authors reserve all rights but do not guarantee that the code is    #
+#  free from errors. Furthermore, the authors shall not be liable in any   #
+#  event caused by the use of the program.                                 #
+############################################################################
+#  Description: Compares the solvers of the linear system of a clamped     #
+#               cube of Hexa8 elements, for a series of meshes. The        #
+#               direct solver is compared with Krylov methods with         #
+#               different preconditioners. CG and MINRES use the           #
+#               symmetric incomplete factorization for ILU, BiCGSTAB the   #
+#               nonsymmetric one. For the multigrid preconditioner, the    #
+#               iteration count should not grow with the mesh size. The    #
+#               second solve has the same sparsity pattern and reuses the  #
+#               multigrid aggregates.                                      #
+#                                                                          #
+#  Use:         python LinearSolverBenchmark.py [n1 n2 ...]                #
+#               with n the number of elements in each direction. The       #
+#               direct solver is only used up to maxDirect dofs.           #
+############################################################################
+
+from meshGenerator import createCubeMesh
+
+from pyfem.fem.Assembly        import assembleTangentStiffness
+from pyfem.util.dataStructures import Properties
+
+from numpy.linalg import norm
+
+import sys,time
+
+maxDirect = 50000
+
+solvers = [ ( "cg"       , "jacobi" , None ) ,
+            ( "minres"   , "jacobi" , None ) ,
+            ( "cg"       , "ilu"    , None ) ,
+            ( "minres"   , "ilu"    , None ) ,
+            ( "bicgstab" , "ilu"    , None ) ,
+            ( "cg"       , "amg"    , "jacobi" ) ,
+            ( "cg"       , "amg"    , "gaussseidel" ) ]
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+def timeIt( globdat , K ):
+
+  t0 = time.perf_counter()
+  x  = globdat.dofs.solve( K , globdat.fhat )
+
+  return time.perf_counter()-t0 , x
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+if len(sys.argv) > 1:
+  sizes = [ int(n) for n in sys.argv[1:] ]
+else:
+  sizes = [ 8 , 12 , 16 , 20 , 24 ]
+
+print('     n |   dofs | solver                 | 1st solve [s] | 2nd solve [s] | iterations | rel.diff')
+print('-'*98)
+
+for n in sizes:
+  props,globdat = createCubeMesh( n )
+
+  K,fint = assembleTangentStiffness( props , globdat )
+
+  nDof = len(globdat.dofs)
+  xRef = None
+
+  if nDof <= maxDirect:
+    tDirect,xRef = timeIt( globdat , K )
+
+    print(' %5i | %6i | %-22s | %13.3f | %13s | %10s | %8s' % ( n , nDof , 'direct' , tDirect , '-' , '-' , '-' ) )
+
+  for solverType,preconditioner,smoother in solvers:
+    solverProps = Properties( { 'type' : solverType , 'preconditioner' : preconditioner , \
+                                'tol' : 1.0e-8 , 'maxIter' : 2000 , 'warmStart' : False } )
+
+    if smoother is not None:
+      solverProps.smoother = smoother
+
+    globdat.dofs.setLinearSolver( solverProps )
+
+    t1,x = timeIt( globdat , K )
+    t2,x = timeIt( globdat , K )
+
+    if xRef is None:
+      diff = '-'
+    else:
+      diff = '%8.1e' % ( norm( x - xRef ) / norm( xRef ) )
+
+    name = preconditioner if smoother is None else preconditioner + '/' + smoother
+
+    print(' %5i | %6i | %-22s | %13.3f | %13.3f | %10i | %8s' % \
+      ( n , nDof , solverType + '+' + name , t1 , t2 , globdat.dofs.linearSolver.iterations , diff ) )
+
+  print('-'*98)
@@ -0,0 +1,102 @@
+############################################################################
+#  This Python file is part of PyFEM, the code that accompanies the book:  #
+#                                                                          #
+#    'Non-Linear Finite Element Analysis of Solids and Structures'         #
+#    R. de Borst, M.A. Crisfield, J.J.C. Remmers and C.V. Verhoosel        #
+#    John Wiley and Sons, 2012, ISBN 978-0470666449                        #
+#                                                                          #
+#  The code is written by J.J.C. Remmers, C.V. Verhoosel and R. de Borst.  #
+#                                                                          #
+#  The latest stable version can be downloaded from the web-site:          #
+#     http://www.wiley.com/go/deborst                                      #
+#                                                                          #
+#  A github repository, with the most up to date version of the code,      #
+#  can be found here:                                                      #
+#     https://github.com/jjcremmers/PyFEM                                  #
+#                                                                          #
+#  The code is open source and intended for educational and scientific     #
+#  purposes only. If you use PyFEM in your research, the developers would  #
+#  be grateful if you could cite the book.                                 #  
+#                                                                          #
+#  Disclaimer:                                                             #
+#  The authors reserve all rights but do not guarantee that the code is    #
+#  free from errors. Furthermore, the authors shall not be liable in any   #
+#  event caused by the use of the program.                                 #
+############################################################################
+#  Description: Strong scaling of the parallel assembly of the tangent     #
+#               stiffness matrix with the ProcessPoolAssembler. The mesh   #
+#               size is fixed and the number of processes is increased.    #
+#               The time of the first assembly, in which the worker        #
+#               processes are started, is reported separately.             #
+#                                                                          #
+#  Use:         python ParallelAssemblyBenchmark.py [nElem [nProcs1 ...]]  #
+############################################################################
+
+from meshGenerator import createQuadMeshBySize
+
+from pyfem.fem.Assembly        import assembleTangentStiffness
+from pyfem.util.dataStructures import Properties
+
+from scipy.sparse.linalg import norm
+
+import sys,time,os
+
+nRepeat = 5
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+def timeIt( props , globdat ):
+
+  t0  = time.perf_counter()
+  K,f = assembleTangentStiffness( props , globdat )
+  
+  return time.perf_counter()-t0 , K
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+if len(sys.argv) > 1:
+  nElem = int(sys.argv[1])
+else:
+  nElem = 100000
+
+if len(sys.argv) > 2:
+  procs = [ int(n) for n in sys.argv[2:] ]
+else:
+  procs = [ 2**i for i in range(8) if 2**i <= os.cpu_count() ]
+
+props,globdat = createQuadMeshBySize( nElem )
+
+globdat.state[:] = 1.0e-3
+
+print('Mesh with %i elements and %i dofs, %i cpus' % ( len(globdat.elements) , len(globdat.dofs) , os.cpu_count() ) )
+print()
+
+Kserial = timeIt( props , globdat )[1]
+tSerial = min( [ timeIt( props , globdat )[0] for i in range(nRepeat) ] )
+
+print('  nProcs | startup [s] | assembly [s] | speedup | efficiency | rel.diff | repeatable')
+print('-'*86)
+print(' %7s | %11s | %12.3f | %7.2f | %10.2f | %8s | %10s' % ( 'serial' , '-' , tSerial , 1.0 , 1.0 , '-' , '-' ) )
+
+props.solver = Properties( { 'assembly' : Properties() } )
+
+for nProcs in procs:
+  props.solver.assembly.type   = "ProcessPoolAssembler"
+  props.solver.assembly.nProcs = nProcs
+
+  tStart,K0 = timeIt( props , globdat )
+
+  K    = timeIt( props , globdat )[1]
+  tPar = min( [ timeIt( props , globdat )[0] for i in range(nRepeat) ] )
+
+  diff       = norm( K - Kserial ) / norm( Kserial )
+  repeatable = ( K0 != K ).nnz == 0
+
+  print(' %7i | %11.3f | %12.3f | %7.2f | %10.2f | %8.1e | %10s' % \
+    ( nProcs , tStart , tPar , tSerial/tPar , tSerial/tPar/nProcs , diff , repeatable ) )
+
+  globdat.assembler.close()
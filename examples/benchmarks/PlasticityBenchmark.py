@@ -0,0 +1,133 @@
+############################################################################
+#  This Python file is part of PyFEM, the code that accompanies the book:  #
+#                                                                          #
+#    'Non-Linear Finite Element Analysis of Solids and Structures'         #
+#    R. de Borst, M.A. Crisfield, J.J.C. Remmers and C.V. Verhoosel        #
+#    John Wiley and Sons, 2012, ISBN 978-0470666449                        #
+#                                                                          #
+#  The code is written by J.J.C. Remmers, C.V. Verhoosel and R. de Borst.  #
+#                                                                          #
+#  The latest stable version can be downloaded from the web-site:          #
+#     http://www.wiley.com/go/deborst                                      #
+#                                                                          #
+#  A github repository, with the most up to date version of the code,      #
+#  can be found here:                                                      #
+#     https://github.com/jjcremmers/PyFEM                                  #
+#                                                                          #
+#  The code is open source and intended for educational and scientific     #
+#  purposes only. If you use PyFEM in your research, the developers would  #
+#  be grateful if you could cite the book.                                 #  
+#                                                                          #
+#  Disclaimer:                                                             #
+#  The authors reserve all rights but do not guarantee that the code is    #
+#  free from errors. Furthermore, the authors shall not be liable in any   #
+#  event caused by the use of the program.                                 #
+############################################################################
+#  Description: Compares the batched return mapping of the plasticity     #
+#               models (getStresses) with the evaluation of one material   #
+#               point at a time (getStress). The strains are taken from a  #
+#               cantilever with a tip load, which is plastic near the      #
+#               clamped end.                                               #
+#                                                                          #
+#  Use:         python PlasticityBenchmark.py [nElem1 nElem2 ...]          #
+############################################################################
+
+from meshGenerator import createQuadMeshBySize, getDefaultProps
+
+from pyfem.util.shapeFunctions  import getGroupShapeData
+from pyfem.util.kinematics      import Kinematics
+from pyfem.materials.MaterialManager import getMaterialType
+
+from numpy import array, einsum, zeros, abs
+import sys,time
+
+models = { 'IsotropicKinematicHardening'  : { 'syield' : 1.0e3 , 'hard' : 1.0e5 } ,
+           'IsotropicHardeningPlasticity' : { 'syield' : 1.0e3 , 
+                                              'EqPlasStrains' : [ 1.0e-3 , 1.0e-2 ] ,
+                                              'Stresses'      : [ 1.2e3  , 1.5e3  ] } }
+
+#-------------------------------------------------------------------------------
+#  Strains in the integration points of a cantilever that is deformed by a 
+#  tip load, with a maximum strain of eps at the clamped end.
+#-------------------------------------------------------------------------------
+
+def getCantileverStrains( nElem , eps ):
+
+  props,globdat = createQuadMeshBySize( nElem )
+
+  x  = globdat.nodes.getCoordArray()
+  L  = x[:,0].max()
+  h  = x[:,1].max()
+  c0 = 2.0*eps/h
+
+  theta = c0 * ( x[:,0] - 0.5*x[:,0]**2/L )
+
+  for iNod,nodeID in enumerate(globdat.nodes):
+    globdat.state[globdat.dofs.getForType( nodeID , 'u' )] = -theta[iNod] * ( x[iNod,1] - 0.5*h )
+    globdat.state[globdat.dofs.getForType( nodeID , 'v' )] = c0 * ( 0.5*x[iNod,0]**2 - x[iNod,0]**3/(6.0*L) )
+
+  elements  = list( globdat.elements.iterElementGroup( 'ContElem' ) )
+  groupDofs = globdat.dofs.getElementDofs( 'ContElem' )
+  coords    = globdat.nodes.getNodeCoords( array( [ element.getNodes() for element in elements ] ) )
+
+  B = elements[0].getGroupBmatrix( getGroupShapeData( coords ).dhdx )
+
+  return einsum( 'egsi,ei->egs' , B , globdat.state[groupDofs] ).reshape( -1 , 3 )
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+if len(sys.argv) > 1:
+  sizes = [ int(n) for n in sys.argv[1:] ]
+else:
+  sizes = [ 1000 , 10000 , 100000 ]
+
+print(' %28s |  nPoints | plastic | scalar [s] | batched [s] | speedup | rel.diff' % 'model' )
+print('-'*99)
+
+for matType,matValues in models.items():
+  for nElem in sizes:
+    strains = getCantileverStrains( nElem , 5.0e-3 )
+
+    matProps = getDefaultProps( matType = matType ).ContElem.material
+
+    for name,val in matValues.items():
+      setattr( matProps , name , val )
+
+    matProps.solverStat = None
+
+    material = getMaterialType( matType )( matProps )
+    points   = array( [ material.historyManager.addPoint() for i in range(len(strains)) ] )
+
+    kin = Kinematics( 2 , 3 )
+
+    t0 = time.perf_counter()
+
+    sigma = zeros( strains.shape )
+    tang  = zeros( strains.shape + (3,) )
+
+    for iPnt,point in enumerate(points):
+      kin.strain  = strains[iPnt]
+      kin.dstrain = strains[iPnt]
+
+      material.historyIndex = point
+
+      sigma[iPnt],tang[iPnt] = material.getStress( kin )
+
+    tScalar = time.perf_counter()-t0
+
+    t0 = time.perf_counter()
+
+    sigmaB,tangB = material.getStresses( strains , strains , points )
+
+    tBatched = time.perf_counter()-t0
+
+    eplas    = material.historyManager.getArray( 'eplas' , trial = True )
+    nPlastic = sum( abs( eplas ).max( axis=1 ) > 0 )
+
+    diff = max( abs( sigmaB - sigma ).max() / abs( sigma ).max() , \
+                abs( tangB  - tang  ).max() / abs( tang  ).max() )
+
+    print(' %28s | %8i | %7i | %10.3f | %11.3f | %7.1f | %8.1e' % \
+          ( matType , len(strains) , nPlastic , tScalar , tBatched , tScalar/tBatched , diff ) )
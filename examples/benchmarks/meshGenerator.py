@@ -0,0 +1,155 @@
+############################################################################
+#  This Python file is part of PyFEM, the code that accompanies the book:  #
+#                                                                          #
+#    'Non-Linear Finite Element Analysis of Solids and Structures'         #
+#    R. de Borst, M.A. Crisfield, J.J.C. Remmers and C.V. Verhoosel        #
+#    John Wiley and Sons, 2012, ISBN 978-0470666449                        #
+#                                                                          #
+#  The code is written by J.J.C. Remmers, C.V. Verhoosel and R. de Borst.  #
+#                                                                          #
+#  The latest stable version can be downloaded from the web-site:          #
+#     http://www.wiley.com/go/deborst                                      #
+#                                                                          #
+#  A github repository, with the most up to date version of the code,      #
+#  can be found here:                                                      #
+#     https://github.com/jjcremmers/PyFEM                                  #
+#                                                                          #
+#  The code is open source and intended for educational and scientific     #
+#  purposes only. If you use PyFEM in your research, the developers would  #
+#  be grateful if you could cite the book.                                 #  
+#                                                                          #
+#  Disclaimer:                                                             #
+#  The authors reserve all rights but do not guarantee that the code is    #
+#  free from errors. Furthermore, the authors shall not be liable in any   #
+#  event caused by the use of the program.                                 #
+############################################################################
+#  Description: Generators for structured meshes that are used in the      #
+#               performance benchmarks in this directory. The meshes are   #
+#               created in memory, without an input file.                  #
+############################################################################
+
+from pyfem.util.dataStructures import Properties, GlobalData
+from pyfem.util.fileParser     import nodeTable
+from pyfem.fem.NodeSet         import NodeSet
+from pyfem.fem.ElementSet      import ElementSet
+from pyfem.fem.DofSpace        import DofSpace
+
+#-------------------------------------------------------------------------------
+#  Default properties of the element group 'ContElem'
+#-------------------------------------------------------------------------------
+
+def getDefaultProps( elemType = "SmallStrainContinuum" , matType = "PlaneStrain" ):
+
+  matProps = Properties( { 'type' : matType , 'E' : 1.0e6 , 'nu' : 0.25 } )
+  
+  elemProps = Properties( { 'type' : elemType , 'material' : matProps } )
+
+  return Properties( { 'ContElem' : elemProps } )
+
+#-------------------------------------------------------------------------------
+#  Rectangular mesh of nx x ny Quad4 elements on [0,lx] x [0,ly]. The nodes
+#  at x = 0 are clamped, the nodes at x = lx are loaded in y-direction.
+#-------------------------------------------------------------------------------
+
+def createQuadMesh( nx , ny , lx = 10.0 , ly = 1.0 , props = None ):
+
+  if props is None:
+    props = getDefaultProps()
+
+  nodes = NodeSet()
+  nodes.rank = 2
+
+  for j in range(ny+1):
+    for i in range(nx+1):
+      nodes.add( j*(nx+1)+i , [ i*lx/nx , j*ly/ny ] )
+
+  elems = ElementSet( nodes , props )
+
+  for j in range(ny):
+    for i in range(nx):
+      n0 = j*(nx+1)+i
+      elems.add( j*nx+i , 'ContElem' , [ n0 , n0+1 , n0+nx+2 , n0+nx+1 ] )
+
+  dofs = DofSpace( elems )
+
+  nt = nodeTable( "NodeConstraints" )
+
+  for j in range(ny+1):
+    nt.data.append( [ 'u' , j*(nx+1) , 0.0 ] )
+    nt.data.append( [ 'v' , j*(nx+1) , 0.0 ] )
+
+  dofs.cons = dofs.createConstrainer( [ nt ] )
+
+  globdat = GlobalData( nodes , elems , dofs )
+
+  for j in range(ny+1):
+    globdat.fhat[dofs.getForType( j*(nx+1)+nx , 'v' )] = 1.0/(ny+1)
+
+  globdat.active = True
+  globdat.prefix = "benchmark"
+
+  return props , globdat
+
+#-------------------------------------------------------------------------------
+#  Quad4 mesh of a 10 x 1 strip with square elements and (about) nElem
+#  elements
+#-------------------------------------------------------------------------------
+
+def createQuadMeshBySize( nElem , props = None ):
+
+  ny = max( int( ( nElem / 10.0 )**0.5 ) , 1 )
+  nx = max( nElem // ny , 1 )
+
+  return createQuadMesh( nx , ny , lx = 10.0 , ly = 10.0*ny/nx , props = props )
+
+#-------------------------------------------------------------------------------
+#  Cube [0,l]^3 with n x n x n Hexa8 elements. The nodes at x = 0 are 
+#  clamped, the nodes at x = l are loaded in z-direction.
+#-------------------------------------------------------------------------------
+
+def createCubeMesh( n , l = 1.0 , props = None ):
+
+  if props is None:
+    props = getDefaultProps( matType = "Isotropic" )
+
+  nodes = NodeSet()
+  nodes.rank = 3
+
+  def nodeID( i , j , k ):
+    return ( k*(n+1) + j ) * (n+1) + i
+
+  for k in range(n+1):
+    for j in range(n+1):
+      for i in range(n+1):
+        nodes.add( nodeID(i,j,k) , [ i*l/n , j*l/n , k*l/n ] )
+
+  elems = ElementSet( nodes , props )
+
+  for k in range(n):
+    for j in range(n):
+      for i in range(n):
+        elems.add( (k*n+j)*n+i , 'ContElem' , \
+          [ nodeID(i,j,k)   , nodeID(i+1,j,k)   , nodeID(i+1,j+1,k)   , nodeID(i,j+1,k) , \
+            nodeID(i,j,k+1) , nodeID(i+1,j,k+1) , nodeID(i+1,j+1,k+1) , nodeID(i,j+1,k+1) ] )
+
+  dofs = DofSpace( elems )
+
+  nt = nodeTable( "NodeConstraints" )
+
+  for k in range(n+1):
+    for j in range(n+1):
+      for dofType in [ 'u' , 'v' , 'w' ]:
+        nt.data.append( [ dofType , nodeID(0,j,k) , 0.0 ] )
+
+  dofs.cons = dofs.createConstrainer( [ nt ] )
+
+  globdat = GlobalData( nodes , elems , dofs )
+
+  for k in range(n+1):
+    for j in range(n+1):
+      globdat.fhat[dofs.getForType( nodeID(n,j,k) , 'w' )] = 1.0/(n+1)**2
+
+  globdat.active = True
+  globdat.prefix = "benchmark"
+
+  return props , globdat
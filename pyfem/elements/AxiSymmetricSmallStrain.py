@@ -25,7 +25,7 @@
 ############################################################################
 
 from .Element import Element
-from pyfem.util.shapeFunctions  import getElemShapeData
+from pyfem.util.shapeFunctions  import getCachedElemShapeData
 from pyfem.util.kinematics      import Kinematics
 from numpy import zeros, dot, outer, ones , eye
 from math  import pi
@@ -50,7 +50,7 @@ class AxiSymmetricSmallStrain( Element ):
 
   def getTangentStiffness ( self, elemdat ):
 
-    sData = getElemShapeData( elemdat.coords )
+    sData = getCachedElemShapeData( self , elemdat.coords )
 
     for iData in sData:
 
@@ -86,7 +86,7 @@ class AxiSymmetricSmallStrain( Element ):
 
   def getInternalForce ( self, elemdat ):
       
-    sData = getElemShapeData( elemdat.coords )
+    sData = getCachedElemShapeData( self , elemdat.coords )
 
     for iData in sData:
     
@@ -119,7 +119,7 @@ class AxiSymmetricSmallStrain( Element ):
     
   def getMassMatrix ( self, elemdat ):
       
-    sData = getElemShapeData( elemdat.coords )
+    sData = getCachedElemShapeData( self , elemdat.coords )
 
     rho = elemdat.matprops.rho
 
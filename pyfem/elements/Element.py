@@ -24,8 +24,9 @@
 #  event caused by the use of the program.                                 #
 ############################################################################
 
-from numpy import outer, ones, zeros
+from numpy import outer, ones, zeros, bincount, repeat
 from pyfem.materials.MaterialManager import MaterialManager
+from threading import Lock
 
 #------------------------------------------------------------------------------
 #
@@ -42,17 +43,34 @@ class Element ( list ):
   def __init__ ( self, elnodes , props ):
     list.__init__( self, elnodes )
 
+    #Default values that are set by the element before calling this 
+    #constructor are overruled by the values in the group properties
+
+    for name in [ name for name in self.__dict__ if name in props.__dict__ ]:
+      setattr( self , name , getattr( props , name ) )
+
     self.history    = {}
     self.current    = {}
     self.solverStat = props.solverStat
+    self.groupProps = props
 
-    for name,val in props:
-      if name == "material":
-        self.matProps = val
-        self.matProps.solverStat = self.solverStat
-        self.mat = MaterialManager( self.matProps )
-      
-      setattr( self, name, val )
+    if hasattr( props , "material" ):
+      self.matProps = props.material
+      self.matProps.solverStat = self.solverStat
+      self.mat = MaterialManager( self.matProps )
+
+#------------------------------------------------------------------------------
+#  The properties of the element group are shared by all elements in the 
+#  group. They are not copied to each element, but looked up in the group 
+#  properties when the element has no attribute with that name.
+#------------------------------------------------------------------------------
+
+  def __getattr__ ( self, name ):
+
+    if name.startswith('__') or 'groupProps' not in self.__dict__:
+      raise AttributeError( name )
+
+    return getattr( self.__dict__['groupProps'] , name )
 
 #------------------------------------------------------------------------------
 #
@@ -82,6 +100,8 @@ class Element ( list ):
 
   def appendNodalOutput( self , labels , data , weight = 1.0 ):
 
+    indices = self.globdat.nodes.getIndices( self )
+
     for i,name in enumerate(labels):
       if not hasattr( self.globdat , name ):
         self.globdat.outputNames.append( name )
@@ -92,10 +112,40 @@ class Element ( list ):
       outMat     = getattr( self.globdat , name )
       outWeights = getattr( self.globdat , name + 'Weights' )
 
-      for idx in self.globdat.nodes.getIndices( self ):
+      for idx in indices:
         outMat[ idx ]     += data[i]
         outWeights[ idx ] += weight
 
+#------------------------------------------------------------------------------
+#  Group version of appendNodalOutput. Row e of data is added to all nodes of
+#  element e in groupdat, see pyfem.fem.Assembly. The weight is the total 
+#  weight per element, e.g. the number of integration points when data 
+#  contains the sum over the integration points.
+#------------------------------------------------------------------------------
+
+  def appendGroupNodalOutput( self , labels , groupdat , data , weight = 1.0 ):
+
+    globdat     = groupdat.globdat
+    nodeIndices = groupdat.nodeIndices
+
+    nNodes  = len(globdat.nodes)
+    indices = nodeIndices.ravel()
+
+    count = bincount( indices , minlength = nNodes )
+
+    for i,name in enumerate(labels):
+      if not hasattr( globdat , name ):
+        globdat.outputNames.append( name )
+
+        setattr( globdat, name             , zeros( nNodes ) )
+        setattr( globdat, name + 'Weights' , zeros( nNodes ) )
+
+      outMat     = getattr( globdat , name )
+      outWeights = getattr( globdat , name + 'Weights' )
+
+      outMat     += bincount( indices , weights = repeat( data[:,i] , nodeIndices.shape[1] ) , minlength = nNodes )
+      outWeights += weight * count
+
 #------------------------------------------------------------------------------
 #
 #------------------------------------------------------------------------------
@@ -110,6 +160,44 @@ class Element ( list ):
   def getHistoryParameter ( self, name ):
     return self.history[name]
 
+#------------------------------------------------------------------------------
+#  History of the elements of a group that is evaluated by the group kernels,
+#  see pyfem.fem.Assembly. The element on which the kernels are called keeps
+#  the committed and the trial values of a history parameter of all elements
+#  in the group in two arrays, which are returned. Row r belongs to the 
+#  element in row r of the group connectivity. The arrays are created on 
+#  first use, with the value initial in every row, and are committed in 
+#  commitHistory.
+#------------------------------------------------------------------------------
+
+  def getGroupHistory ( self, name , groupdat , initial ):
+
+    groupHistory = self.__dict__.setdefault( 'groupHistory' , {} )
+
+    if name not in groupHistory:
+      with historyLock:
+        if name not in groupHistory:
+          committed = repeat( [ initial ] , groupdat.groupSize , axis=0 )
+
+          groupHistory[name] = ( committed , committed.copy() )
+
+    return groupHistory[name]
+
+#------------------------------------------------------------------------------
+#
+#------------------------------------------------------------------------------
+
+  def __getstate__ ( self ):
+
+    '''The reference to globdat is not pickled, it is set again in the next
+       assembly. This keeps the element small when it is sent to a worker
+       process.'''
+
+    state = self.__dict__.copy()
+    state.pop( 'globdat' , None )
+
+    return state
+
 #------------------------------------------------------------------------------
 #
 #------------------------------------------------------------------------------
@@ -118,8 +206,21 @@ class Element ( list ):
     self.history = self.current.copy()
     self.current = {}
 
+    for committed,trial in self.__dict__.get( 'groupHistory' , {} ).values():
+      committed[:] = trial
+
     if hasattr( self , "mat" ):
       self.mat.commitHistory()
 
   def commit ( self, elemdat ):
     pass
+
+#------------------------------------------------------------------------------
+#  Group version of commit. An element that overrides commit and provides 
+#  group kernels has to override this method as well.
+#------------------------------------------------------------------------------
+
+  def commitGroup ( self, groupdat ):
+    pass
+
+historyLock = Lock()
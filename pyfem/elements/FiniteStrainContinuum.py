@@ -25,10 +25,11 @@
 ############################################################################
 
 from .Element import Element
-from pyfem.util.shapeFunctions  import getElemShapeData
+from pyfem.util.shapeFunctions  import getElemShapeData, getGroupShapeData
+from pyfem.util.shapeFunctions  import getCachedGroupShapeData
 from pyfem.util.kinematics      import Kinematics
 
-from numpy import zeros, dot, outer, ones, eye, sqrt, reshape
+from numpy import zeros, dot, outer, ones, eye, sqrt, reshape, kron, einsum, array
 from scipy.linalg import eigvals
 
 from pyfem.util.logger   import getLogger
@@ -40,6 +41,17 @@ logger = getLogger()
 #------------------------------------------------------------------------------
 
 class FiniteStrainContinuum( Element ):
+
+  #The components ( k , l ) of the strain and stress vectors per rank, in the
+  #order xx,yy,xy in 2D and xx,yy,zz,yz,xz,xy in 3D
+
+  voigtPairs = { 2 : ( array([0,1,0]) , array([0,1,1]) ) ,
+                 3 : ( array([0,1,2,1,0,0]) , array([0,1,2,2,2,1]) ) }
+
+  #The stress vector components that form the stress matrix
+
+  voigtIndices = { 2 : array([[0,2],[2,1]]) ,
+                   3 : array([[0,5,4],[5,1,3],[4,3,2]]) }
   
   def __init__ ( self, elnodes , props ):
   
@@ -114,7 +126,7 @@ class FiniteStrainContinuum( Element ):
     elemdat.state0 = elemdat.state - elemdat.Dstate
     
     sData0 = getElemShapeData( elemdat.coords )
-    sDataC = getElemShapeData( elemdat.coords + reshape(elemdat.state0,(8,3)) )
+    sDataC = getElemShapeData( elemdat.coords + reshape(elemdat.state0,elemdat.coords.shape) )
     
     elemdat.outlabel.append(self.outputLabels)
     elemdat.outdata  = zeros( shape=(len(elemdat.nodes),self.nstr) )
@@ -160,6 +172,122 @@ class FiniteStrainContinuum( Element ):
 
       self.appendNodalOutput( self.mat.outLabels() , self.mat.outData() ) 
 
+#------------------------------------------------------------------------------
+#  Group kernels, see pyfem.fem.Assembly. The deformation gradients, strains,
+#  B matrices and geometric stiffness matrices of all integration points of 
+#  the group are evaluated at once. In the total Lagrange (TL) formulation,
+#  the shape data is taken with respect to the reference configuration. In 
+#  the updated Lagrange (UL) formulation, the B matrices and the geometric 
+#  stiffness are evaluated in the configuration of the last converged step.
+#------------------------------------------------------------------------------
+
+  def getGroupTangentStiffness ( self, groupdat ):
+
+    sData0 = getCachedGroupShapeData( self , groupdat.rows , groupdat.coords )
+
+    F,strain = self.getGroupKinematics( sData0.dhdx , groupdat.state )
+
+    if self.method == "UL":
+      state0 = groupdat.state - groupdat.Dstate
+      sData  = getGroupShapeData( groupdat.coords + state0.reshape( groupdat.coords.shape ) )
+      B      = self.getGroupBmatrix( sData.dhdx )
+    else:
+      sData  = sData0
+      B      = self.getGroupBmatrix( sData.dhdx , F )
+
+    sigma,tang = self.getGroupStress( groupdat , F , strain )
+
+    wB = B * sData.weight[:,:,None,None]
+
+    if tang.ndim == 2:
+      DB = einsum( 'st,egtj->egsj' , tang , B )
+    else:
+      DB = einsum( 'egst,egtj->egsj' , tang , B )
+
+    groupdat.stiff = einsum( 'egsi,egsj->eij' , wB , DB )
+    groupdat.fint  = einsum( 'egsi,egs->ei'   , wB , sigma )
+
+    #Geometric stiffness, the product Bnl^T T Bnl is the same for each 
+    #displacement component
+
+    dphi = sData.dhdx
+
+    S = sigma[:,:,self.voigtIndices[self.rank]]
+
+    G = einsum( 'egak,egkl,egbl->eab' , dphi * sData.weight[:,:,None,None] , S , dphi , optimize = True )
+
+    nElem,nNodes = G.shape[:2]
+
+    stiff = groupdat.stiff.reshape( nElem , nNodes , self.rank , nNodes , self.rank )
+
+    for i in range(self.rank):
+      stiff[:,:,i,:,i] += G
+
+#------------------------------------------------------------------------------
+#
+#------------------------------------------------------------------------------
+
+  def getGroupInternalForce ( self, groupdat ):
+
+    sData = getCachedGroupShapeData( self , groupdat.rows , groupdat.coords )
+
+    F,strain = self.getGroupKinematics( sData.dhdx , groupdat.state )
+
+    B = self.getGroupBmatrix( sData.dhdx , F )
+
+    sigma,tang = self.getGroupStress( groupdat , F , strain )
+
+    groupdat.fint = einsum( 'egsi,egs->ei' , B * sData.weight[:,:,None,None] , sigma )
+
+#------------------------------------------------------------------------------
+#  Calls the material of every integration point in the group and stores 
+#  the material output in the nodal output fields. When the material 
+#  supports it, all points are evaluated in one call. The material points of
+#  the element in row r of the group are r*nIP,...,r*nIP+nIP-1 in the 
+#  material manager of the group.
+#------------------------------------------------------------------------------
+
+  def getGroupStress ( self, groupdat , F , strain ):
+
+    nElem,nIP = strain.shape[:2]
+
+    if self.mat.isBatched() and not self.mat.hasHistory():
+      sigma,tang,mat = self.mat.getGroupStresses( strain.reshape( nElem*nIP , self.nstr ) )
+
+      outdata = mat.outData.reshape( nElem , nIP , -1 ).sum( axis=1 )
+
+      self.appendGroupNodalOutput( mat.outLabels , groupdat , outdata , nIP )
+
+      if tang.ndim == 3:
+        tang = tang.reshape( nElem , nIP , self.nstr , self.nstr )
+
+      return sigma.reshape( nElem , nIP , self.nstr ),tang
+
+    sigma   = zeros( shape=( nElem , nIP , self.nstr ) )
+    tang    = zeros( shape=( nElem , nIP , self.nstr , self.nstr ) )
+    outdata = None
+
+    for iElm,row in enumerate(groupdat.rows):
+      for iIP in range(nIP):
+        kin = Kinematics( self.rank , self.nstr )
+
+        kin.F      = F[iElm,iIP]
+        kin.E      = 0.5*(dot(kin.F.transpose(),kin.F)-eye(self.rank))
+        kin.strain = strain[iElm,iIP]
+
+        sigma[iElm,iIP],tang[iElm,iIP],mat = self.mat.getPointStress( kin , row*nIP+iIP )
+
+        if outdata is None:
+          labels  = mat.outLabels
+          outdata = zeros( shape=( nElem , len(labels) ) )
+
+        outdata[iElm] += mat.outData[:len(labels)]
+
+    if outdata is not None:
+      self.appendGroupNodalOutput( labels , groupdat , outdata , nIP )
+
+    return sigma,tang
+
 #------------------------------------------------------------------------------
 #
 #------------------------------------------------------------------------------
@@ -184,111 +312,79 @@ class FiniteStrainContinuum( Element ):
   
     kin = Kinematics(self.rank,self.nstr)
     
-    elstate  = elemdat.state
-    elstate0 = elstate - elemdat.Dstate
+    elstate  = elemdat.state.reshape( len(dphi) , self.rank )
+    elstate0 = elstate - elemdat.Dstate.reshape( len(dphi) , self.rank )
     
-    kin.F = eye(self.rank)
-    kin.F0 = eye(self.rank)
-  
-    for i in range(len(dphi)):
-      for j in range(self.rank):
-        for k in range(self.rank):
-          kin.F[j,k] += dphi[i,k]*elstate[self.rank*i+j]
-          kin.F0[j,k] += dphi[i,k]*elstate0[self.rank*i+j]
+    kin.F  = eye(self.rank) + dot( elstate.transpose()  , dphi )
+    kin.F0 = eye(self.rank) + dot( elstate0.transpose() , dphi )
 
     kin.E = 0.5*(dot(kin.F.transpose(),kin.F)-eye(self.rank))
 
-    kin.strain[0] = kin.E[0,0]
-    kin.strain[1] = kin.E[1,1]
-
-    if self.rank == 2:
-      kin.strain[2] = 2.0*kin.E[0,1]
-    elif self.rank == 3:
-      kin.strain[2] =     kin.E[2,2]
-      kin.strain[3] = 2.0*kin.E[1,2]
-      kin.strain[4] = 2.0*kin.E[0,2]
-      kin.strain[5] = 2.0*kin.E[0,1]
+    kin.strain = self.getStrainVector( kin.E )
     
     return kin
 
+#------------------------------------------------------------------------------
+#  Group version of getKinematics. Returns the deformation gradients 
+#  ( nElem , nIP , rank , rank ) and the Green-Lagrange strain vectors 
+#  ( nElem , nIP , nstr ) for dphi ( nElem , nIP , nNodes , rank ) and the
+#  element states ( nElem , nNodes*rank ).
+#------------------------------------------------------------------------------
+
+  def getGroupKinematics( self , dphi , state ):
+
+    u = state.reshape( len(state) , -1 , self.rank )
+
+    F = eye(self.rank) + einsum( 'eaj,egak->egjk' , u , dphi )
+
+    E = 0.5*(einsum( 'egij,egik->egjk' , F , F )-eye(self.rank))
+
+    return F , self.getStrainVector( E )
+
+#------------------------------------------------------------------------------
+#  Returns the strain vector(s) of the Green-Lagrange strain tensor(s) E, 
+#  with engineering shear strains
+#------------------------------------------------------------------------------
+
+  def getStrainVector( self , E ):
+
+    k,l = self.voigtPairs[self.rank]
+
+    return E[...,k,l] * ( 1.0 + ( k != l ) )
+
 #------------------------------------------------------------------------------
 #
 #------------------------------------------------------------------------------
 
   def getBmatrix( self , dphi , F ):
 
-    B = zeros( shape=(self.nstr, self.rank*len(dphi) ) )
-
-    if self.rank == 2:
-      for i,dp in enumerate( dphi ):
-        B[0,2*i  ] = dp[0]*F[0,0]
-        B[0,2*i+1] = dp[0]*F[1,0]
-	
-        B[1,2*i  ] = dp[1]*F[0,1]
-        B[1,2*i+1] = dp[1]*F[1,1]
-
-        B[2,2*i  ] = dp[1]*F[0,0]+dp[0]*F[0,1]
-        B[2,2*i+1] = dp[0]*F[1,1]+dp[1]*F[1,0]
-    elif self.rank == 3:
-      for i,dp in enumerate( dphi ):
-        B[0,3*i  ] = dp[0]*F[0,0]
-        B[0,3*i+1] = dp[0]*F[1,0]
-        B[0,3*i+2] = dp[0]*F[2,0]
-	
-        B[1,3*i  ] = dp[1]*F[0,1]
-        B[1,3*i+1] = dp[1]*F[1,1]
-        B[1,3*i+2] = dp[1]*F[2,1]
-
-        B[2,3*i  ] = dp[2]*F[0,2]
-        B[2,3*i+1] = dp[2]*F[1,2]
-        B[2,3*i+2] = dp[2]*F[2,2]
-
-        B[3,3*i  ] = dp[1]*F[0,2]+dp[2]*F[0,1]
-        B[3,3*i+1] = dp[1]*F[1,2]+dp[2]*F[1,1]
-        B[3,3*i+2] = dp[1]*F[2,2]+dp[2]*F[2,1]
-
-        B[4,3*i  ] = dp[2]*F[0,0]+dp[0]*F[0,2]
-        B[4,3*i+1] = dp[2]*F[1,0]+dp[0]*F[1,2]
-        B[4,3*i+2] = dp[2]*F[2,0]+dp[0]*F[2,2]
-
-        B[5,3*i  ] = dp[0]*F[0,1]+dp[1]*F[0,0]
-        B[5,3*i+1] = dp[0]*F[1,1]+dp[1]*F[1,0]
-        B[5,3*i+2] = dp[0]*F[2,1]+dp[1]*F[2,0]
- 
-    return B
-    
+    return self.getGroupBmatrix( dphi , F )
     
   def getULBmatrix( self , dphi  ):
 
-    B = zeros( shape=(self.nstr, self.rank*len(dphi) ) )
+    return self.getGroupBmatrix( dphi )
 
-    if self.rank == 2:
-      for iNel,dp in enumerate( dphi ):
-        i = 2 * iNel
-        
-        B[0,i  ] = dp[0]	
-        B[1,i+1] = dp[1]
+#------------------------------------------------------------------------------
+#  Returns the B matrices for the shape function derivatives dphi with shape
+#  ( ... , nNodes , rank ) and the deformation gradients F ( ... , rank , 
+#  rank ). Row s, with components ( k , l ), of the B matrix of node a 
+#  contains dphi[a,k]*F[:,l] + dphi[a,l]*F[:,k], counting the normal 
+#  components once. Without F, the linear B matrices are returned.
+#------------------------------------------------------------------------------
 
-        B[2,i  ] = dp[1]
-        B[2,i+1] = dp[0]
-    elif self.rank == 3:
-      for iNel,dp in enumerate( dphi ):
-        i = 3 * iNel
-        
-        B[0,i  ] = dp[0]
-        B[1,i+1] = dp[1]
-        B[2,i+2] = dp[2]
+  def getGroupBmatrix( self , dphi , F = None ):
+
+    k,l = self.voigtPairs[self.rank]
 
-        B[3,i+1] = dp[2]
-        B[3,i+2] = dp[1]
+    if F is None:
+      F = eye(self.rank)
 
-        B[4,i  ] = dp[2]
-        B[4,i+2] = dp[0]
+    shear = ( k != l )
 
-        B[5,i  ] = dp[1]
-        B[5,i+1] = dp[0]
+    B = einsum( '...as,...is->...sai' , dphi[...,k] , F[...,l] ) + \
+        einsum( '...as,...is->...sai' , dphi[...,l] * shear , F[...,k] )
 
-    return B    
+    return B.reshape( B.shape[:-2] + ( -1 , ) )
 
 #------------------------------------------------------------------------------
 #
@@ -296,30 +392,7 @@ class FiniteStrainContinuum( Element ):
 
   def stress2matrix( self , stress ):
 
-    T = zeros( shape=( self.rank*self.rank , self.rank*self.rank ) )
-
-    if self.rank == 2:
-      T[0,0] = stress[0]
-      T[1,1] = stress[1]
-      T[0,1] = stress[2]
-      T[1,0] = stress[2]
-
-      T[self.rank:,self.rank:] = T[:self.rank,:self.rank]
-    elif self.rank == 3:
-      T[0,0] = stress[0]
-      T[1,1] = stress[1]
-      T[2,2] = stress[2]
-      T[1,2] = stress[3]
-      T[0,2] = stress[4]
-      T[0,1] = stress[5]
-      T[2,1] = stress[3]
-      T[2,0] = stress[4]
-      T[1,0] = stress[5]
-
-      T[self.rank:2*self.rank,self.rank:2*self.rank] = T[:self.rank,:self.rank]
-      T[2*self.rank:,2*self.rank:] = T[:self.rank,:self.rank]
-       
-    return T
+    return kron( eye(self.rank) , stress[self.voigtIndices[self.rank]] )
 
 #------------------------------------------------------------------------------
 #
@@ -327,29 +400,12 @@ class FiniteStrainContinuum( Element ):
 
   def getBNLmatrix( self , dphi ):
 
-    Bnl = zeros( shape=( self.rank*self.rank , self.rank*len(dphi) ) )
-
-    if self.rank == 2:
-      for i,dp in enumerate( dphi ):
-        Bnl[0,2*i  ] = dp[0]
-        Bnl[1,2*i  ] = dp[1]
-        Bnl[2,2*i+1] = dp[0]
-        Bnl[3,2*i+1] = dp[1]
-    elif self.rank == 3:
-      for i,dp in enumerate( dphi ):
-        Bnl[0,3*i  ] = dp[0]
-        Bnl[1,3*i  ] = dp[1]
-        Bnl[2,3*i  ] = dp[2]
-
-        Bnl[3,3*i+1] = dp[0]
-        Bnl[4,3*i+1] = dp[1]
-        Bnl[5,3*i+1] = dp[2]
+    Bnl = zeros( shape=( self.rank , self.rank , len(dphi) , self.rank ) )
 
-        Bnl[6,3*i+2] = dp[0]
-        Bnl[7,3*i+2] = dp[1]
-        Bnl[8,3*i+2] = dp[2]
+    for i in range(self.rank):
+      Bnl[i,:,:,i] = dphi.transpose()
 
-    return Bnl	    
+    return Bnl.reshape( self.rank*self.rank , self.rank*len(dphi) )
 
 #------------------------------------------------------------------------------
 #
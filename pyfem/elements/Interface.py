@@ -25,10 +25,10 @@
 ############################################################################
 
 from .Element import Element
-from pyfem.util.shapeFunctions  import getElemShapeData
+from pyfem.util.shapeFunctions  import getElemShapeData, getGroupShapeData
 from pyfem.util.kinematics      import Kinematics
 
-from numpy import zeros, dot, outer, ones, eye, sqrt,hstack
+from numpy import zeros, dot, outer, ones, eye, sqrt,hstack, array, einsum, where
 from scipy.linalg import norm
 
 #------------------------------------------------------------------------------
@@ -109,6 +109,81 @@ class Interface( Element ):
       
       self.appendNodalOutput( self.mat.outLabels() , self.mat.outData() )
 
+#------------------------------------------------------------------------------
+#  Group kernels, see pyfem.fem.Assembly. The rotations, B matrices, 
+#  openings and tractions of all integration points of the group are
+#  evaluated at once.
+#------------------------------------------------------------------------------
+
+  def getGroupTangentStiffness ( self, groupdat ):
+
+    B,weight = self.getGroupBmatrix( groupdat )
+
+    sigma,tang = self.getGroupStress( groupdat , B )
+
+    wB = B * weight[:,:,None,None]
+
+    groupdat.stiff = einsum( 'egsi,egst,egtj->eij' , wB , tang , B , optimize = True )
+    groupdat.fint  = einsum( 'egsi,egs->ei' , wB , sigma )
+
+#------------------------------------------------------------------------------
+#
+#------------------------------------------------------------------------------
+
+  def getGroupInternalForce ( self, groupdat ):
+
+    B,weight = self.getGroupBmatrix( groupdat )
+
+    sigma,tang = self.getGroupStress( groupdat , B )
+
+    groupdat.fint = einsum( 'egsi,egs->ei' , B * weight[:,:,None,None] , sigma )
+
+#------------------------------------------------------------------------------
+#  Returns the tractions and tangents of all integration points in the 
+#  group, with shapes ( nElem , nIP , 2 ) and ( nElem , nIP , 2 , 2 ). The 
+#  material output is stored in the nodal output fields.
+#------------------------------------------------------------------------------
+
+  def getGroupStress ( self, groupdat , B ):
+
+    strain = einsum( 'egsi,ei->egs' , B , groupdat.state )
+
+    nElem,nIP = strain.shape[:2]
+
+    if self.mat.isBatched():
+      sigma,tang,mat = self.mat.getGroupStresses( strain.reshape( nElem*nIP , 2 ) )
+
+      outdata = mat.outData.reshape( nElem , nIP , -1 ).sum( axis=1 )
+
+      self.appendGroupNodalOutput( mat.outLabels , groupdat , outdata , nIP )
+
+      return sigma.reshape( nElem , nIP , 2 ) , tang.reshape( nElem , nIP , 2 , 2 )
+
+    sigma   = zeros( shape=( nElem , nIP , 2 ) )
+    tang    = zeros( shape=( nElem , nIP , 2 , 2 ) )
+    outdata = None
+
+    kin = Kinematics(2,2)
+
+    #The material points of the element in row r of the group are 
+    #r*nIP,...,r*nIP+nIP-1 in the material manager of the group
+
+    for iElm,row in enumerate(groupdat.rows):
+      for iIP in range(nIP):
+        kin.strain = strain[iElm,iIP]
+
+        sigma[iElm,iIP],tang[iElm,iIP],mat = self.mat.getPointStress( kin , row*nIP+iIP )
+
+        if outdata is None:
+          labels  = mat.outLabels
+          outdata = zeros( shape=( nElem , len(labels) ) )
+
+        outdata[iElm] += mat.outData[:len(labels)]
+
+    if outdata is not None:
+      self.appendGroupNodalOutput( labels , groupdat , outdata , nIP )
+
+    return sigma,tang
 
 #------------------------------------------------------------------------------
 #
@@ -125,6 +200,25 @@ class Interface( Element ):
 
     return B
 
+#------------------------------------------------------------------------------
+#  Returns the B matrices ( nElem , nIP , 2 , 8 ) and the integration 
+#  weights ( nElem , nIP ) of all elements in the group.
+#------------------------------------------------------------------------------
+
+  def getGroupBmatrix( self , groupdat ):
+
+    rot = self.getGroupRotation( groupdat )
+
+    sData = getGroupShapeData( groupdat.coords[:,:2,:] , method = self.intMethod , elemType = "Line2" )
+
+    phi = sData.h[:,[0,1,0,1]] * array([-1.,-1.,1.,1.])
+
+    nElem,nIP = sData.weight.shape
+
+    B = einsum( 'gk,eij->egikj' , phi , rot ).reshape( nElem , nIP , 2 , 8 )
+
+    return B , sData.weight
+
 #------------------------------------------------------------------------------
 #
 #------------------------------------------------------------------------------
@@ -167,4 +261,44 @@ class Interface( Element ):
 
     return rot
 
+#------------------------------------------------------------------------------
+#  Group version of getRotation, returns the rotation matrices of all 
+#  elements with shape ( nElem , 2 , 2 ). The normals are kept in the group
+#  history, see Element.getGroupHistory.
+#------------------------------------------------------------------------------
 
+  def getGroupRotation( self , groupdat ):
+
+    coords = groupdat.coords
+    state  = groupdat.state
+
+    midCoords = 0.5 * ( coords[:,:2,:] + coords[:,2:,:] ) + \
+                0.5 * ( state[:,:4] + state[:,4:] ).reshape( -1 , 2 , 2 )
+
+    ds = midCoords[:,1,:]-midCoords[:,0,:]
+
+    newnormal = ds[:,::-1] / norm( ds , axis=1 )[:,None]
+
+    history,current = self.getGroupHistory( 'normal' , groupdat , zeros(2) )
+
+    normal = history[groupdat.rows]
+
+    first = norm( normal , axis=1 ) < 0.5
+
+    flip = ( einsum( 'ei,ei->e' , newnormal , normal ) < 0 ) & ~first
+
+    normal = where( flip[:,None] , -newnormal , newnormal )
+
+    #The normal of a new element is stored in its history right away
+
+    history[groupdat.rows[first]] = normal[first]
+    current[groupdat.rows]        = normal
+
+    rot = zeros( shape=( len(normal) , 2 , 2 ) )
+
+    rot[:,0,0]=  normal[:,0]
+    rot[:,0,1]=  normal[:,1]
+    rot[:,1,0]=  normal[:,1]
+    rot[:,1,1]= -normal[:,0]
+
+    return rot
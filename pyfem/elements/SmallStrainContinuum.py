@@ -25,9 +25,9 @@
 ############################################################################
 
 from .Element import Element
-from pyfem.util.shapeFunctions  import getElemShapeData
+from pyfem.util.shapeFunctions  import getCachedElemShapeData, getCachedGroupShapeData
 from pyfem.util.kinematics      import Kinematics
-from numpy import zeros, dot, outer, ones , eye
+from numpy import zeros, dot, outer, ones , eye, einsum, matmul, arange
 
 class SmallStrainContinuum( Element ):
   
@@ -54,7 +54,7 @@ class SmallStrainContinuum( Element ):
 
   def getTangentStiffness ( self, elemdat ):
 
-    sData = getElemShapeData( elemdat.coords )
+    sData = getCachedElemShapeData( self , elemdat.coords )
     
     elemdat.outlabel.append(self.outputLabels)
     elemdat.outdata  = zeros( shape=(len(elemdat.nodes),self.nstr) )
@@ -77,7 +77,7 @@ class SmallStrainContinuum( Element ):
 
   def getInternalForce ( self, elemdat ):
       
-    sData = getElemShapeData( elemdat.coords )
+    sData = getCachedElemShapeData( self , elemdat.coords )
 
     elemdat.outlabel.append(self.outputLabels)
     elemdat.outdata  = zeros( shape=(len(elemdat.nodes),self.nstr) )
@@ -94,11 +94,105 @@ class SmallStrainContinuum( Element ):
 
       self.appendNodalOutput( self.mat.outLabels() , self.mat.outData() )
 
+#-------------------------------------------------------------------------
+#  Group kernels: all elements of the group are evaluated at once. The
+#  element on which the kernel is called holds the state of the group, see
+#  ElementSet.getGroupElement.
+#-------------------------------------------------------------------------
+
+  def getGroupTangentStiffness ( self, groupdat ):
+
+    sData = getCachedGroupShapeData( self , groupdat.rows , groupdat.coords , { 'B' : self.getGroupBmatrix } )
+
+    B = sData.B
+
+    sigma,tang = self.getGroupStress( groupdat , B )
+
+    wB = B * sData.weight[:,:,None,None]
+
+    if tang.ndim == 2:
+      DB = matmul( tang , B )
+    else:
+      DB = einsum( 'egst,egtj->egsj' , tang , B )
+
+    groupdat.stiff = einsum( 'egsi,egsj->eij' , wB , DB )
+    groupdat.fint  = einsum( 'egsi,egs->ei'   , wB , sigma )
+
+#-------------------------------------------------------------------------
+
+  def getGroupInternalForce ( self, groupdat ):
+
+    sData = getCachedGroupShapeData( self , groupdat.rows , groupdat.coords , { 'B' : self.getGroupBmatrix } )
+
+    B = sData.B
+
+    sigma,tang = self.getGroupStress( groupdat , B )
+
+    groupdat.fint = einsum( 'egsi,egs->ei' , B * sData.weight[:,:,None,None] , sigma )
+
+#-------------------------------------------------------------------------
+#  Calls the material of every integration point in the group and stores 
+#  the material output in the nodal output fields. When the material 
+#  supports it, all points are evaluated in one call. The tangent then has
+#  the shape ( nstr , nstr ) when it is the same in all points. The material
+#  points of the element in row r of the group are r*nIP,...,r*nIP+nIP-1 in
+#  the material manager of the group.
+#-------------------------------------------------------------------------
+
+  def getGroupStress ( self, groupdat , B ):
+
+    strain  = einsum( 'egsi,ei->egs' , B , groupdat.state  )
+    dstrain = einsum( 'egsi,ei->egs' , B , groupdat.Dstate )
+
+    nElem,nIP = strain.shape[:2]
+
+    points = ( groupdat.rows[:,None] * nIP + arange(nIP) ).ravel()
+
+    if self.mat.isBatched():
+      if self.mat.hasHistory():
+        sigma,tang,mat = self.mat.getGroupStresses( strain.reshape( nElem*nIP , self.nstr ) , \
+                                                    dstrain.reshape( nElem*nIP , self.nstr ) , points )
+      else:
+        sigma,tang,mat = self.mat.getGroupStresses( strain.reshape( nElem*nIP , self.nstr ) )
+
+      outdata = mat.outData.reshape( nElem , nIP , -1 ).sum( axis=1 )
+
+      self.appendGroupNodalOutput( mat.outLabels , groupdat , outdata , nIP )
+
+      if tang.ndim == 3:
+        tang = tang.reshape( nElem , nIP , self.nstr , self.nstr )
+
+      return sigma.reshape( nElem , nIP , self.nstr ),tang
+
+    sigma   = zeros( shape=( nElem , nIP , self.nstr ) )
+    tang    = zeros( shape=( nElem , nIP , self.nstr , self.nstr ) )
+    outdata = None
+
+    kin = Kinematics( self.rank , self.nstr )
+
+    for iElm in range(nElem):
+      for iIP in range(nIP):
+        kin.strain  = strain [iElm,iIP]
+        kin.dstrain = dstrain[iElm,iIP]
+
+        sigma[iElm,iIP],tang[iElm,iIP],mat = self.mat.getPointStress( kin , points[iElm*nIP+iIP] )
+
+        if outdata is None:
+          labels  = mat.outLabels
+          outdata = zeros( shape=( nElem , len(labels) ) )
+
+        outdata[iElm] += mat.outData[:len(labels)]
+
+    if outdata is not None:
+      self.appendGroupNodalOutput( labels , groupdat , outdata , nIP )
+
+    return sigma,tang
+
 #----------------------------------------------------------------------
     
   def getMassMatrix ( self, elemdat ):
       
-    sData = getElemShapeData( elemdat.coords )
+    sData = getCachedElemShapeData( self , elemdat.coords )
 
     rho = elemdat.matprops.rho
 
@@ -112,39 +206,68 @@ class SmallStrainContinuum( Element ):
 
   def getBmatrix( self , dphi ):
 
-    b = zeros( shape=( self.nstr , self.dofCount() ) )
+    b = zeros( shape=( self.nstr , self.rank*len(dphi) ) )
 
     if self.rank == 2:
-      for i,dp in enumerate(dphi):
-        b[0,i*2+0] = dp[0]
-        b[1,i*2+1] = dp[1]
-        b[2,i*2+0] = dp[1]
-        b[2,i*2+1] = dp[0]
+      b[0,0::2] = dphi[:,0]
+      b[1,1::2] = dphi[:,1]
+      b[2,0::2] = dphi[:,1]
+      b[2,1::2] = dphi[:,0]
     elif self.rank == 3:
-      for i,dp in enumerate(dphi):
-        b[0,i*3+0] = dp[0]
-        b[1,i*3+1] = dp[1]
-        b[2,i*3+2] = dp[2]
+      b[0,0::3] = dphi[:,0]
+      b[1,1::3] = dphi[:,1]
+      b[2,2::3] = dphi[:,2]
 
-        b[3,i*3+1] = dp[2]
-        b[3,i*3+2] = dp[1]
+      b[3,1::3] = dphi[:,2]
+      b[3,2::3] = dphi[:,1]
 
-        b[4,i*3+0] = dp[2]
-        b[4,i*3+2] = dp[0]
+      b[4,0::3] = dphi[:,2]
+      b[4,2::3] = dphi[:,0]
 
-        b[5,i*3+0] = dp[1]
-        b[5,i*3+1] = dp[0]
+      b[5,0::3] = dphi[:,1]
+      b[5,1::3] = dphi[:,0]
    
     return b
 
+#--------------------------------------------------------------------------
+
+  def getGroupBmatrix( self , dphi ):
+
+    '''Returns the B matrices of all integration points in a group,
+       dphi has shape ( nElem , nIP , nNodes , rank ).'''
+
+    nElem,nIP,nNodes = dphi.shape[:3]
+
+    b = zeros( shape=( nElem , nIP , self.nstr , self.rank*nNodes ) )
+
+    if self.rank == 2:
+      b[:,:,0,0::2] = dphi[:,:,:,0]
+      b[:,:,1,1::2] = dphi[:,:,:,1]
+      b[:,:,2,0::2] = dphi[:,:,:,1]
+      b[:,:,2,1::2] = dphi[:,:,:,0]
+    elif self.rank == 3:
+      b[:,:,0,0::3] = dphi[:,:,:,0]
+      b[:,:,1,1::3] = dphi[:,:,:,1]
+      b[:,:,2,2::3] = dphi[:,:,:,2]
+
+      b[:,:,3,1::3] = dphi[:,:,:,2]
+      b[:,:,3,2::3] = dphi[:,:,:,1]
+
+      b[:,:,4,0::3] = dphi[:,:,:,2]
+      b[:,:,4,2::3] = dphi[:,:,:,0]
+
+      b[:,:,5,0::3] = dphi[:,:,:,1]
+      b[:,:,5,1::3] = dphi[:,:,:,0]
+
+    return b
+
 #------------------------------------------------------------------------------
 
   def getNmatrix( self , h ):
 
     N = zeros( shape=( self.rank , self.rank*len(h) ) )
 
-    for i,a in enumerate( h ):
-      for j in list(range(self.rank)):
-        N[j,self.rank*i+j] = a
+    for j in range(self.rank):
+      N[j,j::self.rank] = h
     
     return N
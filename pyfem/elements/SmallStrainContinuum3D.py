@@ -25,7 +25,7 @@
 ############################################################################
 
 from .Element import Element
-from pyfem.util.shapeFunctions  import getElemShapeData
+from pyfem.util.shapeFunctions  import getCachedElemShapeData
 from pyfem.util.kinematics      import Kinematics
 from numpy import zeros, dot, outer, ones , eye
 
@@ -44,7 +44,7 @@ class SmallStrainContinuum3D( Element ):
 
   def getTangentStiffness ( self, elemdat ):
 
-    sData = getElemShapeData( elemdat.coords )
+    sData = getCachedElemShapeData( self , elemdat.coords )
 
     kin = Kinematics(3,6)
     
@@ -72,7 +72,7 @@ class SmallStrainContinuum3D( Element ):
 
   def getInternalForce ( self, elemdat ):
       
-    sData = getElemShapeData( elemdat.coords )
+    sData = getCachedElemShapeData( self , elemdat.coords )
 
     kin = Kinematics(3,6)
     
@@ -96,7 +96,7 @@ class SmallStrainContinuum3D( Element ):
     
   def getMassMatrix ( self, elemdat ):
       
-    sData = getElemShapeData( elemdat.coords )
+    sData = getCachedElemShapeData( self , elemdat.coords )
 
     rho = elemdat.matprops.rho
 
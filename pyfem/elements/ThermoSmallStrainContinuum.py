@@ -25,7 +25,7 @@
 ############################################################################
 
 from .Element import Element
-from pyfem.util.shapeFunctions  import getElemShapeData
+from pyfem.util.shapeFunctions  import getCachedElemShapeData
 from pyfem.util.kinematics      import Kinematics
 from numpy import zeros, dot, outer, ones , eye, ix_, linalg, tensordot 
 
@@ -66,7 +66,7 @@ class ThermoSmallStrainContinuum( Element ):
 
   def getTangentStiffness ( self, elemdat ):
        
-    sData = getElemShapeData( elemdat.coords )
+    sData = getCachedElemShapeData( self , elemdat.coords )
     
     dDofs,tDofs = self.splitDofIDs( len(elemdat.coords) )
     
@@ -129,7 +129,7 @@ class ThermoSmallStrainContinuum( Element ):
 
   def getInternalForce ( self, elemdat ):
      
-    sData = getElemShapeData( elemdat.coords )
+    sData = getCachedElemShapeData( self , elemdat.coords )
     
     dDofs,tDofs = self.splitDofIDs( len(elemdat.coords) )
     
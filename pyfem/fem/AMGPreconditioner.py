@@ -0,0 +1,447 @@
+############################################################################
+#  This Python file is part of PyFEM, the code that accompanies the book:  #
+#                                                                          #
+#    'Non-Linear Finite Element Analysis of Solids and Structures'         #
+#    R. de Borst, M.A. Crisfield, J.J.C. Remmers and C.V. Verhoosel        #
+#    John Wiley and Sons, 2012, ISBN 978-0470666449                        #
+#                                                                          #
+#  The code is written by J.J.C. Remmers, C.V. Verhoosel and R. de Borst.  #
+#                                                                          #
+#  The latest stable version can be downloaded from the web-site:          #
+#     http://www.wiley.com/go/deborst                                      #
+#                                                                          #
+#  A github repository, with the most up to date version of the code,      #
+#  can be found here:                                                      #
+#     https://github.com/jjcremmers/PyFEM                                  #
+#                                                                          #
+#  The code is open source and intended for educational and scientific     #
+#  purposes only. If you use PyFEM in your research, the developers would  #
+#  be grateful if you could cite the book.                                 #  
+#                                                                          #
+#  Disclaimer:                                                             #
+#  The authors reserve all rights but do not guarantee that the code is    #
+#  free from errors. Furthermore, the authors shall not be liable in any   #
+#  event caused by the use of the program.                                 #
+############################################################################
+
+from numpy import zeros, ones, arange, unique, bincount, cumsum, maximum, where, sqrt, \
+                  dot, column_stack, nonzero
+from numpy.linalg import svd, norm
+from numpy.random import RandomState
+from scipy.sparse import csr_matrix, csc_matrix, coo_matrix, diags, tril, triu
+from scipy.sparse.linalg import splu, LinearOperator
+from zlib import crc32
+
+from pyfem.util.logger import getLogger
+
+logger = getLogger()
+
+#-------------------------------------------------------------------------------
+#  The rigid body rotations in the plane of two displacement types, with the 
+#  rotational dof type that belongs to this rotation
+#-------------------------------------------------------------------------------
+
+rotations = [ ( 'u' , 'v' , 'rz' ) , ( 'v' , 'w' , 'rx' ) , ( 'w' , 'u' , 'ry' ) ]
+
+axes = { 'u' : 0 , 'v' : 1 , 'w' : 2 }
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+class AMGPreconditioner:
+
+  '''Smoothed aggregation algebraic multigrid, applied as a single V-cycle, 
+     e.g.
+
+       linearSolver = { type = "cg"; preconditioner = "amg"; smoother = "gaussseidel"; };
+
+     The nodes are grouped into aggregates of strongly connected neighbours. 
+     On every aggregate, the rigid body modes of the nodes, computed from the
+     coordinates and the dof types u, v, w (and rx, ry, rz), are 
+     orthonormalised. These form the columns of the tentative prolongator, 
+     which is smoothed with a damped Jacobi step. The coarse matrices are 
+     computed with the Galerkin product P^T A P, down to a level with at most
+     maxCoarse dofs that is solved directly.
+
+     The aggregates and tentative prolongators only depend on the sparsity 
+     pattern of A. They are reused for every matrix with the same pattern, 
+     e.g. in all Newton iterations. For a new matrix, only the smoothed 
+     prolongators, the coarse matrices and the smoothers are recomputed.'''
+
+  def __init__( self , props , dofSpace ):
+
+    self.smoother  = getattr( props , "smoother"  , "jacobi" ).lower()
+    self.nSweeps   = getattr( props , "nSweeps"   , 1 )
+    self.strength  = getattr( props , "strength"  , 0.0 )
+    self.maxCoarse = getattr( props , "maxCoarse" , 500 )
+    self.maxLevels = getattr( props , "maxLevels" , 10 )
+
+    if self.smoother not in [ "jacobi" , "gaussseidel" ]:
+      raise RuntimeError('Smoother ' + self.smoother + ' not known')
+
+    self.nodes    = dofSpace.nodes
+    self.dofTypes = dofSpace.dofTypes
+    self.pattern  = None
+
+    #The V-cycle is symmetric, see smooth
+
+    self.symmetric = True
+
+#-------------------------------------------------------------------------------
+#  The factors of the smoothers and the coarse solver can not be pickled, 
+#  e.g. by DataDump. The hierarchy is constructed again in the next solve.
+#-------------------------------------------------------------------------------
+
+  def __getstate__ ( self ):
+
+    state = self.__dict__.copy()
+
+    for name in [ "T" , "P" , "R" , "A" , "invDiag" , "omega" , "lower" , "upper" , "coarseSolver" ]:
+      state.pop( name , None )
+
+    state["pattern"] = None
+
+    return state
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def getOperator( self , A , columnDofs = None ):
+
+    A = csr_matrix( A )
+
+    if columnDofs is None:
+      columnDofs = arange( A.shape[0] )
+
+    pattern = ( A.shape , A.nnz , crc32( A.indices.tobytes() ) , crc32( A.indptr.tobytes() ) )
+
+    if pattern != self.pattern:
+      self.setupAggregates( A , columnDofs )
+      self.pattern = pattern
+    else:
+      self.setupLevels( A )
+
+    n = A.shape[0]
+
+    return LinearOperator( ( n , n ) , matvec = lambda b : self.cycle( 0 , b.ravel() ) )
+
+#-------------------------------------------------------------------------------
+#  Constructs the aggregates and tentative prolongators of all levels
+#-------------------------------------------------------------------------------
+
+  def setupAggregates( self , A , columnDofs ):
+
+    nTypes = len(self.dofTypes)
+
+    B     = getRigidBodyModes( self.nodes.getCoordArray() , self.dofTypes , columnDofs )
+    nodes = unique( columnDofs // nTypes , return_inverse = True )[1]
+
+    self.T = []
+
+    self.resetLevels( A )
+
+    while A.shape[0] > self.maxCoarse and len(self.A) < self.maxLevels:
+      aggregates = getAggregates( getStrengthGraph( A , nodes , self.strength ) )
+
+      T,B,nodes = getTentativeProlongator( aggregates[nodes] , B )
+
+      #Stop when the coarsening stagnates
+
+      if T.shape[1] > 0.9 * T.shape[0]:
+        break
+
+      self.T.append( T )
+
+      A = self.addLevel( A , T )
+
+    self.coarseSolver = splu( csc_matrix( A ) )
+
+    logger.info('    AMG setup        : %i levels, dofs %s' % \
+                ( len(self.A) , ' '.join( [ str(Al.shape[0]) for Al in self.A ] ) ) )
+
+#-------------------------------------------------------------------------------
+#  Computes the smoothed prolongators, the coarse matrices and the smoothers 
+#  of all levels for the matrix A, with the stored tentative prolongators
+#-------------------------------------------------------------------------------
+
+  def setupLevels( self , A ):
+
+    self.resetLevels( A )
+
+    for T in self.T:
+      A = self.addLevel( A , T )
+
+    self.coarseSolver = splu( csc_matrix( A ) )
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def resetLevels( self , A ):
+
+    self.A       = [ A ]
+    self.P       = []
+    self.R       = []
+    self.invDiag = []
+    self.omega   = []
+    self.lower   = []
+    self.upper   = []
+
+#-------------------------------------------------------------------------------
+#  Adds the smoother of the matrix A and the smoothed prolongator of T to the
+#  hierarchy and returns the coarse matrix
+#-------------------------------------------------------------------------------
+
+  def addLevel( self , A , T ):
+
+    d = A.diagonal().copy()
+    d[d == 0.] = 1.0
+
+    invDiag = 1.0 / d
+    omega   = 4.0 / ( 3.0 * getSpectralRadius( A , invDiag ) )
+
+    P = csr_matrix( T - omega * ( diags( invDiag ) * ( A * T ) ) )
+    R = csr_matrix( P.transpose() )
+
+    self.invDiag.append( invDiag )
+    self.omega  .append( omega )
+    self.P      .append( P )
+    self.R      .append( R )
+
+    if self.smoother == "gaussseidel":
+      self.lower.append( getTriangularSolver( tril( A , format = "csc" ) ) )
+      self.upper.append( getTriangularSolver( triu( A , format = "csc" ) ) )
+
+    A = csr_matrix( R * ( A * P ) )
+
+    self.A.append( A )
+
+    return A
+
+#-------------------------------------------------------------------------------
+#  Applies a V-cycle on the given level to the residual b
+#-------------------------------------------------------------------------------
+
+  def cycle( self , level , b ):
+
+    if level == len(self.A) - 1:
+      return self.coarseSolver.solve( b )
+
+    A = self.A[level]
+    x = self.smooth( level , b , self.lower )
+
+    for i in range(1,self.nSweeps):
+      x += self.smooth( level , b - A * x , self.lower )
+
+    x += self.P[level] * self.cycle( level + 1 , self.R[level] * ( b - A * x ) )
+
+    for i in range(self.nSweeps):
+      x += self.smooth( level , b - A * x , self.upper )
+
+    return x
+
+#-------------------------------------------------------------------------------
+#  Returns the correction of a single smoothing step for the residual r. The
+#  Gauss-Seidel sweeps are forward before and backward after the coarse grid
+#  correction, such that the V-cycle is symmetric.
+#-------------------------------------------------------------------------------
+
+  def smooth( self , level , r , triangles ):
+
+    if self.smoother == "gaussseidel":
+      return triangles[level].solve( r )
+
+    return self.omega[level] * self.invDiag[level] * r
+
+#-------------------------------------------------------------------------------
+#  Returns the near null space of the matrix in the columns of B: the 
+#  translations in the direction of each dof type and the rotations in the
+#  planes of the displacement types u, v and w. The rotations include the
+#  rotational dof types rx, ry and rz, if these are present.
+#-------------------------------------------------------------------------------
+
+def getRigidBodyModes( coords , dofTypes , columnDofs ):
+
+  nTypes = len(dofTypes)
+  types  = columnDofs % nTypes
+
+  X = coords - coords.mean( axis = 0 )
+  X = X[columnDofs // nTypes]
+
+  modes = []
+  used  = []
+
+  for first,second,rotation in rotations:
+    if first not in dofTypes or second not in dofTypes or \
+       max( axes[first] , axes[second] ) >= X.shape[1]:
+      continue
+
+    mode = zeros( len(columnDofs) )
+
+    isFirst  = types == dofTypes.index( first )
+    isSecond = types == dofTypes.index( second )
+
+    mode[isFirst]  = -X[isFirst ,axes[second]]
+    mode[isSecond] =  X[isSecond,axes[first]]
+
+    if rotation in dofTypes:
+      mode[types == dofTypes.index( rotation )] = 1.0
+      used.append( rotation )
+
+    modes.append( mode )
+
+  translations = [ ( types == iType ).astype( float ) for iType,dofType in \
+                   enumerate(dofTypes) if dofType not in used ]
+
+  return column_stack( translations + modes )
+
+#-------------------------------------------------------------------------------
+#  Returns the graph of strong connections between the nodes, including the
+#  diagonal. The connection between two nodes is the sum of the absolute 
+#  values of the entries that couple their dofs. It is strong when it is 
+#  larger than theta times the geometric mean of the diagonal connections.
+#-------------------------------------------------------------------------------
+
+def getStrengthGraph( A , nodes , theta ):
+
+  nNodes = nodes.max() + 1
+
+  N = csr_matrix( ( ones( len(nodes) ) , ( arange( len(nodes) ) , nodes ) ) , \
+                  shape = ( len(nodes) , nNodes ) )
+
+  S = coo_matrix( N.transpose() * ( abs( A ) * N ) )
+
+  d = S.diagonal()
+
+  mask = ( S.row == S.col ) | ( S.data >= theta * sqrt( d[S.row] * d[S.col] ) )
+
+  S = csr_matrix( ( ones( mask.sum() ) , ( S.row[mask] , S.col[mask] ) ) , shape = S.shape )
+
+  S.sort_indices()
+
+  return S
+
+#-------------------------------------------------------------------------------
+#  Returns the aggregate of each node of the strength graph S. The roots of
+#  the aggregates form a maximal independent set of the nodes at distance 
+#  two, found with Luby's algorithm. Every root forms an aggregate with its
+#  neighbours, these are disjoint. The remaining nodes join the aggregate of
+#  a neighbour.
+#-------------------------------------------------------------------------------
+
+def getAggregates( S ):
+
+  n = S.shape[0]
+
+  weights   = RandomState( 0 ).permutation( n ).astype( float )
+  isRoot    = zeros( n , dtype = bool )
+  undecided = ones ( n , dtype = bool )
+
+  while undecided.any():
+    w = where( undecided , weights , -1.0 )
+
+    candidate = undecided & ( w == getNeighbourMaximum( S , getNeighbourMaximum( S , w ) ) )
+
+    isRoot[candidate] = True
+
+    #Nodes within distance two of a new root can not become a root
+
+    near = getNeighbourMaximum( S , getNeighbourMaximum( S , candidate.astype( float ) ) )
+
+    undecided &= ( near == 0. )
+
+  aggregates = -ones( n )
+
+  aggregates[isRoot] = arange( isRoot.sum() )
+
+  aggregates = getNeighbourMaximum( S , aggregates )
+
+  while ( aggregates < 0 ).any():
+    aggregates = where( aggregates < 0 , getNeighbourMaximum( S , aggregates ) , aggregates )
+
+  return aggregates.astype( int )
+
+#-------------------------------------------------------------------------------
+#  Returns the maximum of the values x of the neighbours of every node of S
+#-------------------------------------------------------------------------------
+
+def getNeighbourMaximum( S , x ):
+
+  return maximum.reduceat( x[S.indices] , S.indptr[:-1] )
+
+#-------------------------------------------------------------------------------
+#  Returns the tentative prolongator T for the given aggregate of every dof.
+#  The columns of T are an orthonormal basis of the near null space B on each
+#  aggregate, computed with a singular value decomposition. The SVDs of all 
+#  aggregates are computed at once, with zero rows padded to the dofs of the
+#  smaller aggregates. Modes that are linearly dependent on an aggregate are 
+#  removed. The near null space of the coarse level and the aggregate of 
+#  each coarse dof are returned as well.
+#-------------------------------------------------------------------------------
+
+def getTentativeProlongator( aggregates , B ):
+
+  n,k = B.shape
+
+  order = aggregates.argsort( kind = "stable" )
+  sizes = bincount( aggregates )
+  start = cumsum( sizes ) - sizes
+  local = zeros( n , dtype = int )
+
+  local[order] = arange( n ) - start[aggregates[order]]
+
+  blocks = zeros( ( len(sizes) , sizes.max() , k ) )
+
+  blocks[aggregates,local] = B
+
+  U,s,Vt = svd( blocks , full_matrices = False )
+
+  keep = s > 1.0e-10 * s[:,:1]
+
+  columns = cumsum( keep.ravel() ).reshape( keep.shape ) - 1
+
+  #Every dof has an entry in each kept column of its aggregate
+
+  rows,cols = nonzero( keep[aggregates] )
+
+  a = aggregates[rows]
+
+  T = csr_matrix( ( U[a,local[rows],cols] , ( rows , columns[a,cols] ) ) , \
+                  shape = ( n , keep.sum() ) )
+
+  coarseB     = ( s[:,:,None] * Vt )[keep]
+  coarseNodes = nonzero( keep )[0]
+
+  return T , coarseB , coarseNodes
+
+#-------------------------------------------------------------------------------
+#  Estimates the largest eigenvalue of D^-1 A with power iterations on the 
+#  symmetric matrix D^-1/2 A D^-1/2
+#-------------------------------------------------------------------------------
+
+def getSpectralRadius( A , invDiag , nIter = 15 ):
+
+  scale = sqrt( abs( invDiag ) )
+  x     = RandomState( 0 ).rand( A.shape[0] )
+  rho   = 1.0
+
+  for i in range(nIter):
+    x  /= norm( x )
+    y   = scale * ( A * ( scale * x ) )
+    rho = dot( x , y )
+    x   = y
+
+  return rho
+
+#-------------------------------------------------------------------------------
+#  Returns the LU factors of the triangular matrix L, which are L itself. 
+#  SuperLU is used since it solves the triangular systems much faster than 
+#  scipy.sparse.linalg.spsolve_triangular.
+#-------------------------------------------------------------------------------
+
+def getTriangularSolver( L ):
+
+  return splu( L , permc_spec = "NATURAL" , diag_pivot_thresh = 0. , \
+               options = { "SymmetricMode" : True } )
@@ -27,111 +27,320 @@
 #  event caused by the use of the program.                                 #
 ############################################################################
 
-from numpy import zeros, ones, ix_ , append, repeat, array
-from scipy.sparse import coo_matrix
+from numpy import zeros, ones, ix_ , array, bincount, arange
+from pyfem.fem.SparsityPattern import SparsityPattern
 from pyfem.util.dataStructures import Properties
-from pyfem.util.dataStructures import elementData
+from pyfem.util.dataStructures import elementData, groupData
 
+#-------------------------------------------------------------------------------
+#  Returns the sparsity pattern of the global matrices. The pattern is 
+#  constructed once and stored in globdat.
+#-------------------------------------------------------------------------------
 
-#######################################
-# General array assembly routine for: # 
-# * assembleInternalForce             #
-# * assembleTangentStiffness          #
-#######################################
+def getSparsityPattern ( globdat ):
 
-def assembleArray ( props, globdat, rank, action ):
+  if not hasattr( globdat , "sparsityPattern" ) or \
+     not globdat.sparsityPattern.isValid( globdat ):
+    globdat.sparsityPattern = SparsityPattern( globdat )
 
-  #Initialize the global array A with rank 2
+  return globdat.sparsityPattern
 
-  #A = zeros( len(globdat.dofs) * ones(2,dtype=int) )
-  B = zeros( len(globdat.dofs) * ones(1,dtype=int) )
+#-------------------------------------------------------------------------------
+#  Group kernels. An element class can evaluate all elements of a group at 
+#  once by providing the method getGroup<Action>, e.g. getGroupTangentStiffness
+#  for getTangentStiffness, and commitGroup for commit. The kernel is called
+#  on the group element, see ElementSet.getGroupElement, and receives a 
+#  groupData object with the stacked data of the elements in some rows of the
+#  group connectivity. Whether a group is evaluated in this way is decided 
+#  from the element class and the connectivity, see ElementSet.isBatched, so 
+#  the elements of the group are never created. Otherwise, the elements are 
+#  evaluated one by one.
+#-------------------------------------------------------------------------------
 
-  val   = array([],dtype=float)
-  row   = array([],dtype=int)
-  col   = array([],dtype=int)
+def getGroupAction ( action ):
 
-  nDof  = len(globdat.dofs)
+  if action.startswith('get'):
+    return action.replace( 'get' , 'getGroup' , 1 )
 
-  if action != 'commit':
-    globdat.resetNodalOutput()
+  return action + 'Group'
 
-  #Loop over the element groups
-  for elementGroup in globdat.elements.iterGroupNames():
+#-------------------------------------------------------------------------------
+#  An action that the element class does not provide at all is skipped for
+#  the whole group, e.g. getMassMatrix for an element without mass.
+#-------------------------------------------------------------------------------
 
-    #Get the properties corresponding to the elementGroup
-    el_props = getattr( props, elementGroup )
+def hasGroupKernel ( elements , groupName , action ):
 
-    #Loop over the elements in the elementGroup
-    for iElm,element in enumerate(globdat.elements.iterElementGroup( elementGroup )):
+  if not elements.isBatched( groupName ):
+    return False
 
-      #Get the element nodes
-      el_nodes = element.getNodes()
+  elementType = elements.getElementType( groupName )
+
+  return hasattr( elementType , getGroupAction( action ) ) or not hasattr( elementType , action )
+
+#-------------------------------------------------------------------------------
+#  Returns the groupData of the elements in rows of a group. groupNodes is the
+#  ( nElem x nNodes ) connectivity of the complete group and el_dofs the 
+#  ( len(rows) x nDof ) dofs of the elements.
+#-------------------------------------------------------------------------------
+
+def getGroupData ( globdat , element , groupNodes , rows , el_dofs , el_props ):
+
+  groupdat = groupData( globdat.state[el_dofs] , globdat.Dstate[el_dofs] )
+
+  groupdat.rows        = rows
+  groupdat.groupSize   = len(groupNodes)
+  groupdat.nodes       = groupNodes[rows]
+  groupdat.coords      = globdat.nodes.getNodeCoords( groupdat.nodes )
+  groupdat.nodeIndices = globdat.nodes.getIndexArray( groupdat.nodes )
+  groupdat.dofs        = el_dofs
+  groupdat.props       = el_props
+  groupdat.globdat     = globdat
+
+  if hasattr( element , "matProps" ):
+    groupdat.matprops = element.matProps
+
+  return groupdat
+
+#-------------------------------------------------------------------------------
+#  Evaluates the action for the elements in rows of a group with the group 
+#  kernel of element. The results are returned in the same form as by 
+#  evaluateGroup. groupDofs is the dof table of the complete group.
+#-------------------------------------------------------------------------------
+
+def evaluateGroupKernel ( globdat , element , groupNodes , rows , groupDofs , el_props , rank , action ):
+
+  groupdat = getGroupData( globdat , element , groupNodes , rows , groupDofs[rows] , el_props )
+
+  kernel = getattr( element , getGroupAction( action ) , None )
+
+  if kernel is not None:
+    kernel( groupdat )
+
+  if action == "getMassMatrix":
+    block,vec = groupdat.mass,groupdat.lumped
+  else:
+    block,vec = groupdat.stiff,groupdat.fint
+
+  nElem,nDof = groupdat.dofs.shape
+
+  if rank < 2:
+    block = None
+  elif block is None:
+    block = zeros( nElem*nDof*nDof )
+  else:
+    block = block.ravel()
+
+  if rank == 0:
+    vec = None
+  elif vec is None:
+    vec = zeros( nElem*nDof )
+  else:
+    vec = vec.ravel()
+
+  return block , vec , groupdat.dofs.ravel()
+
+#-------------------------------------------------------------------------------
+#  Evaluates the action for the elements in positions rows of a group, with 
+#  the group kernel when the group supports it, and one by one otherwise. 
+#  This is used by the serial and the parallel assemblers.
+#-------------------------------------------------------------------------------
+
+def evaluateElements ( globdat , groupName , rows , groupDofs , el_props , rank , action ):
+
+  elements = globdat.elements
+
+  if hasGroupKernel( elements , groupName , action ):
+    return evaluateGroupKernel( globdat , elements.getGroupElement( groupName ) , \
+                                elements.getConnectivity( groupName ) , rows , groupDofs , el_props , rank , action )
+
+  IDs = elements.groups[groupName]
+
+  return evaluateGroup( globdat , [ elements[IDs[i]] for i in rows ] , groupDofs[rows] , el_props , rank , action )
+
+#-------------------------------------------------------------------------------
+#  Evaluates the action for a list of elements of a group, one by one. The 
+#  element matrices (n*n entries per element) and vectors (n entries per 
+#  element) are returned as flat arrays in element order, together with the
+#  flat array of element dofs. The matrices are only returned for rank 2, the
+#  vectors for rank 1 and 2. The dofs of the elements are taken from the 
+#  table groupDofs, see DofSpace.getElementDofs.
+#-------------------------------------------------------------------------------
+
+def evaluateGroup ( globdat , elements , groupDofs , el_props , rank , action ):
+
+  nDofs = [ element.dofCount() for element in elements ]
+
+  dofs  = zeros( sum(nDofs) , dtype=int )
+  vec   = zeros( sum(nDofs) )
+  block = None
+
+  if rank == 2:
+    block = zeros( sum( [ n*n for n in nDofs ] ) )
+
+  offset = 0
+  start  = 0
+
+  #Gather the coordinates of all elements at once, when they have the same
+  #number of nodes
+
+  groupNodes  = [ element.getNodes() for element in elements ]
+  groupCoords = None
 
-      #Get the element coordinates
+  if len(set( [ len(nodes) for nodes in groupNodes ] )) == 1:
+    groupCoords = globdat.nodes.getNodeCoords( groupNodes )
+
+  #Loop over the elements in the elementGroup
+  for iElm,element in enumerate(elements):
+
+    #Get the element nodes
+    el_nodes = groupNodes[iElm]
+
+    #Get the element coordinates
+    if groupCoords is not None:
+      el_coords = groupCoords[iElm]
+    else:
       el_coords = globdat.nodes.getNodeCoords( el_nodes )
 
-      #Get the element degrees of freedom
-      el_dofs = globdat.dofs.getForTypes( el_nodes , element.dofTypes )
+    #Get the element degrees of freedom
+    el_dofs = groupDofs[iElm]
       
-      #Get the element state
-      el_a  = globdat.state [el_dofs]
-      el_Da = globdat.Dstate[el_dofs]
+    #Get the element state
+    el_a  = globdat.state [el_dofs]
+    el_Da = globdat.Dstate[el_dofs]
 
-      #Create the an element state to pass through to the element
-      #el_state = Properties( { 'state' : el_a, 'Dstate' : el_Da } )
-      elemdat = elementData( el_a , el_Da )
+    #Create the an element state to pass through to the element
+    #el_state = Properties( { 'state' : el_a, 'Dstate' : el_Da } )
+    elemdat = elementData( el_a , el_Da )
 
-      elemdat.coords   = el_coords
-      elemdat.nodes    = el_nodes
-      elemdat.props    = el_props
-      elemdat.iElm     = iElm 
+    elemdat.coords   = el_coords
+    elemdat.nodes    = el_nodes
+    elemdat.props    = el_props
+    elemdat.iElm     = iElm 
 
-      element.globdat  = globdat
+    element.globdat  = globdat
       
-      if hasattr( element , "matProps" ):
-        elemdat.matprops = element.matProps
+    if hasattr( element , "matProps" ):
+      elemdat.matprops = element.matProps
 
-      if hasattr( element , "mat" ):
-        element.mat.reset()
+    if hasattr( element , "mat" ):
+      element.mat.reset()
 
-      #Get the element contribution by calling the specified action
-      if hasattr( element , action ):
-        getattr( element, action )( elemdat )
+    #Get the element contribution by calling the specified action
+    if hasattr( element , action ):
+      getattr( element, action )( elemdat )
+
+    #for label in elemdat.outlabel:	
+    #  element.appendNodalOutput( label , globdat , elemdat.outdata )
+
+    #Store the element contribution in the group buffers
+    n   = len(el_dofs)
+    end = start + n
+
+    dofs[start:end] = el_dofs
+
+    if action == "getMassMatrix":
+      vec[start:end] = elemdat.lumped
+
+      if rank == 2:
+        block[offset:offset+n*n] = elemdat.mass.reshape(n*n)
+    else:
+      vec[start:end] = elemdat.fint
+
+      if rank == 2:
+        block[offset:offset+n*n] = elemdat.stiff.reshape(n*n)
+
+    start   = end
+    offset += n*n
+
+  if rank == 0:
+    vec = None
+
+  return block , vec , dofs
+
+#-------------------------------------------------------------------------------
+#  Returns the parallel assembler that is specified in the solver block of 
+#  the input file, e.g.
+#
+#    solver = { ... ; assembly = { type = "ProcessPoolAssembler"; nProcs = 4; }; };
+#
+#  The assembler is created once and stored in globdat. When no assembly block
+#  is given, None is returned and the arrays are assembled serially.
+#-------------------------------------------------------------------------------
+
+def getParallelAssembler ( props , globdat ):
+
+  if not hasattr( props , "solver" ) or not hasattr( props.solver , "assembly" ):
+    return None
+
+  if not hasattr( globdat , "assembler" ) or not globdat.assembler.isValid( globdat ):
+    assemblyProps = props.solver.assembly
+
+    if not hasattr( assemblyProps , 'type' ):
+      raise RuntimeError('Missing type for assembly in solver block')
+
+    assemblyType = assemblyProps.type
+
+    assembler = getattr(__import__('pyfem.fem.'+assemblyType , globals(), locals(), assemblyType , 0 ), assemblyType )
 
-      #for label in elemdat.outlabel:	
-      #  element.appendNodalOutput( label , globdat , elemdat.outdata )
+    globdat.assembler = assembler( props , globdat , assemblyProps )
 
-      #Assemble in the global array
-      if rank == 1:
-        B[el_dofs] += elemdat.fint
-      elif rank == 2 and action == "getTangentStiffness":  
-        #A[ix_(el_dofs,el_dofs)] += elemdat.stiff
+  return globdat.assembler
 
-        row = append(row,repeat(el_dofs,len(el_dofs)))
 
-        for i in range(len(el_dofs)):
-          col=append(col,el_dofs)        
+#######################################
+# General array assembly routine for: # 
+# * assembleInternalForce             #
+# * assembleTangentStiffness          #
+#######################################
+
+def assembleArray ( props, globdat, rank, action ):
+
+  assembler = getParallelAssembler( props , globdat )
+
+  if assembler is not None:
+    return assembler.assembleArray( props , globdat , rank , action )
+
+  #Initialize the global array A with rank 2
+
+  B = zeros( len(globdat.dofs) * ones(1,dtype=int) )
+
+  nDof  = len(globdat.dofs)
+
+  #Only the data array of the CSR matrix is assembled, the structure is
+  #taken from the cached sparsity pattern
+
+  if rank == 2:
+    pattern = getSparsityPattern( globdat )
+    val     = zeros( pattern.nnz )
+
+  if action != 'commit':
+    globdat.resetNodalOutput()
 
-        val = append(val,elemdat.stiff.reshape(len(el_dofs)*len(el_dofs)))
+  #Loop over the element groups
+  for elementGroup in globdat.elements.iterGroupNames():
 
-        B[el_dofs] += elemdat.fint
-      elif rank == 2 and action == "getMassMatrix": 
+    #Get the properties corresponding to the elementGroup
+    el_props = getattr( props, elementGroup )
 
-        row = append(row,repeat(el_dofs,len(el_dofs)))
+    groupDofs = globdat.dofs.getElementDofs( elementGroup )
 
-        for i in range(len(el_dofs)):
-          col=append(col,el_dofs)        
+    block,vec,el_dofs = evaluateElements( globdat , elementGroup , arange( len(groupDofs) ) , \
+                                          groupDofs , el_props , rank , action )
 
-        val = append(val,elemdat.mass.reshape(len(el_dofs)*len(el_dofs))) 
+    #Assemble in the global array, repeated dofs are summed by bincount
+    if rank > 0:
+      B += bincount( el_dofs , weights = vec , minlength = nDof )
 
-        B[el_dofs] += elemdat.lumped
+    if rank == 2:
+      val += bincount( pattern.scatter[elementGroup] , weights = block , minlength = pattern.nnz )
   #    else:
   #      raise NotImplementedError('assemleArray is only implemented for vectors and matrices.')
 
   if rank == 1:
     return B
   elif rank == 2:
-    return coo_matrix((val,(row,col)), shape=(nDof,nDof)),B
+    return pattern.getMatrix( val ),B
 
 
 ##########################################
@@ -24,13 +24,17 @@
 #  event caused by the use of the program.                                 #
 ############################################################################
 
-from numpy import array, dot, zeros
+from numpy import array, dot, zeros, ones, arange, ix_, concatenate
 import scipy.linalg
-from scipy.sparse import coo_matrix
+from scipy.sparse import coo_matrix, issparse
 
 class Constrainer:
 
-  '''Constrainer class'''
+  '''Constrainer class. The constrained dofs and their values are stored per
+     label (load case). While constraints are added, they are collected in
+     lists, together with a dictionary with the position of each dof in the
+     list. The lists are converted to arrays in flush, which has to be called
+     after adding constraints.'''
   
   def __init__( self , nDofs , name = "Main" ):
   
@@ -38,10 +42,21 @@ class Constrainer:
     self.constrainData   = {}
     self.name            = name
     
-    self.constrainedDofs = {}
-    self.constrainedVals = {}
-    self.constrainedFac  = {}
+    self.constrainedDofs  = {}
+    self.constrainedVals  = {}
+    self.constrainedFac   = {}
+    self.constrainedIndex = {}
     
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def addLabel( self , label ):
+
+    self.constrainedDofs [label] = []
+    self.constrainedVals [label] = []
+    self.constrainedFac  [label] = 1.0
+    self.constrainedIndex[label] = {}
     
 #-------------------------------------------------------------------------------
 #
@@ -50,22 +65,30 @@ class Constrainer:
   def addConstraint(self,dofID,val,label):
   
     self.constrainData[dofID] = val   
-    
-    if dofID in self.constrainedDofs[label]:
+
+    if type(val) is list:
+      slaveDof = val[1]
+      val      = val[0]
+    else:
+      slaveDof = None
+
+    if dofID in self.constrainedIndex[label]:
       self.setFactorForDof( val , dofID, label )
       return
+
+    #Continue with the lists when the constraints were flushed before
+
+    if type(self.constrainedDofs[label]) is not list:
+      self.constrainedDofs[label] = self.constrainedDofs[label].tolist()
+      self.constrainedVals[label] = self.constrainedVals[label].tolist()
+
+    self.constrainedIndex[label][dofID] = len(self.constrainedDofs[label])
            
     self.constrainedDofs[label].append( dofID )
-    
-    if type(val) is list:
-      if len(val) == 3:
-        self.constrainedVals[label].append( val[0] )
-    else:
-      self.constrainedVals[label].append( val )
-            
-    if type(val) is list:
-      if len(val) == 3:
-        self.constrainData[val[1]] = "S"
+    self.constrainedVals[label].append( val )
+
+    if slaveDof is not None:
+      self.constrainData[slaveDof] = "S"
         
 #-------------------------------------------------------------------------------
 #
@@ -74,34 +97,91 @@ class Constrainer:
   def flush ( self ):
   
     '''Returns the constraints matrix using the class member arrays'''
-    
-    row = []
-    col = [] 
-    val = [] 
 
-    j = 0
-    
-    for i in range(self.nDofs):
-      
-      if i in self.constrainData:
-        if type(self.constrainData[i]) is not list:
-          #this a pure slave            
-          continue
-        else:
-          slaves = self.constrainData[i]
-                              
-          row.append(slaves[1])
-          col.append(j)
-          val.append(slaves[2])
-                    
-      row.append(i)
-      col.append(j)
-      val.append(1.)
-        
-      j+=1
-        
-    self.C = coo_matrix((val,(row,col)), shape=(self.nDofs,j))
+    for label in self.constrainedDofs.keys():
+      self.constrainedDofs[label] = array( self.constrainedDofs[label] , dtype=int )
+      self.constrainedVals[label] = array( self.constrainedVals[label] , dtype=float )
+
+    #Each dof that is not constrained has a column in C. A dof that is tied
+    #to a slave dof also has a column, with the factor in the row of the 
+    #slave dof. 
+
+    ties = [ ( i , val ) for i,val in self.constrainData.items() if type(val) is list ]
+
+    isColumn = ones( self.nDofs , dtype=bool )
+
+    isColumn[list(self.constrainData.keys())] = False
+
+    tieDofs = array( [ i for i,val in ties ] , dtype=int )
+
+    isColumn[tieDofs] = True
+
+    columns = isColumn.nonzero()[0]
+
+    colIndex = zeros( self.nDofs , dtype=int )
+    colIndex[columns] = arange( len(columns) )
+
+    row = concatenate( [ columns , array( [ val[1] for i,val in ties ] , dtype=int ) ] )
+    col = concatenate( [ arange( len(columns) ) , colIndex[tieDofs] ] )
+    val = concatenate( [ ones( len(columns) ) , array( [ val[2] for i,val in ties ] , dtype=float ) ] )
+
+    self.C = coo_matrix((val,(row,col)), shape=(self.nDofs,len(columns)))
+
+    #The dof that corresponds to each column of C, e.g. for the nodal blocks
+    #of a preconditioner
+
+    self.columnDofs = columns
+
+    #Without ties between dofs, C only selects the free dofs. The 
+    #constrained systems are then formed by slicing, see 
+    #getConstrainedMatrix. Otherwise freeDofs is None.
+
+    if len(ties) == 0:
+      self.freeDofs = columns
+    else:
+      self.freeDofs = None
+
+#-------------------------------------------------------------------------------
+#  Returns the matrix C^T A C of the independent dofs. Without ties, this is 
+#  the submatrix of the free dofs, which is taken from A by slicing.
+#-------------------------------------------------------------------------------
+
+  def getConstrainedMatrix( self , A ):
+
+    if self.freeDofs is None:
+      return self.C.transpose() * ( A * self.C )
+
+    if issparse( A ):
+      return A.tocsr()[self.freeDofs][:,self.freeDofs]
+
+    return A[ix_(self.freeDofs,self.freeDofs)]
+
+#-------------------------------------------------------------------------------
+#  Returns the vector C^T b of the independent dofs
+#-------------------------------------------------------------------------------
+
+  def getConstrainedVector( self , b ):
+
+    if self.freeDofs is None:
+      return self.C.transpose() * b
+
+    return b[self.freeDofs]
+
+#-------------------------------------------------------------------------------
+#  Returns the full vector C x for the vector x of the independent dofs. The
+#  columns of a 2D array x are treated as separate vectors.
+#-------------------------------------------------------------------------------
+
+  def getFullVector( self , x ):
+
+    if self.freeDofs is None:
+      return self.C * x
+
+    a = zeros( ( self.nDofs , ) + x.shape[1:] )
+
+    a[self.freeDofs] = x
 
+    return a
 
 #-------------------------------------------------------------------------------
 #
@@ -110,7 +190,7 @@ class Constrainer:
   def addConstrainedValues( self , a ):
   
     for name in self.constrainedDofs.keys():            
-      a[self.constrainedDofs[name]] += self.constrainedFac[name] * array(self.constrainedVals[name])
+      a[self.constrainedDofs[name]] += self.constrainedFac[name] * self.constrainedVals[name]
       
 #-------------------------------------------------------------------------------
 #
@@ -119,7 +199,7 @@ class Constrainer:
   def setConstrainedValues( self , a ):
   
     for name in self.constrainedDofs.keys():             
-      a[self.constrainedDofs[name]] = self.constrainedFac[name] * array(self.constrainedVals[name])
+      a[self.constrainedDofs[name]] = self.constrainedFac[name] * self.constrainedVals[name]
       
 #-------------------------------------------------------------------------------
 #
@@ -139,7 +219,7 @@ class Constrainer:
 
   def setFactorForDof( self , fac , dofID , label ):
     
-    idx = self.constrainedDofs[label].index(dofID)
+    idx = self.constrainedIndex[label][dofID]
     self.constrainedVals[label][idx] = fac
     
 #---------------------------------------------------
@@ -24,15 +24,16 @@
 #  event caused by the use of the program.                                 #
 ############################################################################
 
-from numpy import array, dot, zeros
+from numpy import array, dot, zeros, empty, ix_
 import scipy.linalg
 
-from scipy.sparse.linalg   import spsolve
 from scipy.sparse.linalg   import eigsh
 from pyfem.util.itemList   import itemList
 from pyfem.util.fileParser import readNodeTable
 from pyfem.util.logger     import getLogger
 from pyfem.fem.Constrainer import Constrainer
+from pyfem.fem.Factorization import Factorization
+from pyfem.fem.LinearSolvers import DirectSolver, getLinearSolver
 
 from copy import deepcopy
 
@@ -54,6 +55,10 @@ class DofSpace:
 
     self.allConstrainedDofs = []
 
+    self.linearSolver = DirectSolver()
+
+    self.createElementDofs( elements )
+
 #
 #
 #
@@ -100,9 +105,7 @@ class DofSpace:
       
       label = nodeTable.subLabel
 
-      cons.constrainedDofs[label] = []
-      cons.constrainedVals[label] = []
-      cons.constrainedFac [label] = 1.0
+      cons.addLabel( label )
       
       for item in nodeTable.data:
         nodeID  = item[1]
@@ -162,13 +165,62 @@ class DofSpace:
   
     '''Returns all dofIDs for given list of dofType for a list of nodes'''
 
-    dofs = []
-        
-    for node in nodeIDs:
-      for dofType in dofTypes:
-        dofs.append(self.dofs[self.IDmap.get( node ),self.dofTypes.index(dofType)])
-      
-    return dofs
+    typeIndices = [ self.dofTypes.index(dofType) for dofType in dofTypes ]
+
+    return self.dofs[ ix_( self.IDmap.get( list(nodeIDs) ) , typeIndices ) ].flatten()
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def createElementDofs( self , elements ):
+
+    '''Creates the table with the dofIDs of all elements for each element
+       group. When all elements in a group have the same number of dofs, the
+       table is an (nElem x nDof) integer array. Otherwise, it is an object
+       array that contains an integer array for each element.'''
+
+    self.elementDofs = {}
+
+    for groupName in elements.iterGroupNames():
+
+      #The table of a batched group is constructed from the connectivity
+      #array, without creating the elements
+      if elements.isBatched( groupName ):
+        connectivity = elements.getConnectivity( groupName )
+
+        if connectivity.dtype != object:
+          dofTypes    = elements.getGroupElement( groupName ).dofTypes
+          typeIndices = [ self.dofTypes.index(dofType) for dofType in dofTypes ]
+          nodeIndices = self.IDmap.getIndexArray( connectivity )
+
+          self.elementDofs[groupName] = self.dofs[nodeIndices[:,:,None],typeIndices].reshape( len(connectivity) , -1 )
+          continue
+
+      groupElements = list( elements.iterElementGroup( groupName ) )
+
+      el_dofs = [ self.getForTypes( element.getNodes() , element.dofTypes ) for element in groupElements ]
+
+      if len(el_dofs) == 0:
+        table = zeros( (0,0) , dtype=int )
+      elif len(set( [ len(dofs) for dofs in el_dofs ] )) == 1:
+        table = array( el_dofs , dtype=int )
+      else:
+        table    = empty( len(el_dofs) , dtype=object )
+        table[:] = el_dofs
+
+      self.elementDofs[groupName] = table
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def getElementDofs( self , groupName ):
+
+    '''Returns the table with the dofIDs of the elements in a group, in the
+       order of the group.'''
+
+    return self.elementDofs[groupName]
 
 #-------------------------------------------------------------------------------
 #
@@ -218,12 +270,12 @@ class DofSpace:
       
       constrainer.addConstrainedValues( a )
 
-      A_constrained = constrainer.C.transpose() * (A * constrainer.C )
-      b_constrained = constrainer.C.transpose() * ( b - A * a )
+      A_constrained = constrainer.getConstrainedMatrix( A )
+      b_constrained = constrainer.getConstrainedVector( b - A * a )
             
-      x_constrained = spsolve( A_constrained, b_constrained )
+      x_constrained = self.linearSolver.solve( A_constrained, b_constrained, constrainer.columnDofs )
 
-      x = constrainer.C * x_constrained
+      x = constrainer.getFullVector( x_constrained )
       
       constrainer.addConstrainedValues( x )
           
@@ -235,6 +287,36 @@ class DofSpace:
     return x
     
     
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def setLinearSolver ( self, props ):
+
+    '''Selects the solver of the constrained systems, see 
+       pyfem.fem.LinearSolvers.getLinearSolver'''
+
+    self.linearSolver = getLinearSolver( props , self )
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def factorize ( self, A, constrainer = None ):
+
+    '''Returns the factorization of the constrained matrix A, which solves the
+       system Ax = b for any number of right-hand sides b. The factorization
+       is stored and only recomputed when A or the constraints have changed.'''
+
+    if constrainer is None:
+      constrainer = self.cons
+
+    if not hasattr( self , "factorization" ) or \
+       not self.factorization.isValid( A , constrainer , self.linearSolver ):
+      self.factorization = Factorization( A , constrainer , self.linearSolver )
+
+    return self.factorization
+
 #-------------------------------------------------------------------------------
 #
 #-------------------------------------------------------------------------------
@@ -244,15 +326,12 @@ class DofSpace:
     '''Calculates the first count eigenvlaues and eigenvectors of a
        system with ( A lambda B ) x '''
        
-    A_constrained = dot( dot( self.cons.C.transpose(), A ), self.cons.C )
-    B_constrained = dot( dot( self.cons.C.transpose(), B ), self.cons.C )
+    A_constrained = self.cons.getConstrainedMatrix( A )
+    B_constrained = self.cons.getConstrainedMatrix( B )
 
     eigvals , eigvecs = eigsh( A_constrained, count , B_constrained , sigma = 0. , which = 'LM' )
 
-    x = zeros(shape=(len(self),count))
-
-    for i,psi in enumerate(eigvecs.transpose()):
-      x[:,i] = self.cons.C * psi
+    x = self.cons.getFullVector( eigvecs )
       
     return eigvals,x
 
@@ -262,4 +341,4 @@ class DofSpace:
 
   def norm ( self, r ):
     
-    return scipy.linalg.norm( self.cons.C.transpose() * r )
+    return scipy.linalg.norm( self.cons.getConstrainedVector( r ) )
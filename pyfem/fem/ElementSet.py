@@ -25,14 +25,91 @@
 ############################################################################
 
 import re
+from numpy import zeros, array, empty
+from threading import Lock
 from pyfem.util.itemList import itemList
+from pyfem.elements.Element import Element
 from pyfem.util.logger   import getLogger
 from pyfem.util.dataStructures import solverStatus
 
 logger = getLogger()
 
+#-------------------------------------------------------------------------------
+#  Node IDs of the elements in a group. As long as all elements have the same
+#  number of nodes, they are stored in a (nElem x nNodes) integer array that 
+#  grows when elements are added. Otherwise, a list of node lists is kept.
+#-------------------------------------------------------------------------------
+
+class GroupConnectivity:
+
+  def __init__ ( self ):
+
+    self.store = None
+    self.count = 0
+
+  def __len__ ( self ):
+
+    return self.count
+
+  def append ( self , elementNodes ):
+
+    if self.store is None:
+      self.store = zeros( shape=( 16 , len(elementNodes) ) , dtype=int )
+    elif isinstance( self.store , list ):
+      self.store.append( list(elementNodes) )
+      self.count += 1
+      return
+    elif len(elementNodes) != self.store.shape[1]:
+      self.store = self.store[:self.count].tolist()
+      self.store.append( list(elementNodes) )
+      self.count += 1
+      return
+
+    if self.count == len(self.store):
+      store = zeros( shape=( 2*self.count , self.store.shape[1] ) , dtype=int )
+      
+      store[:self.count] = self.store
+      self.store = store
+
+    self.store[self.count] = elementNodes
+    self.count += 1
+
+  def isUniform ( self ):
+
+    return not isinstance( self.store , list )
+
+  def getNodes ( self , row ):
+
+    if isinstance( self.store , list ):
+      return list( self.store[row] )
+    
+    return self.store[row].tolist()
+
+  def getArray ( self ):
+
+    if self.store is None:
+      return zeros( shape=(0,0) , dtype=int )
+    elif isinstance( self.store , list ):
+      table    = empty( self.count , dtype=object )
+      table[:] = self.store
+      return table
+
+    return self.store[:self.count]
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
 class ElementSet( itemList ):
 
+  '''Elements of a type that supports batched evaluation (group kernels, see
+     Assembly.py) are not created when they are added. Only the connectivity
+     is stored and the element object is created on first access. The 
+     assembly of such a group does not access the elements, the group 
+     kernels are called on a single group element instead, see 
+     getGroupElement. An element that is created by accessing it does not
+     share the state of the group element, such as its material history.'''
+
   def __init__ ( self, nodes, props ):
 
     itemList.__init__( self )
@@ -41,20 +118,49 @@ class ElementSet( itemList ):
     self.props  = props
     self.solverStat = solverStatus()
     self.groups = {}
+    self.workers = None
+    self.connectivity = {}
+    self.elementTypes = {}
+    self.groupElements = {}
+
+#-------------------------------------------------------------------------------
+#  Creates the element when it has not been created yet
+#-------------------------------------------------------------------------------
+
+  def __getitem__ ( self, ID ):
+
+    element = dict.__getitem__( self , ID )
+
+    if type(element) is tuple:
+      modelName , row = element
+
+      element = self.createElement( modelName , self.connectivity[modelName].getNodes( row ) )
+
+      dict.__setitem__( self , ID , element )
+
+    return element
 
 #-------------------------------------------------------------------------------
 #
 #-------------------------------------------------------------------------------
 
-  def __iter__ ( self ):
+  def values ( self ):
+
+    return ( self[ID] for ID in self.keys() )
+
+  def items ( self ):
+
+    return ( ( ID , self[ID] ) for ID in self.keys() )
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
 
-    elements = []
+  def __iter__ ( self ):
 
     for groupName in self.iterGroupNames():
       for element in self.iterElementGroup( groupName ):
-        elements.append( element )
-       
-    return iter( elements )
+        yield element
 
 #-------------------------------------------------------------------------------
 #
@@ -80,10 +186,19 @@ class ElementSet( itemList ):
 
     dofTypes = []
 
-    for element in self:
-      for dofType in element.dofTypes:
-        if dofType not in dofTypes:
-          dofTypes.append( dofType )
+    for groupName in self.iterGroupNames():
+      
+      #All elements of a type with group kernels have the same dof types
+      if len(self.groups[groupName]) > 0 and groupName in self.connectivity and \
+          hasGroupKernels( self.getElementType( groupName ) ):
+        elements = [ self.getGroupElement( groupName ) ]
+      else:
+        elements = self.iterElementGroup( groupName )
+
+      for element in elements:
+        for dofType in element.dofTypes:
+          if dofType not in dofTypes:
+            dofTypes.append( dofType )
 
     return dofTypes
     
@@ -153,6 +268,55 @@ class ElementSet( itemList ):
           
     if hasattr( self.props, modelName ):
 
+      element = self.getElementType( modelName )
+
+      #  Check if the node IDs are valid:
+
+      for nodeID in elementNodes:
+        if not nodeID in self.nodes:
+          raise RuntimeError('Node ID ' + str(nodeID) + ' does not exist')
+
+      if modelName not in self.connectivity:
+        self.connectivity[modelName] = GroupConnectivity()
+
+      #  Elements that support batched evaluation are created on first
+      #  access, the others right away
+      
+      if hasGroupKernels( element ):
+        elem = ( modelName , len(self.connectivity[modelName]) )
+      else:
+        elem = self.createElement( modelName , elementNodes )
+
+      self.connectivity[modelName].append( elementNodes )
+
+      #  Add the element to the element set:
+
+      itemList.add( self, ID, elem )
+
+      #  Add the element to the correct group:
+
+      self.addToGroup( modelName, ID )
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def createElement ( self, modelName, elementNodes ):
+
+    element = self.getElementType( modelName )
+
+    #All elements in the group share the same properties object
+
+    return element( elementNodes , getattr( self.props, modelName ) )
+
+#-------------------------------------------------------------------------------
+#  Returns the element class of a model. The class is imported once and the
+#  shared group properties are completed at the same time.
+#-------------------------------------------------------------------------------
+
+  def getElementType ( self, modelName ):
+
+    if modelName not in self.elementTypes:
       modelProps = getattr( self.props, modelName )
 
       #Check if the model has a type
@@ -160,29 +324,69 @@ class ElementSet( itemList ):
         raise RuntimeError('Missing type for model ' + modelName)
       
       modelType = getattr( modelProps, 'type' )
- 
+
       modelProps.rank       = self.nodes.rank
       modelProps.solverStat = self.solverStat
 
-      element = getattr(__import__('pyfem.elements.'+modelType , globals(), locals(), modelType , 0 ), modelType )
+      self.elementTypes[modelName] = getattr(__import__('pyfem.elements.'+modelType , globals(), locals(), modelType , 0 ), modelType )
 
-      #Create the element
- 
-      elem = element( elementNodes , modelProps )
+    return self.elementTypes[modelName]
 
-      #  Check if the node IDs are valid:
+#-------------------------------------------------------------------------------
+#  True when the group is evaluated by the group kernels of its element type.
+#  This is decided from the element class and the connectivity of the group:
+#  all elements of the group have to be added through add and have the same
+#  number of nodes.
+#-------------------------------------------------------------------------------
 
-      for nodeID in elem.getNodes():
-        if not nodeID in self.nodes:
-          raise RuntimeError('Node ID ' + str(nodeID) + ' does not exist')
+  def isBatched ( self, groupName ):
 
-      #  Add the element to the element set:
+    IDs = self.groups[groupName]
 
-      itemList.add( self, ID, elem )
+    if len(IDs) == 0 or groupName not in self.connectivity:
+      return False
 
-      #  Add the element to the correct group:
+    connectivity = self.connectivity[groupName]
 
-      self.addToGroup( modelName, ID )
+    return len(connectivity) == len(IDs) and connectivity.isUniform() and \
+           hasGroupKernels( self.getElementType( groupName ) )
+
+#-------------------------------------------------------------------------------
+#  Returns the element on which the group kernels of a group are called. It 
+#  is created once from the first row of the connectivity and is not part of
+#  the element set. It holds the state of all elements in the group: the 
+#  material points of the element in row r are r*nIP,...,r*nIP+nIP-1 in its
+#  MaterialManager, see also Element.getGroupHistory.
+#-------------------------------------------------------------------------------
+
+  def getGroupElement ( self, groupName ):
+
+    if groupName not in self.groupElements:
+      with groupLock:
+        if groupName not in self.groupElements:
+          self.groupElements[groupName] = \
+            self.createElement( groupName , self.connectivity[groupName].getNodes( 0 ) )
+
+    return self.groupElements[groupName]
+
+#-------------------------------------------------------------------------------
+#  Returns the node IDs of the elements in a group as a (nElem x nNodes) 
+#  integer array, or as an object array of lists when the number of nodes
+#  differs.
+#-------------------------------------------------------------------------------
+
+  def getConnectivity ( self, groupName ):
+
+    if groupName in self.connectivity and \
+        len(self.connectivity[groupName]) == len(self.groups[groupName]):
+      return self.connectivity[groupName].getArray()
+
+    connectivity = GroupConnectivity()
+
+    for element in self.iterElementGroup( groupName ):
+      connectivity.append( element.getNodes() )
+
+    return connectivity.getArray()
 
 #-------------------------------------------------------------------------------
 #
@@ -217,7 +421,7 @@ class ElementSet( itemList ):
     if groupName == "All":
       return iter( self )
     else:
-      return iter( self.get( self.groups[groupName] ) )
+      return ( self[ID] for ID in self.groups[groupName] )
 
 #-------------------------------------------------------------------------------
 #
@@ -235,5 +439,38 @@ class ElementSet( itemList ):
 
   def commitHistory ( self ):
 
-    for element in list(self.values()):
+    #When the elements are evaluated in worker processes, the history is 
+    #committed there
+
+    workers = getattr( self , 'workers' , None )
+    
+    if workers is not None and workers.isActive():
+      workers.commitHistory()
+      return
+
+    for element in self.groupElements.values():
       element.commitHistory()
+
+    #Elements that have not been created yet have no history of their own
+
+    for element in dict.values( self ):
+      if type(element) is not tuple:
+        element.commitHistory()
+
+#-------------------------------------------------------------------------------
+#  An element type supports batched evaluation when it provides at least one 
+#  group kernel getGroup<Action>. The helpers of the Element base class, such
+#  as getGroupHistory, do not count.
+#-------------------------------------------------------------------------------
+
+batchedTypes = {}
+
+def hasGroupKernels ( elementType ):
+
+  if elementType not in batchedTypes:
+    batchedTypes[elementType] = any( [ name.startswith('getGroup') and not hasattr( Element , name ) \
+                                       for name in dir( elementType ) ] )
+
+  return batchedTypes[elementType]
+
+groupLock = Lock()
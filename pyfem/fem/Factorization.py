@@ -0,0 +1,120 @@
+############################################################################
+#  This Python file is part of PyFEM, the code that accompanies the book:  #
+#                                                                          #
+#    'Non-Linear Finite Element Analysis of Solids and Structures'         #
+#    R. de Borst, M.A. Crisfield, J.J.C. Remmers and C.V. Verhoosel        #
+#    John Wiley and Sons, 2012, ISBN 978-0470666449                        #
+#                                                                          #
+#  The code is written by J.J.C. Remmers, C.V. Verhoosel and R. de Borst.  #
+#                                                                          #
+#  The latest stable version can be downloaded from the web-site:          #
+#     http://www.wiley.com/go/deborst                                      #
+#                                                                          #
+#  A github repository, with the most up to date version of the code,      #
+#  can be found here:                                                      #
+#     https://github.com/jjcremmers/PyFEM                                  #
+#                                                                          #
+#  The code is open source and intended for educational and scientific     #
+#  purposes only. If you use PyFEM in your research, the developers would  #
+#  be grateful if you could cite the book.                                 #  
+#                                                                          #
+#  Disclaimer:                                                             #
+#  The authors reserve all rights but do not guarantee that the code is    #
+#  free from errors. Furthermore, the authors shall not be liable in any   #
+#  event caused by the use of the program.                                 #
+############################################################################
+
+from numpy import zeros
+from zlib import crc32
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+class Factorization:
+
+  '''Factorization of the constrained system matrix C^T K C, computed by the 
+     linear solver of the DofSpace. For the default direct solver, these are
+     the LU factors of scipy.sparse.linalg.splu, for an iterative solver the
+     preconditioner. The factorization is reused for every right-hand side
+     passed to solve, e.g. both solves in an iteration of an arc-length 
+     method. The factorization is no longer valid when a new matrix K is 
+     passed, when the data of K is modified in place or when the constraints
+     are flushed again, see isValid.'''
+
+  def __init__( self , K , constrainer , linearSolver ):
+
+    self.matrix       = K
+    self.constrainer  = constrainer
+    self.linearSolver = linearSolver
+    self.C            = constrainer.C
+    self.checksum     = getChecksum( K )
+
+    self.solver = linearSolver.factorize( constrainer.getConstrainedMatrix( K ) , \
+                                          constrainer.columnDofs )
+        
+#-------------------------------------------------------------------------------
+#  The factors can not be pickled, e.g. by DataDump. An unpickled 
+#  factorization is not valid and is replaced in the next call of 
+#  DofSpace.factorize.
+#-------------------------------------------------------------------------------
+
+  def __getstate__ ( self ):
+
+    return {}
+
+  def __setstate__ ( self , state ):
+
+    self.matrix = None
+    self.solver = None
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def isValid( self , K , constrainer , linearSolver ):
+
+    '''Returns True if the factorization was computed for the matrix K with
+       the current constraints and linear solver'''
+
+    return K is self.matrix and constrainer is self.constrainer and \
+           linearSolver is self.linearSolver and constrainer.C is self.C and \
+           getChecksum( K ) == self.checksum
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def solve( self , b ):
+
+    '''Solves the system Kx = b using the internal constraints matrix. The 
+       columns of a 2D array b are solved as separate right-hand sides. 
+       Returns the total solution vector(s) x.'''
+
+    a = zeros( self.matrix.shape[0] )
+
+    self.constrainer.addConstrainedValues( a )
+
+    Ka = self.matrix.dot( a )
+
+    if b.ndim == 2:
+      a  = a [:,None]
+      Ka = Ka[:,None]
+
+    b_constrained = self.constrainer.getConstrainedVector( b - Ka )
+
+    x = self.constrainer.getFullVector( self.solver( b_constrained ) )
+
+    return x + a
+
+#-------------------------------------------------------------------------------
+#  Returns a checksum of the entries of the matrix K, which is used to detect
+#  in-place modifications of K.
+#-------------------------------------------------------------------------------
+
+def getChecksum( K ):
+
+  if hasattr( K , "data" ) and hasattr( K.data , "tobytes" ):
+    return crc32( K.data.tobytes() )
+
+  return crc32( K.tobytes() )
@@ -0,0 +1,399 @@
+############################################################################
+#  This Python file is part of PyFEM, the code that accompanies the book:  #
+#                                                                          #
+#    'Non-Linear Finite Element Analysis of Solids and Structures'         #
+#    R. de Borst, M.A. Crisfield, J.J.C. Remmers and C.V. Verhoosel        #
+#    John Wiley and Sons, 2012, ISBN 978-0470666449                        #
+#                                                                          #
+#  The code is written by J.J.C. Remmers, C.V. Verhoosel and R. de Borst.  #
+#                                                                          #
+#  The latest stable version can be downloaded from the web-site:          #
+#     http://www.wiley.com/go/deborst                                      #
+#                                                                          #
+#  A github repository, with the most up to date version of the code,      #
+#  can be found here:                                                      #
+#     https://github.com/jjcremmers/PyFEM                                  #
+#                                                                          #
+#  The code is open source and intended for educational and scientific     #
+#  purposes only. If you use PyFEM in your research, the developers would  #
+#  be grateful if you could cite the book.                                 #  
+#                                                                          #
+#  Disclaimer:                                                             #
+#  The authors reserve all rights but do not guarantee that the code is    #
+#  free from errors. Furthermore, the authors shall not be liable in any   #
+#  event caused by the use of the program.                                 #
+############################################################################
+
+from numpy import zeros, empty, arange, unique, bincount, cumsum, dot, column_stack, add, nonzero, \
+                  array_equal
+from numpy.linalg import inv, norm
+from scipy import __version__ as scipyVersion
+from scipy.sparse import csc_matrix, csr_matrix, coo_matrix, diags
+from scipy.sparse.linalg import spsolve, splu, spilu, cg, minres, gmres, bicgstab, LinearOperator
+from pyfem.fem.AMGPreconditioner import AMGPreconditioner, getTriangularSolver
+from pyfem.util.logger import getLogger
+
+logger = getLogger()
+
+#The relative tolerance of the Krylov methods is called rtol as of scipy 1.12,
+#older versions only accept tol
+
+if tuple( int(v) for v in scipyVersion.split('.')[:2] ) >= ( 1 , 12 ):
+  tolName = "rtol"
+else:
+  tolName = "tol"
+
+#-------------------------------------------------------------------------------
+#  Returns the solver for the constrained linear systems that is specified in
+#  the solver block of the input file, e.g.
+#
+#    solver = { ... ; linearSolver = { type = "cg"; preconditioner = "ilu"; tol = 1e-8; }; };
+#
+#  The available types are listed in linearSolvers, the preconditioners of 
+#  the iterative solvers in preconditioners. The methods in symmetricMethods
+#  require a symmetric positive definite preconditioner.
+#-------------------------------------------------------------------------------
+
+def getLinearSolver( props , dofSpace ):
+
+  solverType = getattr( props , "type" , "direct" ).lower()
+
+  if solverType not in linearSolvers:
+    raise RuntimeError('Linear solver type ' + solverType + ' not known')
+
+  return linearSolvers[solverType]( props , dofSpace )
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+class DirectSolver:
+
+  '''Solves the constrained systems with SuperLU. The column ordering that 
+     reduces the fill-in is selected with permcSpec (NATURAL, MMD_ATA, 
+     MMD_AT_PLUS_A or COLAMD), see scipy.sparse.linalg.splu.'''
+
+  def __init__( self , props = None , dofSpace = None ):
+
+    self.permcSpec = getattr( props , "permcSpec" , "COLAMD" )
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def solve( self , A , b , columnDofs = None ):
+
+    return spsolve( A , b , permc_spec = self.permcSpec )
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def factorize( self , A , columnDofs = None ):
+
+    '''Returns a function that solves the system for one or more right-hand 
+       sides with the LU factors of A.'''
+
+    return splu( csc_matrix( A ) , permc_spec = self.permcSpec ).solve
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+class IterativeSolver:
+
+  '''Solves the constrained systems with one of the Krylov methods in 
+     krylovMethods. The iterations stop when the norm of the residual is
+     smaller than tol times the norm of the right-hand side. The solution of
+     the previous system, e.g. the previous Newton correction, is used as 
+     initial guess. It is scaled such that the initial residual is minimal, 
+     a guess that does not resemble the solution is then not used. The number
+     of iterations of every solve is reported. When the method does not 
+     converge within maxIter iterations or breaks down, an error is raised.
+     With fallback = "direct", a warning is given and the system is solved 
+     with the direct solver instead.'''
+
+  def __init__( self , props , dofSpace ):
+
+    self.type      = props.type.lower()
+    self.tol       = getattr( props , "tol"       , 1.0e-8 )
+    self.maxIter   = getattr( props , "maxIter"   , 1000 )
+    self.restart   = getattr( props , "restart"   , 20 )
+    self.warmStart = getattr( props , "warmStart" , True )
+    self.fallback  = getattr( props , "fallback"  , "none" ).lower()
+
+    if self.fallback not in [ "none" , "direct" ]:
+      raise RuntimeError('Fallback ' + self.fallback + ' not known')
+
+    precondType = getattr( props , "preconditioner" , "none" ).lower()
+
+    if precondType not in preconditioners:
+      raise RuntimeError('Preconditioner ' + precondType + ' not known')
+
+    if preconditioners[precondType] is None:
+      self.preconditioner = None
+    else:
+      self.preconditioner = preconditioners[precondType]( props , dofSpace )
+
+      if self.type in symmetricMethods and not self.preconditioner.symmetric:
+        raise RuntimeError('Linear solver ' + self.type + ' requires a symmetric preconditioner, ' + \
+                           precondType + ' is not symmetric')
+
+    self.x0              = None
+    self.iterations      = 0
+    self.totalIterations = 0
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def solve( self , A , b , columnDofs = None ):
+
+    return self.factorize( A , columnDofs )( b )
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def factorize( self , A , columnDofs = None ):
+
+    '''Returns a function that solves the system for one or more right-hand
+       sides. The preconditioner is constructed once for all solves.'''
+
+    if self.preconditioner is None:
+      M = None
+    else:
+      M = self.preconditioner.getOperator( A , columnDofs )
+
+    return lambda b : self.iterate( A , b , M )
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def iterate( self , A , b , M ):
+
+    if b.ndim == 2:
+      return column_stack( [ self.iterate( A , col , M ) for col in b.T ] )
+
+    self.iterations = 0
+
+    def count( xk ):
+      self.iterations += 1
+
+    #The system is scaled to a right-hand side with a unit norm, since the 
+    #breakdown tests of the Krylov methods use absolute tolerances
+
+    scale = norm( b )
+
+    if scale == 0.:
+      return zeros( len(b) )
+
+    b   = b / scale
+    x   = self.getInitialGuess( A , b )
+    tol = self.tol
+
+    #The stopping tests of the Krylov methods differ, e.g. minres compares the
+    #residual with the norm of A times the norm of x. The method is restarted
+    #from the last iterate with a smaller tolerance until the norm of the 
+    #true residual is smaller than tol.
+
+    while True:
+      start = self.iterations
+
+      if self.type == "gmres":
+        x,info = gmres( A , b , x0 = x , M = M , restart = self.restart , \
+                        maxiter = max( 1 , ( self.maxIter - start ) // self.restart ) , \
+                        callback = count , callback_type = "pr_norm" , **{ tolName : tol } )
+      else:
+        x,info = krylovMethods[self.type]( A , b , x0 = x , M = M , maxiter = self.maxIter - start , \
+                                           callback = count , **{ tolName : tol } )
+
+      residual = norm( b - A.dot( x ) )
+
+      if residual <= self.tol or info != 0 or self.iterations == start or \
+         self.iterations >= self.maxIter:
+        break
+
+      tol = max( tol * self.tol / residual , 1.0e-15 )
+
+    self.totalIterations += self.iterations
+
+    if residual <= self.tol:
+      logger.info('    Linear solver %s converged in %i iterations' % ( self.type , self.iterations ) )
+    else:
+      if info < 0:
+        msg = 'Linear solver %s broke down after %i iterations' % ( self.type , self.iterations )
+      else:
+        msg = 'Linear solver %s not converged in %i iterations, relative residual %e' % \
+              ( self.type , self.iterations , residual )
+
+      if self.fallback != "direct":
+        raise RuntimeError( msg )
+
+      logger.warning('    ' + msg + ', using the direct solver')
+
+      x = spsolve( csc_matrix( A ) , b )
+
+    self.x0 = x * scale
+
+    return self.x0
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def getInitialGuess( self , A , b ):
+
+    if not self.warmStart or self.x0 is None or len(self.x0) != len(b):
+      return None
+
+    Ax0 = A.dot( self.x0 )
+
+    denom = dot( Ax0 , Ax0 )
+
+    if denom == 0.:
+      return None
+
+    return ( dot( Ax0 , b ) / denom ) * self.x0
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+class JacobiPreconditioner:
+
+  '''Scales the residual with the inverse of the diagonal of A.'''
+
+  def __init__( self , props , dofSpace ):
+
+    self.symmetric = True
+
+  def getOperator( self , A , columnDofs = None ):
+
+    d = A.diagonal().copy()
+
+    d[d == 0.] = 1.0
+
+    return diags( 1.0 / d )
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+class BlockJacobiPreconditioner:
+
+  '''Multiplies the residual with the inverse of the diagonal blocks of A
+     that couple the dofs of a single node. The blocks of nodes with 
+     constrained dofs are smaller, the blocks are padded with the identity 
+     to invert them at once.'''
+
+  def __init__( self , props , dofSpace ):
+
+    self.blockSize = len(dofSpace.dofTypes)
+    self.symmetric = True
+
+  def getOperator( self , A , columnDofs = None ):
+
+    n = A.shape[0]
+
+    if columnDofs is None:
+      columnDofs = arange( n )
+
+    #The dofs of a node are numbered consecutively, see DofSpace
+
+    groups = unique( columnDofs // self.blockSize , return_inverse = True )[1]
+    sizes  = bincount( groups )
+    start  = cumsum( sizes ) - sizes
+    local  = arange( n ) - start[groups]
+    k      = sizes.max()
+
+    isPadding = arange( k ) >= sizes[:,None]
+
+    blocks = zeros( ( len(sizes) , k , k ) )
+    blocks[:,arange(k),arange(k)] = isPadding
+
+    A    = coo_matrix( A )
+    mask = groups[A.row] == groups[A.col]
+
+    add.at( blocks , ( groups[A.row[mask]] , local[A.row[mask]] , local[A.col[mask]] ) , A.data[mask] )
+
+    inverse = inv( blocks )
+
+    g,i,j = nonzero( ~isPadding[:,:,None] & ~isPadding[:,None,:] )
+
+    return csr_matrix( ( inverse[g,i,j] , ( start[g] + i , start[g] + j ) ) , shape = A.shape )
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+class ILUPreconditioner:
+
+  '''Incomplete LU factorization of A computed with scipy.sparse.linalg.spilu,
+     with the parameters dropTol and fillFactor. For the methods in 
+     symmetricMethods, a symmetric incomplete factorization P A P^T = L D L^T
+     is used instead. It is computed with a symmetric ordering and without 
+     pivoting, such that U = D L^T. The preconditioner L^-T |D|^-1 L^-1 is 
+     symmetric positive definite.'''
+
+  def __init__( self , props , dofSpace ):
+
+    self.dropTol    = getattr( props , "dropTol"    , 1.0e-4 )
+    self.fillFactor = getattr( props , "fillFactor" , 10 )
+    self.symmetric  = props.type.lower() in symmetricMethods
+
+  def getOperator( self , A , columnDofs = None ):
+
+    if not self.symmetric:
+      ilu = spilu( csc_matrix( A ) , drop_tol = self.dropTol , fill_factor = self.fillFactor )
+
+      return LinearOperator( A.shape , matvec = ilu.solve )
+
+    ilu = spilu( csc_matrix( A ) , drop_tol = self.dropTol , fill_factor = self.fillFactor , \
+                 permc_spec = "MMD_AT_PLUS_A" , diag_pivot_thresh = 0. , \
+                 options = { "SymmetricMode" : True } )
+
+    if not array_equal( ilu.perm_r , ilu.perm_c ):
+      raise RuntimeError('Symmetric incomplete factorization failed, the matrix has a zero pivot')
+
+    #Row i of A is row perm[i] of P A P^T
+
+    perm    = ilu.perm_c
+    inverse = empty( len(perm) , dtype=int )
+    inverse[perm] = arange( len(perm) )
+
+    lower = getTriangularSolver( csc_matrix( ilu.L ) )
+
+    d = abs( ilu.U.diagonal() )
+    d[d == 0.] = 1.0
+
+    def solve( r ):
+      y = lower.solve( r.ravel()[inverse] )
+      return lower.solve( y / d , "T" )[perm]
+
+    return LinearOperator( A.shape , matvec = solve )
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+krylovMethods = { "cg"       : cg ,
+                  "minres"   : minres ,
+                  "gmres"    : gmres ,
+                  "bicgstab" : bicgstab }
+
+symmetricMethods = [ "cg" , "minres" ]
+
+linearSolvers = { "direct"   : DirectSolver ,
+                  "superlu"  : DirectSolver ,
+                  "cg"       : IterativeSolver ,
+                  "minres"   : IterativeSolver ,
+                  "gmres"    : IterativeSolver ,
+                  "bicgstab" : IterativeSolver }
+
+preconditioners = { "none"        : None ,
+                    "jacobi"      : JacobiPreconditioner ,
+                    "blockjacobi" : BlockJacobiPreconditioner ,
+                    "ilu"         : ILUPreconditioner ,
+                    "amg"         : AMGPreconditioner }
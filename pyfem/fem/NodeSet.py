@@ -23,7 +23,7 @@
 #  free from errors. Furthermore, the authors shall not be liable in any   #
 #  event caused by the use of the program.                                 #
 ############################################################################
-from numpy import array
+from numpy import zeros, asarray, integer
 from pyfem.util.itemList import itemList
 from pyfem.util.fileParser import getType
 import re,sys,meshio
@@ -38,16 +38,118 @@ logger = getLogger()
 
 class NodeSet( itemList ):
 
+  '''The coordinates of all nodes are stored in one contiguous array, with 
+     one row per node in the order in which the nodes are added. Internally
+     the dictionary maps the node IDs to these rows, but indexing a NodeSet
+     with a node ID returns the coordinates of that node.'''
+
   def __init__( self ):
     self.rank = -1
     self.groups = {}
+    self.coordStore = zeros( shape=(0,0) )
 
 #-------------------------------------------------------------------------------
 #
+#-------------------------------------------------------------------------------
+
+  def add ( self, ID, coords ):
+
+    if ID in self:
+      raise RuntimeError( 'ID ' + str(ID) + ' already exists in ' + type(self).__name__ )
+
+    coords = asarray( coords , dtype=float ).ravel()
+    
+    row = len(self)
+
+    if row == 0:
+      self.coordStore = zeros( shape=( 16 , len(coords) ) )
+    elif len(coords) != self.coordStore.shape[1]:
+      raise RuntimeError( 'Node ' + str(ID) + ' has ' + str(len(coords)) + ' coordinates, expected ' + \
+                          str(self.coordStore.shape[1]) )
+
+    #Double the capacity of the store when it is full
+
+    if row == len(self.coordStore):
+      store = zeros( shape=( 2*row , self.coordStore.shape[1] ) )
+
+      store[:row] = self.coordStore
+      self.coordStore = store
+    
+    self.coordStore[row] = coords
+
+    itemList.add( self, ID, row )
+
+#-------------------------------------------------------------------------------
+#  Returns the coordinates of a node, as it did before the coordinates were
+#  stored in one array. Assigning coordinates to an existing ID overwrites them.
+#-------------------------------------------------------------------------------
+
+  def __getitem__ ( self, ID ):
+
+    return self.coordStore[dict.__getitem__( self, ID )].copy()
+
+  def __setitem__ ( self, ID, coords ):
+
+    if ID in self:
+      self.coordStore[dict.__getitem__( self, ID )] = coords
+    else:
+      self.add( ID, coords )
+
+  def values ( self ):
+
+    for ID in self:
+      yield self[ID]
+
+  def items ( self ):
+
+    for ID in self:
+      yield ID , self[ID]
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def get ( self, IDs ):
+
+    return self.getNodeCoords( IDs )
+
+#-------------------------------------------------------------------------------
+#  After nodes have been removed, the remaining rows are moved to the front of 
+#  the store, such that the row of a node is also its position in the list.
+#-------------------------------------------------------------------------------
+
+  def resetIndexMap ( self ):
+
+    rows = list( dict.values( self ) )
+
+    if rows != list( range( len(rows) ) ):
+      self.coordStore = self.coordStore[rows]
+
+      for row,ID in enumerate( self.keys() ):
+        dict.__setitem__( self, ID, row )
+
+    itemList.resetIndexMap( self )
+
+#-------------------------------------------------------------------------------
+#  Returns the (nNodes x rank) array with the coordinates of all nodes
+#-------------------------------------------------------------------------------
+
+  def getCoordArray( self ):
+
+    return self.coordStore[:len(self)]
+
+#-------------------------------------------------------------------------------
+#  Returns the coordinates of a single node, or of an array of node IDs of 
+#  arbitrary shape, e.g. ( nElem x nNodes ) for a group of elements, in which
+#  case an ( nElem x nNodes x rank ) array is returned.
 #-------------------------------------------------------------------------------
 
   def getNodeCoords( self, nodeIDs ):
-    return array( self.get( nodeIDs ) )
+
+    if isinstance( nodeIDs , (int,integer) ):
+      return self[nodeIDs]
+
+    return self.coordStore[self.getIndexArray( nodeIDs )]
 
 #-------------------------------------------------------------------------------
 #
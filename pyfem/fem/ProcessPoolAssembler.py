@@ -0,0 +1,341 @@
+############################################################################
+#  This Python file is part of PyFEM, the code that accompanies the book:  #
+#                                                                          #
+#    'Non-Linear Finite Element Analysis of Solids and Structures'         #
+#    R. de Borst, M.A. Crisfield, J.J.C. Remmers and C.V. Verhoosel        #
+#    John Wiley and Sons, 2012, ISBN 978-0470666449                        #
+#                                                                          #
+#  The code is written by J.J.C. Remmers, C.V. Verhoosel and R. de Borst.  #
+#                                                                          #
+#  The latest stable version can be downloaded from the web-site:          #
+#     http://www.wiley.com/go/deborst                                      #
+#                                                                          #
+#  A github repository, with the most up to date version of the code,      #
+#  can be found here:                                                      #
+#     https://github.com/jjcremmers/PyFEM                                  #
+#                                                                          #
+#  The code is open source and intended for educational and scientific     #
+#  purposes only. If you use PyFEM in your research, the developers would  #
+#  be grateful if you could cite the book.                                 #  
+#                                                                          #
+#  Disclaimer:                                                             #
+#  The authors reserve all rights but do not guarantee that the code is    #
+#  free from errors. Furthermore, the authors shall not be liable in any   #
+#  event caused by the use of the program.                                 #
+############################################################################
+
+from numpy import zeros, ndarray, bincount, cumsum, unique, array, concatenate, arange
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import os, weakref
+
+from pyfem.fem.Assembly import evaluateElements, getSparsityPattern
+from pyfem.fem.ElementSet import ElementSet
+from pyfem.util.itemList import itemList
+from pyfem.util.dataStructures import GlobalData
+from pyfem.util.logger import getLogger
+
+logger = getLogger()
+
+#-------------------------------------------------------------------------------
+#  Data of the partition that is resident in a worker process
+#-------------------------------------------------------------------------------
+
+partition = {}
+
+#-------------------------------------------------------------------------------
+#  Initializes a worker process. The elements of the partition, including
+#  their history, stay in the worker as long as the assembler exists.
+#-------------------------------------------------------------------------------
+
+def initPartition ( shmName , nDof , nodes , dofs , elements , groupProps , groupDofs , nodeIndices ):
+
+  shm = shared_memory.SharedMemory( name = shmName )
+
+  shared = ndarray( (2,nDof) , buffer = shm.buf )
+
+  globdat = GlobalData( nodes , elements , dofs )
+
+  globdat.state  = shared[0]
+  globdat.Dstate = shared[1]
+
+  partition['shm']         = shm
+  partition['globdat']     = globdat
+  partition['props']       = groupProps
+  partition['dofs']        = groupDofs
+  partition['nodeIndices'] = nodeIndices
+
+#-------------------------------------------------------------------------------
+#  Evaluates all element groups of the partition. Returns the flat element
+#  arrays per group and the nodal output at the nodes of the partition.
+#-------------------------------------------------------------------------------
+
+def evaluatePartition ( rank , action , status ):
+
+  globdat = partition['globdat']
+
+  for name,val in status.items():
+    setattr( globdat.solverStatus , name , val )
+
+  if action != 'commit':
+    globdat.resetNodalOutput()
+
+  results = []
+
+  for elementGroup in globdat.elements.iterGroupNames():
+    groupDofs = partition['dofs'][elementGroup]
+
+    results.append( evaluateElements( globdat , elementGroup , arange( len(groupDofs) ) , groupDofs , \
+                                      partition['props'][elementGroup] , rank , action ) )
+
+  nodeIndices = partition['nodeIndices']
+
+  output = [ ( name , getattr( globdat , name )[nodeIndices] , \
+               getattr( globdat , name + 'Weights' )[nodeIndices] ) for name in globdat.outputNames ]
+
+  return results , output
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+def commitPartition ():
+
+  partition['globdat'].elements.commitHistory()
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+def shutdown ( pools , shm ):
+
+  for pool in pools:
+    pool.shutdown()
+
+  shm.close()
+  shm.unlink()
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+class ProcessPoolAssembler:
+
+  '''Assembles the global arrays in parallel. Every element group is split in
+     nProcs contiguous partitions and each partition is evaluated in its own
+     worker process. The elements, including their history, are copied to the
+     workers once and stay resident there, so the history in the element set
+     of the main process is not updated. The state vectors are passed through
+     shared memory. The element contributions are returned to the main
+     process and added in a fixed partition order, which makes the result
+     deterministic for a given number of processes.
+     
+     The assembler is activated in the solver block of the input file:
+     
+       solver = { ... ; assembly = { type = "ProcessPoolAssembler"; nProcs = 4; }; };
+  '''
+
+  def __init__ ( self , props , globdat , assemblyProps ):
+
+    self.nProcs = getattr( assemblyProps , "nProcs" , os.cpu_count() )
+    self.nDof   = len(globdat.dofs)
+    self.nElem  = len(globdat.elements)
+
+    logger.info("Starting process pool assembly with %i partitions" % self.nProcs )
+
+    self.shm    = shared_memory.SharedMemory( create = True , size = max( 2*self.nDof*8 , 1 ) )
+    self.shared = ndarray( (2,self.nDof) , buffer = self.shm.buf )
+
+    groupProps = {}
+
+    parts = [ ElementSet( globdat.nodes , globdat.elements.props ) for iProc in range(self.nProcs) ]
+
+    for part in parts:
+      part.solverStat = globdat.elements.solverStat
+
+    #For every partition, the range of each group in the triplet array of 
+    #the sparsity pattern
+
+    self.tripletRange = [ {} for iProc in range(self.nProcs) ]
+    groupDofs         = [ {} for iProc in range(self.nProcs) ]
+
+    for elementGroup in globdat.elements.iterGroupNames():
+      groupProps[elementGroup] = getattr( props , elementGroup )
+
+      IDs    = globdat.elements.groups[elementGroup]
+      nDofs  = array( [ len(el_dofs) for el_dofs in globdat.dofs.getElementDofs( elementGroup ) ] , dtype=int )
+
+      #The elements of a batched group are added to the partitions as rows of
+      #the connectivity, so they are not created here, nor in the workers.
+      #The workers then evaluate them with their own group elements.
+
+      batched = globdat.elements.isBatched( elementGroup )
+
+      if batched:
+        connectivity = globdat.elements.getConnectivity( elementGroup )
+
+      tripletOffset = zeros( len(IDs)+1 , dtype=int )
+
+      tripletOffset[1:] = cumsum( nDofs**2 )
+
+      for iProc,part in enumerate(parts):
+        start = ( iProc * len(IDs) ) // self.nProcs
+        end   = ( (iProc+1) * len(IDs) ) // self.nProcs
+
+        if batched:
+          part.addGroup( elementGroup , [] )
+
+          for ID,elementNodes in zip( IDs[start:end] , connectivity[start:end].tolist() ):
+            part.add( ID , elementGroup , elementNodes )
+        else:
+          part.addGroup( elementGroup , IDs[start:end] )
+
+          for ID in IDs[start:end]:
+            itemList.add( part , ID , globdat.elements[ID] )
+
+        self.tripletRange[iProc][elementGroup] = ( tripletOffset[start] , tripletOffset[end] )
+
+        groupDofs[iProc][elementGroup] = globdat.dofs.getElementDofs( elementGroup )[start:end]
+
+    self.nodeIndices = []
+
+    for part in parts:
+      nodeIndices = []
+
+      for elementGroup in part.iterGroupNames():
+        connectivity = part.getConnectivity( elementGroup )
+
+        if connectivity.dtype != object:
+          nodeIndices.append( globdat.nodes.getIndexArray( connectivity ).ravel() )
+        else:
+          nodeIndices += [ globdat.nodes.getIndexArray( elementNodes ) for elementNodes in connectivity ]
+
+      if len(nodeIndices) > 0:
+        self.nodeIndices.append( unique( concatenate( nodeIndices ) ) )
+      else:
+        self.nodeIndices.append( zeros( 0 , dtype=int ) )
+
+    #One single worker pool per partition, such that a partition is always
+    #evaluated by the same process
+
+    self.pools = [ ProcessPoolExecutor( max_workers = 1 , initializer = initPartition , \
+                     initargs = ( self.shm.name , self.nDof , globdat.nodes , globdat.dofs , part , groupProps , \
+                                 groupDofs[iProc] , self.nodeIndices[iProc] ) ) \
+                     for iProc,part in enumerate(parts) ]
+
+    self.finalizer = weakref.finalize( self , shutdown , self.pools , self.shm )
+
+    globdat.elements.workers = self
+
+#-------------------------------------------------------------------------------
+#  The worker processes and the shared memory can not be pickled, e.g. by 
+#  DataDump. An unpickled assembler is inactive and is replaced in the next
+#  assembly.
+#-------------------------------------------------------------------------------
+
+  def __getstate__ ( self ):
+
+    return { 'nProcs' : self.nProcs , 'nDof' : self.nDof , 'nElem' : self.nElem }
+
+  def __setstate__ ( self , state ):
+
+    self.__dict__.update( state )
+
+    self.pools = None
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def isActive ( self ):
+
+    return self.pools is not None and self.finalizer.alive
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def isValid ( self , globdat ):
+
+    return self.isActive() and self.nDof == len(globdat.dofs) and \
+           self.nElem == len(globdat.elements)
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def close ( self ):
+
+    self.finalizer()
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def assembleArray ( self , props , globdat , rank , action ):
+
+    self.shared[0] = globdat.state
+    self.shared[1] = globdat.Dstate
+
+    status = dict( globdat.solverStatus.__dict__ )
+
+    futures = [ pool.submit( evaluatePartition , rank , action , status ) for pool in self.pools ]
+
+    #Wait for all partitions before the shared state can be changed again
+
+    results = [ future.result() for future in futures ]
+
+    B = zeros( self.nDof )
+
+    if rank == 2:
+      pattern = getSparsityPattern( globdat )
+      val     = zeros( pattern.nnz )
+
+    if action != 'commit':
+      globdat.resetNodalOutput()
+
+    #Reduce the contributions in partition order
+
+    for iProc,(groupResults,output) in enumerate(results):
+      for elementGroup,(block,vec,el_dofs) in zip( globdat.elements.iterGroupNames() , groupResults ):
+        if rank > 0:
+          B += bincount( el_dofs , weights = vec , minlength = self.nDof )
+
+        if rank == 2:
+          start,end = self.tripletRange[iProc][elementGroup]
+
+          val += bincount( pattern.scatter[elementGroup][start:end] , weights = block , minlength = pattern.nnz )
+
+      self.addNodalOutput( globdat , self.nodeIndices[iProc] , output )
+
+    if rank == 1:
+      return B
+    elif rank == 2:
+      return pattern.getMatrix( val ),B
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def addNodalOutput ( self , globdat , nodeIndices , output ):
+
+    for name,values,weights in output:
+      if not hasattr( globdat , name ):
+        globdat.outputNames.append( name )
+
+        setattr( globdat, name             , zeros( len(globdat.nodes) ) )
+        setattr( globdat, name + 'Weights' , zeros( len(globdat.nodes) ) )
+
+      getattr( globdat , name )[nodeIndices]             += values
+      getattr( globdat , name + 'Weights' )[nodeIndices] += weights
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def commitHistory ( self ):
+
+    futures = [ pool.submit( commitPartition ) for pool in self.pools ]
+
+    for future in futures:
+      future.result()
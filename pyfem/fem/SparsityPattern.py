@@ -0,0 +1,131 @@
+############################################################################
+#  This Python file is part of PyFEM, the code that accompanies the book:  #
+#                                                                          #
+#    'Non-Linear Finite Element Analysis of Solids and Structures'         #
+#    R. de Borst, M.A. Crisfield, J.J.C. Remmers and C.V. Verhoosel        #
+#    John Wiley and Sons, 2012, ISBN 978-0470666449                        #
+#                                                                          #
+#  The code is written by J.J.C. Remmers, C.V. Verhoosel and R. de Borst.  #
+#                                                                          #
+#  The latest stable version can be downloaded from the web-site:          #
+#     http://www.wiley.com/go/deborst                                      #
+#                                                                          #
+#  A github repository, with the most up to date version of the code,      #
+#  can be found here:                                                      #
+#     https://github.com/jjcremmers/PyFEM                                  #
+#                                                                          #
+#  The code is open source and intended for educational and scientific     #
+#  purposes only. If you use PyFEM in your research, the developers would  #
+#  be grateful if you could cite the book.                                 #  
+#                                                                          #
+#  Disclaimer:                                                             #
+#  The authors reserve all rights but do not guarantee that the code is    #
+#  free from errors. Furthermore, the authors shall not be liable in any   #
+#  event caused by the use of the program.                                 #
+############################################################################
+
+from numpy import zeros, empty, unique, cumsum, bincount, int32, int64
+from scipy.sparse import csr_matrix
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+class SparsityPattern:
+
+  '''Compressed sparse row structure of the global system matrices. For every 
+     element group, the array scatter contains the position in the CSR data
+     array of each entry of the element matrices, in the order in which the
+     elements are visited during assembly. The entries are added with 
+     numpy.bincount, which also sums repeated degrees of freedom, e.g. of
+     collapsed elements.'''
+  
+  def __init__( self , globdat ):
+
+    self.nDof  = len(globdat.dofs)
+    self.nElem = len(globdat.elements)
+
+    nTriplets   = 0
+    groupOffset = {}
+    
+    for elementGroup in globdat.elements.iterGroupNames():
+      groupOffset[elementGroup] = nTriplets
+      
+      for el_dofs in globdat.dofs.getElementDofs( elementGroup ):
+        nTriplets += len(el_dofs)**2
+
+    #Store the global (row,col) pair of each triplet as a single key
+    
+    keys   = empty( nTriplets , dtype=int64 )
+    offset = 0
+
+    for elementGroup in globdat.elements.iterGroupNames():
+      groupDofs = globdat.dofs.getElementDofs( elementGroup )
+
+      #All elements in the group have the same number of dofs
+      if groupDofs.ndim == 2:
+        el_dofs = groupDofs.astype( int64 )
+        end     = offset + el_dofs.shape[0] * el_dofs.shape[1]**2
+        
+        keys[offset:end] = ( el_dofs[:,:,None] * self.nDof + el_dofs[:,None,:] ).ravel()
+
+        offset = end
+        continue
+
+      for el_dofs in groupDofs:
+        el_dofs = el_dofs.astype( int64 )
+
+        n   = len(el_dofs)
+        end = offset + n*n
+
+        keys[offset:end] = ( el_dofs.reshape(n,1) * self.nDof + el_dofs ).reshape(n*n)
+
+        offset = end
+
+    uniqueKeys , inverse = unique( keys , return_inverse = True )
+
+    self.nnz = len(uniqueKeys)
+
+    if self.nnz < 2**31 - 1:
+      indexType = int32
+    else:
+      indexType = int64
+
+    self.indices = ( uniqueKeys % self.nDof ).astype( indexType )
+    self.indptr  = zeros( self.nDof+1 , dtype=indexType )
+ 
+    self.indptr[1:] = cumsum( bincount( uniqueKeys // self.nDof , minlength = self.nDof ) )
+
+    self.scatter = {}
+
+    groupNames = list(groupOffset.keys())
+    
+    for i,elementGroup in enumerate(groupNames):
+      if i+1 < len(groupNames):
+        end = groupOffset[groupNames[i+1]]
+      else:
+        end = nTriplets
+        
+      self.scatter[elementGroup] = inverse[groupOffset[elementGroup]:end].astype( indexType )
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def isValid( self , globdat ):
+
+    '''Returns True if the pattern was constructed for the current mesh'''
+    
+    return self.nDof == len(globdat.dofs) and self.nElem == len(globdat.elements)
+      
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def getMatrix( self , data ):
+
+    '''Returns a CSR matrix with the given data array that shares the index 
+       arrays of this pattern.'''
+       
+    return csr_matrix( ( data , self.indices , self.indptr ) , \
+                       shape = ( self.nDof , self.nDof ) , copy = False )
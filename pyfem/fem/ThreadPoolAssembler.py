@@ -0,0 +1,222 @@
+############################################################################
+#  This Python file is part of PyFEM, the code that accompanies the book:  #
+#                                                                          #
+#    'Non-Linear Finite Element Analysis of Solids and Structures'         #
+#    R. de Borst, M.A. Crisfield, J.J.C. Remmers and C.V. Verhoosel        #
+#    John Wiley and Sons, 2012, ISBN 978-0470666449                        #
+#                                                                          #
+#  The code is written by J.J.C. Remmers, C.V. Verhoosel and R. de Borst.  #
+#                                                                          #
+#  The latest stable version can be downloaded from the web-site:          #
+#     http://www.wiley.com/go/deborst                                      #
+#                                                                          #
+#  A github repository, with the most up to date version of the code,      #
+#  can be found here:                                                      #
+#     https://github.com/jjcremmers/PyFEM                                  #
+#                                                                          #
+#  The code is open source and intended for educational and scientific     #
+#  purposes only. If you use PyFEM in your research, the developers would  #
+#  be grateful if you could cite the book.                                 #  
+#                                                                          #
+#  Disclaimer:                                                             #
+#  The authors reserve all rights but do not guarantee that the code is    #
+#  free from errors. Furthermore, the authors shall not be liable in any   #
+#  event caused by the use of the program.                                 #
+############################################################################
+
+from numpy import zeros, array, cumsum, repeat, arange, add
+from concurrent.futures import ThreadPoolExecutor
+import os, copy
+
+from pyfem.fem.Assembly import evaluateElements, getSparsityPattern
+from pyfem.util.meshColoring import getElementColors, getColorGroups
+from pyfem.util.logger import getLogger
+
+logger = getLogger()
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+class ThreadPoolAssembler:
+
+  '''Assembles the global arrays with a pool of threads. The elements of each
+     group are colored such that two elements with the same color do not 
+     share a node. The colors are processed one after another and the 
+     elements of one color are divided over the threads. Since these elements
+     have no degrees of freedom in common, every thread adds its 
+     contributions directly to the global arrays, without locks. Each thread
+     writes its nodal output to its own copy of globdat, these are added
+     after the assembly.
+     
+     The assembler is activated in the solver block of the input file:
+     
+       solver = { ... ; assembly = { type = "ThreadPoolAssembler"; nThreads = 4; }; };
+  '''
+
+  def __init__ ( self , props , globdat , assemblyProps ):
+
+    self.nThreads = getattr( assemblyProps , "nThreads" , os.cpu_count() )
+    self.nDof     = len(globdat.dofs)
+    self.nElem    = len(globdat.elements)
+
+    #For every group and color, the positions of the elements in the group 
+    #and of their entries in the triplet array of the group, divided over the
+    #threads. The elements themselves are not accessed, see ElementSet.
+
+    self.chunks = {}
+    nColors     = 0
+
+    for elementGroup in globdat.elements.iterGroupNames():
+      groupDofs = globdat.dofs.getElementDofs( elementGroup )
+      nDofs     = array( [ len(el_dofs) for el_dofs in groupDofs ] , dtype=int )
+
+      tripletOffset = zeros( len(groupDofs)+1 , dtype=int )
+
+      tripletOffset[1:] = cumsum( nDofs**2 )
+
+      self.chunks[elementGroup] = []
+
+      colorGroups = getColorGroups( getElementColors( globdat.elements.getConnectivity( elementGroup ) , globdat.nodes ) )
+
+      for positions in colorGroups:
+        colorChunks = []
+
+        for iThread in range(self.nThreads):
+          pos = positions[ ( iThread * len(positions) ) // self.nThreads : \
+                           ( (iThread+1) * len(positions) ) // self.nThreads ]
+
+          if len(pos) == 0:
+            continue
+
+          n = nDofs[pos]**2
+
+          triplets = repeat( tripletOffset[pos] - cumsum(n) + n , n ) + arange( n.sum() )
+
+          colorChunks.append( ( pos , triplets ) )
+
+        self.chunks[elementGroup].append( colorChunks )
+
+      nColors = max( nColors , len(colorGroups) )
+
+    logger.info("Starting thread pool assembly with %i threads and %i colors" % ( self.nThreads , nColors ) )
+
+    self.pool = ThreadPoolExecutor( max_workers = self.nThreads )
+
+#-------------------------------------------------------------------------------
+#  The thread pool can not be pickled, e.g. by DataDump. An unpickled 
+#  assembler is inactive and is replaced in the next assembly.
+#-------------------------------------------------------------------------------
+
+  def __getstate__ ( self ):
+
+    return { 'nThreads' : self.nThreads , 'nDof' : self.nDof , 'nElem' : self.nElem }
+
+  def __setstate__ ( self , state ):
+
+    self.__dict__.update( state )
+
+    self.pool = None
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def isActive ( self ):
+
+    return self.pool is not None
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def isValid ( self , globdat ):
+
+    return self.isActive() and self.nDof == len(globdat.dofs) and \
+           self.nElem == len(globdat.elements)
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def close ( self ):
+
+    if self.pool is not None:
+      self.pool.shutdown()
+      self.pool = None
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+  def assembleArray ( self , props , globdat , rank , action ):
+
+    B = zeros( self.nDof )
+    
+    val     = None
+    scatter = None
+
+    if rank == 2:
+      pattern = getSparsityPattern( globdat )
+      val     = zeros( pattern.nnz )
+
+    if action != 'commit':
+      globdat.resetNodalOutput()
+
+    #Every thread gets a shallow copy of globdat with its own nodal output
+
+    threadGlobdat = []
+
+    for iThread in range(self.nThreads):
+      tdat = copy.copy( globdat )
+      tdat.outputNames = []
+
+      threadGlobdat.append( tdat )
+
+    for elementGroup in globdat.elements.iterGroupNames():
+      el_props  = getattr( props, elementGroup )
+      groupDofs = globdat.dofs.getElementDofs( elementGroup )
+
+      if rank == 2:
+        scatter = pattern.scatter[elementGroup]
+
+      #The colors are processed one by one, the elements of a color in parallel
+
+      for colorChunks in self.chunks[elementGroup]:
+        futures = [ self.pool.submit( self.evaluateChunk , tdat , elementGroup , rows , groupDofs , triplets , \
+                      el_props , rank , action , B , val , scatter ) \
+                      for tdat,(rows,triplets) in zip(threadGlobdat,colorChunks) ]
+
+        for future in futures:
+          future.result()
+
+    for tdat in threadGlobdat:
+      for name in tdat.outputNames:
+        if not hasattr( globdat , name ):
+          globdat.outputNames.append( name )
+
+          setattr( globdat, name             , zeros( len(globdat.nodes) ) )
+          setattr( globdat, name + 'Weights' , zeros( len(globdat.nodes) ) )
+
+        getattr( globdat , name )             [:] += getattr( tdat , name )
+        getattr( globdat , name + 'Weights' ) [:] += getattr( tdat , name + 'Weights' )
+
+    if rank == 1:
+      return B
+    elif rank == 2:
+      return pattern.getMatrix( val ),B
+
+#-------------------------------------------------------------------------------
+#  Evaluates a part of the elements of one color, with positions rows in the
+#  group, and adds the contributions to the global arrays. 
+#-------------------------------------------------------------------------------
+
+  def evaluateChunk ( self , globdat , elementGroup , rows , groupDofs , triplets , el_props , rank , action , B , val , scatter ):
+
+    block,vec,el_dofs = evaluateElements( globdat , elementGroup , rows , groupDofs , el_props , rank , action )
+
+    if rank > 0:
+      add.at( B , el_dofs , vec )
+
+    if rank == 2:
+      add.at( val , scatter[triplets] , block )
@@ -70,18 +70,25 @@ class ContourWriter( BaseModule ):
 
     outfile.write('\n')
 
-    for iNod in self.nodes:
+    #Gather the dof values of all contour nodes at once
+
+    dofValues = [ globdat.state[globdat.dofs.getForType(list(self.nodes),dofType)] \
+                  for dofType in globdat.dofs.dofTypes ]
+
+    outputValues = [ globdat.getData( name , list(range(len(globdat.nodes))) ) \
+                     for name in globdat.outputNames ]
+
+    for i,iNod in enumerate(self.nodes):
       crd = globdat.nodes.getNodeCoords(iNod)
       outfile.write('%4i %10.3e %10.3e' % (iNod,crd[0],crd[1]))
       
       if len(crd) == 3:
         outfile.write(' %10.3e' % crd[2] )
        
-      for dofType in globdat.dofs.dofTypes:
-        outfile.write(' %10.3e' % (globdat.state[globdat.dofs.getForType(iNod,dofType)]))
+      for values in dofValues:
+        outfile.write(' %10.3e' % values[i])
       
-      for name in globdat.outputNames:
-        stress = globdat.getData( name , list(range(len(globdat.nodes))) )    
+      for stress in outputValues:
         outfile.write(' %10.3e' % stress[iNod] )
 
       outfile.write('\n')
@@ -82,10 +82,17 @@ class MeshWriter ( BaseModule ):
 	
     dispDofs = ["u","v","w"]
 
-    for nodeID in list(globdat.nodes.keys()):
-      for dispDof in dispDofs:
-        if dispDof in globdat.dofs.dofTypes:
-          vtkfile.write(str(state[globdat.dofs.getForType(nodeID,dispDof)])+' ')
+    nodeIDs = list(globdat.nodes.keys())
+
+    #Gather the displacements of all nodes at once
+
+    disp = [ state[globdat.dofs.getForType(nodeIDs,dispDof)] if dispDof in globdat.dofs.dofTypes \
+             else None for dispDof in dispDofs ]
+
+    for iNod in range(len(nodeIDs)):
+      for values in disp:
+        if values is not None:
+          vtkfile.write(str(values[iNod])+' ')
         else: 
           vtkfile.write(' 0.\n')
  
@@ -94,8 +101,8 @@ class MeshWriter ( BaseModule ):
     for field in self.extraFields:
       vtkfile.write('<DataArray type="Float64" Name="'+field+'" NumberOfComponents="1" format="ascii" >\n')
 	
-      for nodeID in list(globdat.nodes.keys()):      
-        vtkfile.write(str(state[globdat.dofs.getForType(nodeID,field)])+' ')
+      for value in state[globdat.dofs.getForType(nodeIDs,field)]:
+        vtkfile.write(str(value)+' ')
   
       vtkfile.write('</DataArray>\n')
   
@@ -114,8 +121,7 @@ class MeshWriter ( BaseModule ):
     vtkfile.write('<Points>\n')
     vtkfile.write('<DataArray type="Float64" Name="Points" NumberOfComponents="3" format="ascii">\n')
   
-    for nodeID in list(globdat.nodes.keys()):
-      crd = globdat.nodes.getNodeCoords(nodeID)
+    for crd in globdat.nodes.getCoordArray():
       if len(crd) == 2:
         vtkfile.write( str(crd[0]) + ' ' + str(crd[1]) + " 0.0\n" )
       else:
@@ -130,8 +136,18 @@ class MeshWriter ( BaseModule ):
 
     rank = globdat.nodes.rank
 
-    for element in globdat.elements.iterElementGroup( self.elementGroup ):
-      el_nodes = globdat.nodes.getIndices(element.getNodes())
+    #The node IDs are taken from the connectivity of the groups, such that 
+    #elements that have not been created yet are not created here
+
+    if self.elementGroup == "All":
+      groupNames = globdat.elements.iterGroupNames()
+    else:
+      groupNames = [ self.elementGroup ]
+
+    connectivity = [ globdat.nodes.getIndices( list(el_nodes) ) for groupName in groupNames \
+                       for el_nodes in globdat.elements.getConnectivity( groupName ) ]
+
+    for el_nodes in connectivity:
 
       if rank == 2:
         if len(el_nodes) == 3 or len(el_nodes) == 4:
@@ -151,8 +167,8 @@ class MeshWriter ( BaseModule ):
     vtkfile.write('</DataArray>\n')
     vtkfile.write('<DataArray type="Int64" Name="offsets" format="ascii">\n')
 
-    for i,element in enumerate(globdat.elements.iterElementGroup( self.elementGroup )):
-      nNel = len(globdat.nodes.getIndices(element.getNodes()))
+    for i,el_nodes in enumerate(connectivity):
+      nNel = len(el_nodes)
 
       if rank == 2 and nNel == 8:
         nNel = 4
@@ -161,8 +177,8 @@ class MeshWriter ( BaseModule ):
     vtkfile.write('</DataArray>\n')
     vtkfile.write('<DataArray type="UInt8" Name="types" format="ascii" RangeMin="9" RangeMax="9">\n')
 
-    for element in globdat.elements.iterElementGroup( self.elementGroup ):
-      nNel = len(globdat.nodes.getIndices(element.getNodes()))
+    for el_nodes in connectivity:
+      nNel = len(el_nodes)
 
       if rank == 2:
         if nNel == 3 or nNel ==6:
@@ -25,9 +25,23 @@
 ############################################################################
 
 import copy
+from pyfem.materials.HistoryManager import getHistoryManager
 
 class BaseMaterial:
 
+  #The history variables and their initial values. When they are declared, 
+  #the history of all material points with the same properties is stored in
+  #a shared HistoryManager, otherwise in the dictionaries of each point. The
+  #row of the point that is evaluated is historyIndex.
+
+  historyVariables = {}
+
+  #A stateless material does not store any data of a material point, apart 
+  #from its output data. The MaterialManager uses one instance for all points
+  #of these materials, and of the materials that declare historyVariables.
+
+  stateless = False
+
   def __init__ ( self, props ):
 
     for name,val in props:
@@ -36,16 +50,29 @@ class BaseMaterial:
     self.oldHistory = {}
     self.newHistory = {}
 
+    self.historyManager = None
+    self.historyIndex   = None
+
+    if self.historyVariables:
+      self.historyManager = getHistoryManager( props , self.historyVariables )
+
     self.outLabels  = []
     self.solverStat = props.solverStat
 
   def setHistoryParameter( self , name , val ):
 
+    if self.historyManager is not None:
+      self.historyManager.setParameter( self.historyIndex , name , val )
+      return
+
     self.newHistory[name]=val
     return
        
   def getHistoryParameter( self , name ):
 
+    if self.historyManager is not None:
+      return self.historyManager.getParameter( self.historyIndex , name )
+
     if type(self.oldHistory[name]) == float:
       return self.oldHistory[name]
     else:
@@ -53,5 +80,8 @@ class BaseMaterial:
     
   def commitHistory( self ):
 
+    if self.historyManager is not None:
+      self.historyManager.commit()
+      return
+
     self.oldHistory = copy.deepcopy(self.newHistory)
-  
@@ -29,6 +29,8 @@ from numpy import eye, dot
 
 class Dummy( BaseMaterial ):
 
+  stateless = True
+
   def __init__ ( self, props ):
 
     BaseMaterial.__init__( self, props )
@@ -0,0 +1,194 @@
+############################################################################
+#  This Python file is part of PyFEM, the code that accompanies the book:  #
+#                                                                          #
+#    'Non-Linear Finite Element Analysis of Solids and Structures'         #
+#    R. de Borst, M.A. Crisfield, J.J.C. Remmers and C.V. Verhoosel        #
+#    John Wiley and Sons, 2012, ISBN 978-0470666449                        #
+#                                                                          #
+#  The code is written by J.J.C. Remmers, C.V. Verhoosel and R. de Borst.  #
+#                                                                          #
+#  The latest stable version can be downloaded from the web-site:          #
+#     http://www.wiley.com/go/deborst                                      #
+#                                                                          #
+#  A github repository, with the most up to date version of the code,      #
+#  can be found here:                                                      #
+#     https://github.com/jjcremmers/PyFEM                                  #
+#                                                                          #
+#  The code is open source and intended for educational and scientific     #
+#  purposes only. If you use PyFEM in your research, the developers would  #
+#  be grateful if you could cite the book.                                 #  
+#                                                                          #
+#  Disclaimer:                                                             #
+#  The authors reserve all rights but do not guarantee that the code is    #
+#  free from errors. Furthermore, the authors shall not be liable in any   #
+#  event caused by the use of the program.                                 #
+############################################################################
+
+from numpy import zeros, empty, array
+from threading import Lock
+
+#------------------------------------------------------------------------------
+#  History storage of the material points of a material. A material type 
+#  declares its history variables and their initial values in the class
+#  attribute historyVariables, e.g.
+#
+#    historyVariables = { 'sigma' : zeros(6) , 'kappa' : 0. }
+#
+#  The variables of all material points that share the same material 
+#  properties are stored in two contiguous ( nPoints , k ) arrays: the 
+#  committed values of the last converged step and the trial values of the
+#  current iteration. Each variable occupies a range of columns. Scalar 
+#  variables occupy one column and are returned as float.
+#------------------------------------------------------------------------------
+
+class HistoryManager:
+
+  def __init__ ( self , variables ):
+
+    self.columns = {}
+    self.scalars = set()
+
+    initial = []
+
+    for name,val in variables.items():
+      if type(val) in ( int , float ):
+        self.scalars.add( name )
+        val = [ val ]
+
+      self.columns[name] = slice( len(initial) , len(initial) + len(val) )
+      initial.extend( val )
+
+    self.initial   = array( initial , dtype=float )
+    self.count     = 0
+    self.committed = empty( ( 0 , len(initial) ) )
+    self.trial     = empty( ( 0 , len(initial) ) )
+    self.modified  = False
+    self.lock      = Lock()
+
+#------------------------------------------------------------------------------
+#  The lock can not be pickled, e.g. when the elements are sent to the 
+#  workers of the ProcessPoolAssembler
+#------------------------------------------------------------------------------
+
+  def __getstate__ ( self ):
+
+    state = self.__dict__.copy()
+    del state['lock']
+
+    return state
+
+  def __setstate__ ( self , state ):
+
+    self.__dict__.update( state )
+    self.lock = Lock()
+
+#------------------------------------------------------------------------------
+#  Adds a material point with the initial values of the history variables 
+#  and returns its row. The arrays are doubled in size when they are full.
+#------------------------------------------------------------------------------
+
+  def addPoint ( self ):
+
+    with self.lock:
+      if self.count == len(self.committed):
+        size = max( 16 , 2 * self.count )
+
+        for name in ( 'committed' , 'trial' ):
+          data = zeros( ( size , len(self.initial) ) )
+          data[:self.count] = getattr( self , name )[:self.count]
+          setattr( self , name , data )
+
+      iPoint = self.count
+
+      self.committed[iPoint] = self.initial
+      self.trial    [iPoint] = self.initial
+
+      self.count += 1
+
+    return iPoint
+
+#------------------------------------------------------------------------------
+#  Returns a copy of the committed value of a history variable
+#------------------------------------------------------------------------------
+
+  def getParameter ( self , iPoint , name ):
+
+    if name in self.scalars:
+      return float( self.committed[iPoint,self.columns[name].start] )
+
+    return self.committed[iPoint,self.columns[name]].copy()
+
+#------------------------------------------------------------------------------
+#  Sets the trial value of a history variable. The lock prevents that the 
+#  value is written in the old array while another thread adds a point.
+#------------------------------------------------------------------------------
+
+  def setParameter ( self , iPoint , name , val ):
+
+    with self.lock:
+      self.trial[iPoint,self.columns[name]] = val
+      self.modified = True
+
+#------------------------------------------------------------------------------
+#  Array versions of getParameter and setParameter for the points with rows
+#  points. The values have the shape ( nPoints , k ), or ( nPoints ) for 
+#  scalar variables.
+#------------------------------------------------------------------------------
+
+  def getParameters ( self , points , name ):
+
+    if name in self.scalars:
+      return self.committed[points,self.columns[name].start]
+
+    return self.committed[points,self.columns[name]]
+
+  def setParameters ( self , points , name , vals ):
+
+    with self.lock:
+      if name in self.scalars:
+        self.trial[points,self.columns[name].start] = vals
+      else:
+        self.trial[points,self.columns[name]] = vals
+
+      self.modified = True
+
+#------------------------------------------------------------------------------
+#  Returns the committed or trial values of a history variable of all points
+#  as a ( nPoints , k ) view.
+#------------------------------------------------------------------------------
+
+  def getArray ( self , name , trial = False ):
+
+    if trial:
+      return self.trial[:self.count,self.columns[name]]
+
+    return self.committed[:self.count,self.columns[name]]
+
+#------------------------------------------------------------------------------
+#  Copies the trial values of all points to the committed values. The 
+#  history is committed by each material point, but only the first call 
+#  after a change copies the arrays.
+#------------------------------------------------------------------------------
+
+  def commit ( self ):
+
+    if self.modified:
+      self.committed[:self.count] = self.trial[:self.count]
+      self.modified = False
+
+#------------------------------------------------------------------------------
+#  Returns the history manager of the material points with material 
+#  properties props. The manager is stored in the shared properties as
+#  historyManager.
+#------------------------------------------------------------------------------
+
+def getHistoryManager ( props , variables ):
+
+  if not hasattr( props , 'historyManager' ):
+    with managerLock:
+      if not hasattr( props , 'historyManager' ):
+        props.historyManager = HistoryManager( variables )
+
+  return props.historyManager
+
+managerLock = Lock()
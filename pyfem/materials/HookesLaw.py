@@ -25,9 +25,12 @@
 ############################################################################
 
 from pyfem.materials.BaseMaterial import BaseMaterial
+from numpy import zeros
 
 class HookesLaw( BaseMaterial ):
 
+  stateless = True
+
   def __init__ ( self, props ):
 
     #Call the BaseMaterial constructor
@@ -36,7 +39,7 @@ class HookesLaw( BaseMaterial ):
     #Create the tangent matrix
     self.H = zeros( (1,1) )
 
-    self.H(0,0) = self.E
+    self.H[0,0] = self.E
 
   def getStress( self, deformation ):
 
@@ -44,6 +47,16 @@ class HookesLaw( BaseMaterial ):
 
     return sigma, self.H
 
+  #Batched version of getStress for strains with shape ( nPoints , 1 ),
+  #the constant tangent is returned once
+  def getStresses( self, strains ):
+
+    sigma = self.E * strains
+
+    self.outData = sigma
+
+    return sigma, self.H
+
   def getTangent( self , deformation ):
   
     return self.H
@@ -29,6 +29,8 @@ from numpy import zeros, dot
 
 class Isotropic( BaseMaterial ):
 
+  stateless = True
+
   def __init__ ( self, props ):
 
     #Call the BaseMaterial constructor
@@ -63,6 +65,16 @@ class Isotropic( BaseMaterial ):
 
     return sigma, self.H
 
+  #Batched version of getStress for strains with shape ( nPoints , nstr ),
+  #the constant tangent is returned once
+  def getStresses( self, strains ):
+
+    sigma = dot( strains , self.H.T )
+
+    self.outData = sigma
+
+    return sigma, self.H
+
   def getTangent( self ):
   
     return self.H
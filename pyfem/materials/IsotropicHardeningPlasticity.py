@@ -26,14 +26,20 @@
 
 from pyfem.materials.BaseMaterial import BaseMaterial
 from pyfem.materials.MatUtils     import vonMisesStress,hydrostaticStress,Hardening
-from numpy import zeros, ones, dot, array, outer
+from pyfem.materials.MatUtils     import vonMisesStresses,hydrostaticStresses
+from pyfem.materials.MatUtils     import transform3To2,transform2To3
+from numpy import zeros, ones, dot, array, outer, einsum, arange, concatenate
 from math import sqrt
 
 class IsotropicHardeningPlasticity( BaseMaterial ):
 
+  historyVariables = { 'sigma'  : zeros(6) , 'eelas'  : zeros(6) ,
+                       'eplas'  : zeros(6) , 'eqplas' : zeros(1) }
+
   def __init__ ( self, props ):
 
     self.tolerance = 1.0e-6
+    self.maxIter   = 10
 
     BaseMaterial.__init__( self, props )
 
@@ -57,13 +63,6 @@ class IsotropicHardeningPlasticity( BaseMaterial ):
     self.ctang[3,3] = self.eg
     self.ctang[4,4] = self.ctang[3,3]
     self.ctang[5,5] = self.ctang[3,3]
- 
-    self.setHistoryParameter( 'sigma'  , zeros(6) )
-    self.setHistoryParameter( 'eelas'  , zeros(6) )
-    self.setHistoryParameter( 'eplas'  , zeros(6) )
-    self.setHistoryParameter( 'eqplas' , zeros(1) )
-
-    self.commitHistory()
 
     #Set the labels for the output data in this material model
     self.outLabels = [ "S11" , "S22" , "S33" , "S23" , "S13" , "S12" , "Epl" ]
@@ -81,18 +80,21 @@ class IsotropicHardeningPlasticity( BaseMaterial ):
     eqplas = self.getHistoryParameter('eqplas')   
     sigma  = self.getHistoryParameter('sigma') 
   
+    if len(kinematics.dstrain) == 6:
+      dstrain = kinematics.dstrain
+    else:
+      dstrain = transform2To3(kinematics.dstrain)
+
     tang = self.ctang
 
-    eelas += kinematics.dstrain
+    eelas += dstrain
 
-    sigma += dot( self.ctang , kinematics.dstrain )
+    sigma += dot( self.ctang , dstrain )
 
     smises = vonMisesStress( sigma )
 
     syield , hard = self.hardLaw.getHardening( eqplas )
 
-    print(syield,eqplas)
-
     if smises > ( 1.0 + self.tolerance ) * syield:
 
       shydro = hydrostaticStress( sigma )
@@ -102,8 +104,6 @@ class IsotropicHardeningPlasticity( BaseMaterial ):
       flow[:3] = flow[:3]-shydro*ones(3)
       flow *= 1.0/smises
 
-      syield = self.syield0
-
       deqpl = 0.0
       rhs   = syield
 
@@ -113,21 +113,19 @@ class IsotropicHardeningPlasticity( BaseMaterial ):
 
         k = k+1
 
-        if k > 10:
-          printf("rrrr")
+        if k > self.maxIter:
+          raise RuntimeError('Return mapping did not converge')
 
         rhs   = smises-self.eg3*deqpl - syield
         deqpl = deqpl+rhs/(self.eg3+hard)
 
         syield , hard = self.hardLaw.getHardening( eqplas + deqpl )
  
-        print("SS",syield,eqplas+deqpl)
-
       eplas[:3] +=  1.5 * flow[:3] * deqpl
       eelas[:3] += -1.5 * flow[:3] * deqpl
 
-      eplas[3:] +=  3.0 * flow[:3] * deqpl
-      eelas[3:] += -3.0 * flow[:3] * deqpl
+      eplas[3:] +=  3.0 * flow[3:] * deqpl
+      eelas[3:] += -3.0 * flow[3:] * deqpl
 
       sigma = flow * syield
       sigma[:3] += shydro * ones(3)
@@ -140,8 +138,9 @@ class IsotropicHardeningPlasticity( BaseMaterial ):
       effg2  = 2.0*effg
       effg3  = 3.0*effg
       efflam = 1.0/3.0 * ( self.ebulk3-effg2 )
-      effhdr = self.eg3 * self.hard/(self.eg3+self.hard)-effg3
+      effhdr = self.eg3 * hard/(self.eg3+hard)-effg3
      
+      tang = zeros(shape=(6,6))
       tang[:3,:3] = efflam
     
       for i in range(3):
@@ -155,10 +154,126 @@ class IsotropicHardeningPlasticity( BaseMaterial ):
     self.setHistoryParameter( 'sigma' , sigma  )
     self.setHistoryParameter( 'eqplas', eqplas )
 
-    # Store output eplas
+    # Store output eplas. The batched getStresses stores the output data of 
+    # all points, a new array is therefore assigned.
 
-    self.outData[:6] = sigma
-    self.outData[6]  = eqplas
+    self.outData = concatenate( ( sigma , eqplas[:1] ) )
 
-    return sigma , tang           
- 
+    if len(kinematics.dstrain) == 6:
+      return sigma , tang  
+    else:
+      return transform3To2(sigma,tang)
+
+#------------------------------------------------------------------------------
+#  Batched version of getStress for the material points with history rows
+#  points. The strain increments dstrains have the shape ( nPoints , nstr ). 
+#  The return mapping is only carried out for the yielding points, the local
+#  Newton iterations continue until all of them have converged. The tangent
+#  is returned once when no point yields, otherwise as a stack.
+#------------------------------------------------------------------------------
+
+  def getStresses( self, strains , dstrains , points ):
+
+    hist = self.historyManager
+
+    eelas  = hist.getParameters( points , 'eelas'  )
+    eplas  = hist.getParameters( points , 'eplas'  )
+    eqplas = hist.getParameters( points , 'eqplas' )[:,0]
+    sigma  = hist.getParameters( points , 'sigma'  )
+
+    if dstrains.shape[1] == 6:
+      dstrain = dstrains
+    else:
+      dstrain = transform2To3( dstrains )
+
+    eelas += dstrain
+    sigma += dot( dstrain , self.ctang.T )
+
+    smises = vonMisesStresses( sigma )
+
+    syield , hard = self.hardLaw.getHardening( eqplas )
+
+    plastic = ( smises > ( 1.0 + self.tolerance ) * syield ).nonzero()[0]
+
+    tang = self.ctang
+
+    if len(plastic) > 0:
+      sig    = sigma [plastic]
+      smis   = smises[plastic]
+      eqpl   = eqplas[plastic]
+      syield = syield[plastic]
+      hard   = hard  [plastic]
+
+      shydro = hydrostaticStresses( sig )
+
+      flow = sig.copy()
+      flow[:,:3] -= shydro[:,None]
+      flow       /= smis[:,None]
+
+      deqpl  = zeros( len(plastic) )
+      active = arange( len(plastic) )
+
+      k = 0
+
+      while len(active) > 0:
+
+        k = k+1
+
+        if k > self.maxIter:
+          raise RuntimeError('Return mapping did not converge')
+
+        rhs = smis[active] - self.eg3*deqpl[active] - syield[active]
+
+        deqpl[active] += rhs / ( self.eg3 + hard[active] )
+
+        syield[active] , hard[active] = self.hardLaw.getHardening( eqpl[active] + deqpl[active] )
+
+        active = active[ abs(rhs) > self.tolerance * self.syield0 ]
+
+      dep = flow * deqpl[:,None]
+
+      eplas[plastic,:3] += 1.5 * dep[:,:3]
+      eelas[plastic,:3] -= 1.5 * dep[:,:3]
+
+      eplas[plastic,3:] += 3.0 * dep[:,3:]
+      eelas[plastic,3:] -= 3.0 * dep[:,3:]
+
+      sigma[plastic]      = flow * syield[:,None]
+      sigma[plastic,:3]  += shydro[:,None]
+
+      eqplas[plastic] += deqpl
+
+      effg   = self.eg*syield / smis
+      effg2  = 2.0*effg
+      effg3  = 3.0*effg
+      efflam = 1.0/3.0 * ( self.ebulk3-effg2 )
+      effhdr = self.eg3 * hard/(self.eg3+hard)-effg3
+
+      tang = zeros( shape=( len(points) , 6 , 6 ) )
+      tang[:] = self.ctang
+
+      ptang = zeros( shape=( len(plastic) , 6 , 6 ) )
+      ptang[:,:3,:3] = efflam[:,None,None]
+
+      for i in range(3):
+        ptang[:,i,i]     += effg2
+        ptang[:,i+3,i+3] += effg
+
+      ptang += effhdr[:,None,None] * einsum( 'pi,pj->pij' , flow , flow )
+
+      tang[plastic] = ptang
+
+    hist.setParameters( points , 'eelas'  , eelas  )
+    hist.setParameters( points , 'eplas'  , eplas  )
+    hist.setParameters( points , 'sigma'  , sigma  )
+    hist.setParameters( points , 'eqplas' , eqplas[:,None] )
+
+    self.outData = zeros( shape=( len(points) , 7 ) )
+
+    self.outData[:,:6] = sigma
+    self.outData[:,6]  = eqplas
+
+    if dstrains.shape[1] == 6:
+      return sigma , tang
+    else:
+      return transform3To2( sigma , tang )
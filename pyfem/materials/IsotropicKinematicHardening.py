@@ -26,12 +26,16 @@
 
 from pyfem.materials.BaseMaterial import BaseMaterial
 from pyfem.materials.MatUtils     import vonMisesStress,hydrostaticStress
+from pyfem.materials.MatUtils     import vonMisesStresses,hydrostaticStresses
 from pyfem.materials.MatUtils     import transform3To2,transform2To3
-from numpy import zeros, ones, dot, array, outer
+from numpy import zeros, ones, dot, array, outer, einsum, concatenate
 from math import sqrt
 
 class IsotropicKinematicHardening( BaseMaterial ):
 
+  historyVariables = { 'sigma' : zeros(6) , 'eelas' : zeros(6) ,
+                       'eplas' : zeros(6) , 'alpha' : zeros(6) }
+
   def __init__ ( self, props ):
 
     self.tolerance = 1.0e-6
@@ -55,13 +59,6 @@ class IsotropicKinematicHardening( BaseMaterial ):
     self.ctang[3,3] = self.eg
     self.ctang[4,4] = self.ctang[3,3]
     self.ctang[5,5] = self.ctang[3,3]
- 
-    self.setHistoryParameter( 'sigma', zeros(6) )
-    self.setHistoryParameter( 'eelas', zeros(6) )
-    self.setHistoryParameter( 'eplas', zeros(6) )
-    self.setHistoryParameter( 'alpha', zeros(6) )
-
-    self.commitHistory()
 
     #Set the labels for the output data in this material model
     self.outLabels = [ "S11" , "S22" , "S33" , "S23" , "S13" , "S12" , "Epl" ]
@@ -136,12 +133,99 @@ class IsotropicKinematicHardening( BaseMaterial ):
 
     # Store output eplas
 
-    self.outData[:6] = sigma
-    self.outData[6]  = eplas[0]
+    self.outData = concatenate( ( sigma , eplas[:1] ) )
 
     if len(kinematics.dstrain) == 6:
       return sigma , tang  
     else:
       return transform3To2(sigma,tang)
-         
- 
+
+#------------------------------------------------------------------------------
+#  Batched version of getStress for the material points with history rows
+#  points. The strain increments dstrains have the shape ( nPoints , nstr ). 
+#  The return mapping is only carried out for the yielding points. The 
+#  tangent is returned once when no point yields, otherwise as a stack.
+#------------------------------------------------------------------------------
+
+  def getStresses( self, strains , dstrains , points ):
+
+    hist = self.historyManager
+
+    eelas = hist.getParameters( points , 'eelas' )
+    eplas = hist.getParameters( points , 'eplas' )
+    alpha = hist.getParameters( points , 'alpha' )
+    sigma = hist.getParameters( points , 'sigma' )
+
+    if dstrains.shape[1] == 6:
+      dstrain = dstrains
+    else:
+      dstrain = transform2To3( dstrains )
+
+    eelas += dstrain
+    sigma += dot( dstrain , self.ctang.T )
+
+    smises = vonMisesStresses( sigma - alpha )
+
+    plastic = ( smises > ( 1.0 + self.tolerance ) * self.syield ).nonzero()[0]
+
+    tang = self.ctang
+
+    if len(plastic) > 0:
+      sig  = sigma [plastic]
+      smis = smises[plastic]
+
+      shydro = hydrostaticStresses( sig )
+
+      flow = sig - alpha[plastic]
+      flow[:,:3] -= shydro[:,None]
+      flow       /= smis[:,None]
+
+      deqpl = ( smis - self.syield ) / ( self.eg3 + self.hard )
+
+      dep = flow * deqpl[:,None]
+
+      alpha[plastic] += self.hard * dep
+
+      eplas[plastic,:3] += 1.5 * dep[:,:3]
+      eelas[plastic,:3] -= 1.5 * dep[:,:3]
+
+      eplas[plastic,3:] += 3.0 * dep[:,3:]
+      eelas[plastic,3:] -= 3.0 * dep[:,3:]
+
+      sigma[plastic]      = alpha[plastic] + flow * self.syield
+      sigma[plastic,:3]  += shydro[:,None]
+
+      effg   = self.eg*(self.syield + self.hard*deqpl ) / smis
+      effg2  = 2.0*effg
+      effg3  = 3.0*effg
+      efflam = 1.0/3.0 * ( self.ebulk3-effg2 )
+      effhdr = self.eg3 * self.hard/(self.eg3+self.hard)-effg3
+
+      tang = zeros( shape=( len(points) , 6 , 6 ) )
+      tang[:] = self.ctang
+
+      ptang = zeros( shape=( len(plastic) , 6 , 6 ) )
+      ptang[:,:3,:3] = efflam[:,None,None]
+
+      for i in range(3):
+        ptang[:,i,i]     += effg2
+        ptang[:,i+3,i+3] += effg
+
+      ptang += effhdr[:,None,None] * einsum( 'pi,pj->pij' , flow , flow )
+
+      tang[plastic] = ptang
+
+    hist.setParameters( points , 'eelas' , eelas )
+    hist.setParameters( points , 'eplas' , eplas )
+    hist.setParameters( points , 'alpha' , alpha )
+    hist.setParameters( points , 'sigma' , sigma )
+
+    self.outData = zeros( shape=( len(points) , 7 ) )
+
+    self.outData[:,:6] = sigma
+    self.outData[:,6]  = eplas[:,0]
+
+    if dstrains.shape[1] == 6:
+      return sigma , tang
+    else:
+      return transform3To2( sigma , tang )
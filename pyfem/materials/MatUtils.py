@@ -1,4 +1,5 @@
-from numpy import dot,zeros,insert,array
+from numpy import dot,zeros,insert,array,searchsorted,clip
+from numpy import sqrt as vsqrt
 from math import sqrt
 
 def vonMisesStress( s ):
@@ -19,6 +20,24 @@ def hydrostaticStress( s ):
 
   return 0.333333333333333*sum( s[:3] );
 
+#
+#  Array versions for the stresses s of nPoints points, with shape ( nPoints , 6 )
+#
+
+def vonMisesStresses( s ):
+
+  smises = ( s[:,0] - s[:,1] ) * ( s[:,0] - s[:,1] ) + \
+           ( s[:,1] - s[:,2] ) * ( s[:,1] - s[:,2] ) + \
+           ( s[:,2] - s[:,0] ) * ( s[:,2] - s[:,0] )
+
+  smises += 6.0 * ( s[:,3:] * s[:,3:] ).sum( axis=1 )
+
+  return vsqrt( 0.5 * smises )
+
+def hydrostaticStresses( s ):
+
+  return 0.333333333333333*s[:,:3].sum( axis=1 )
+
 class Hardening:
 
   def __init__ ( self, props ):
@@ -31,10 +50,15 @@ class Hardening:
 
     self.htype = 0
 
+    #Without a hardening table, the yield stress is constant
+
+    self.Stresses      = array( [ self.syield , self.syield ] )
+    self.EqPlasStrains = array( [ 0. , self.maxStrain ] )
+
     if hasattr( props , "EqPlasStrains" ):
       self.htype = 1
-      insert(self.Stresses, 0, self.syield )
-      insert(self.EqPlasStrains, 0, 0. )
+      self.Stresses      = insert( array( props.Stresses , dtype=float ) , 0, self.syield )
+      self.EqPlasStrains = insert( array( props.EqPlasStrains , dtype=float ) , 0, 0. )
       
     elif hasattr( props , "q" ):
       self.htype = 2
@@ -54,51 +78,44 @@ class Hardening:
         self.EqPlasStrains[i+1] = (i+1)*epsInc
         self.Stresses[i+1] = self.K * pow(self.EqPlasStrains[i+1]+eps0,self.q)
 
-    print("RR",self.Stresses,self.EqPlasStrains)
- 
+#------------------------------------------------------------------------------
+#  Returns the yield stress and the hardening modulus for the equivalent 
+#  plastic strain eqplas, which is a float or an array. The stresses are 
+#  interpolated linearly in the table and extrapolated with the slope of the 
+#  last segment.
+#------------------------------------------------------------------------------
+
   def getHardening( self , eqplas ):
 
-#    if self.n == 0:
-#      return self.Stresses[0] , self.EqPlasStrains[0]
-#    else:
+    i = searchsorted( self.EqPlasStrains , eqplas , side='right' ) - 1
+    i = clip( i , 0 , len(self.EqPlasStrains) - 2 )
 
-    
-    if True:
+    eqpl0  = self.EqPlasStrains[i]
+    syiel0 = self.Stresses[i]
 
-      for i in range(self.n):
-        eqpl1 = self.EqPlasStrains[i+1]
+    hard = ( self.Stresses[i+1] - syiel0 ) / ( self.EqPlasStrains[i+1] - eqpl0 )
 
-        if eqplas < eqpl1:
-          eqpl0  = self.EqPlasStrains[i]
-          deqpl  = eqpl1-eqpl0
-    
-          syiel0 = self.Stresses[i]
-          dsyiel = self.Stresses[i+1]-syiel0
-          
-          hard = dsyiel / deqpl
-          return syiel0 + ( eqplas-eqpl0)*hard  , hard
-     
-      eqpl0  = self.EqPlasStrains[:-1]
-      deqpl  = self.EqPlasStrains[:]-eqpl0
-    
-      syiel0 = self.Stresses[:-1]
-      dsyiel = self.Stresses[:]-syiel0
-     
-      hard = dsyiel / deqpl
-      return siyel0 + ( eqplas-eqpl0)*hard  , hard
+    return syiel0 + ( eqplas - eqpl0 ) * hard , hard
       
 #
 #
 #
 
+#  The transformations also work for arrays of points, with shapes
+#  ( nPoints , 3 ) , ( nPoints , 6 ) and ( nPoints , 6 , 6 ) 
+
 def transform2To3( s ):
-  return array([ s[0] , s[1] , 0. , 0. , 0. , s[2] ])
+
+  s3 = zeros( s.shape[:-1] + (6,) )
+
+  s3[...,0] = s[...,0]
+  s3[...,1] = s[...,1]
+  s3[...,5] = s[...,2]
+
+  return s3
 
 def transform3To2( s , t ):
-  return array([ s[0] , s[1] , s[5] ]) , \
-         array([(t[0,0] , t[0,1] , t[0,5]), \
-                (t[1,0] , t[1,1] , t[1,5]), \
-                (t[5,0] , t[5,1] , t[5,5])])
+  return s[...,[0,1,5]] , t[...,[0,1,5],:][...,[0,1,5]]
                    
 
     
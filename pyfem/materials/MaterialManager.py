@@ -25,26 +25,69 @@
 ############################################################################
 
 from pyfem.util.dataStructures import Properties
+from weakref import WeakKeyDictionary
+from numpy import full, asarray
+import threading
+
+#------------------------------------------------------------------------------
+#  The material classes are imported once per type
+#------------------------------------------------------------------------------
+
+materialTypes = {}
+
+def getMaterialType ( matType ):
+
+  if matType not in materialTypes:
+    materialTypes[matType] = getattr(__import__('pyfem.materials.'+matType , globals(), locals(), matType , 0 ), matType )
+
+  return materialTypes[matType]
+
+#------------------------------------------------------------------------------
+#  Shared material instances. A material that is declared stateless, or that 
+#  stores its history in a HistoryManager, does not keep data of a single 
+#  material point in the instance. One instance is then shared by all points
+#  with the same material properties. Since the instance stores the output 
+#  data of the last evaluated point, every thread has its own instance, e.g. 
+#  when the ThreadPoolAssembler evaluates a group in several threads. For the
+#  same reason, the batched evaluation of getGroupStresses, which stores the 
+#  output data of all points, does not use the instance of the scalar 
+#  evaluation in getStress.
+#------------------------------------------------------------------------------
+
+sharedMaterials = threading.local()
+
+def getSharedMaterial ( material , matProps , batched = False ):
+
+  if not hasattr( sharedMaterials , 'instances' ):
+    sharedMaterials.instances = { False : WeakKeyDictionary() , True : WeakKeyDictionary() }
+
+  instances = sharedMaterials.instances[batched]
+
+  if matProps not in instances:
+    instances[matProps] = material( matProps )
+
+  return instances[matProps]
+
+#------------------------------------------------------------------------------
+#
+#------------------------------------------------------------------------------
 
 class MaterialManager ( list ):
 
   def __init__ ( self, matProps ):
 
-    matType = matProps.type
-
-    self.material = getattr(__import__('pyfem.materials.'+matType , globals(), locals(), matType , 0 ), matType )
+    self.material = getMaterialType( matProps.type )
     
-    self.matlist     = []
+    self.matlist     = {}
+    self.points      = full( 0 , -1 , dtype=int )
     self.matProps    = matProps
     self.iSam        = -1
     self.failureFlag = False
+    self.shared      = self.material.stateless or self.hasHistory()
     
     if hasattr(matProps,'failureType'):
     
-      failureType = matProps.failureType
-      
-      failure = getattr(__import__('pyfem.materials.'+failureType , \
-        globals(), locals(), failureType , 0 ), failureType )
+      failure = getMaterialType( matProps.failureType )
  
       self.failure = failure( matProps )
       self.failureFlag = True
@@ -60,10 +103,7 @@ class MaterialManager ( list ):
     else:
       self.iSam = iSam
             
-    while self.iSam >= len(self.matlist):
-      self.matlist.append(self.material( self.matProps ))
-        
-    self.mat = self.matlist[self.iSam]
+    self.mat = self.getMaterial( self.iSam )
      
     result = self.mat.getStress( kinematic )
     
@@ -71,7 +111,107 @@ class MaterialManager ( list ):
       self.failure.check(result[0],kinematic)
       
     return result
-    
+
+#------------------------------------------------------------------------------
+#  Returns the material of point iSam. Shared materials with history are
+#  pointed to the history row of the point.
+#------------------------------------------------------------------------------
+
+  def getMaterial ( self, iSam ):
+
+    if not self.shared:
+      if iSam not in self.matlist:
+        self.matlist[iSam] = self.material( self.matProps )
+
+      return self.matlist[iSam]
+
+    mat = getSharedMaterial( self.material , self.matProps )
+
+    if mat.historyManager is not None:
+      mat.historyIndex = int( self.getPoints( iSam ) )
+
+    return mat
+
+#------------------------------------------------------------------------------
+#  Versions of getStress and getStresses for the group kernels, see
+#  pyfem.fem.Assembly. One manager then holds the material points of all 
+#  elements in the group, and several threads may evaluate them at the same
+#  time. The material is therefore returned together with the results, 
+#  instead of being stored in the manager. It holds the output data.
+#------------------------------------------------------------------------------
+
+  def getPointStress ( self, kinematic , iSam ):
+
+    mat = self.getMaterial( iSam )
+
+    sigma,tang = mat.getStress( kinematic )
+
+    if self.failureFlag:
+      self.failure.check( sigma , kinematic )
+
+    return sigma , tang , mat
+
+  def getGroupStresses ( self, strains , dstrains = None , points = None ):
+
+    mat = getSharedMaterial( self.material , self.matProps , batched = True )
+
+    if points is None:
+      sigma,tang = mat.getStresses( strains )
+    else:
+      sigma,tang = mat.getStresses( strains , dstrains , self.getPoints( points ) )
+
+    return sigma , tang , mat
+
+#------------------------------------------------------------------------------
+#  Batched evaluation of the material points of an element group. The 
+#  material supports it when it is shared, see getSharedMaterial, and when 
+#  it provides getStresses( strains ), with strains an ( nPoints , nstr ) 
+#  array. It returns the stresses and either a single tangent that holds for
+#  all points or an ( nPoints , nstr , nstr ) stack.
+#  The output data of the points is stored as an ( nPoints , nOut ) array.
+#
+#  Materials with history variables provide getStresses( strains , dstrains,
+#  points ) instead, where points are the rows of the material points in 
+#  the HistoryManager, see getPoints.
+#------------------------------------------------------------------------------
+
+  def isBatched( self ):
+
+    return hasattr( self.material , 'getStresses' ) and self.shared and not self.failureFlag
+
+  def hasHistory( self ):
+
+    return len( self.material.historyVariables ) > 0
+
+#------------------------------------------------------------------------------
+#  Returns the rows in the HistoryManager of the material points iSam of this
+#  manager, which is an integer or an array of integers. These are the same
+#  points that getStress uses. A point is added to the HistoryManager when it
+#  is used for the first time.
+#------------------------------------------------------------------------------
+
+  def getPoints ( self, iSam ):
+
+    iSam = asarray( iSam , dtype=int )
+
+    if iSam.size == 0:
+      return self.points[iSam]
+
+    if len(self.points) <= iSam.max() or ( self.points[iSam] < 0 ).any():
+      with pointLock:
+        if len(self.points) <= iSam.max():
+          points = full( max( iSam.max() + 1 , 2 * len(self.points) ) , -1 , dtype=int )
+          points[:len(self.points)] = self.points
+          self.points = points
+
+        history = getSharedMaterial( self.material , self.matProps ).historyManager
+
+        for i in iSam.ravel():
+          if self.points[i] < 0:
+            self.points[i] = history.addPoint()
+
+    return self.points[iSam]
+
   def outLabels( self ):
     return self.mat.outLabels
 
@@ -79,8 +219,13 @@ class MaterialManager ( list ):
     return self.mat.outData
 
   def getHistory( self , label ):
-    return self.mat.getHistoryParameter( label )
+    return self.getMaterial( self.iSam ).getHistoryParameter( label )
 
   def commitHistory( self ):
-    for mat in self.matlist:
+    for mat in self.matlist.values():
       mat.commitHistory()
+
+    if self.shared and self.hasHistory():
+      getSharedMaterial( self.material , self.matProps ).commitHistory()
+
+pointLock = threading.Lock()
@@ -25,7 +25,7 @@
 ############################################################################
 
 from pyfem.materials.BaseMaterial import BaseMaterial
-from numpy import zeros, dot, array, outer
+from numpy import zeros, dot, array, outer, einsum, where, append
 from math import sqrt
 
 class PlaneStrainDamage( BaseMaterial ):
@@ -36,6 +36,8 @@ class PlaneStrainDamage( BaseMaterial ):
 
   sc = 1./3.
 
+  historyVariables = { 'kappa' : 0. }
+
   def __init__ ( self, props ):
 
     BaseMaterial.__init__( self, props )
@@ -57,9 +59,6 @@ class PlaneStrainDamage( BaseMaterial ):
 
     self.c = self.nu/(self.nu-1.)
 
-    self.setHistoryParameter( 'kappa', 0. )
-    self.commitHistory()
-
     self.outLabels = [ "S11" , "S22" , "S12" , "damage" ]
     self.outData   = zeros(4)
 
@@ -92,8 +91,7 @@ class PlaneStrainDamage( BaseMaterial ):
     if progDam:
       tang += -domegadkappa * outer( effStress , detadstrain )
 
-    self.outData[0:3] = stress
-    self.outData[3]   = omega
+    self.outData = append( stress , omega )
 
     return stress , tang           
  
@@ -116,11 +114,9 @@ class PlaneStrainDamage( BaseMaterial ):
 
     dexxdstrain = self.O1
     deyydstrain = self.O2
-    dexydstrain = 0.5*self.O3
+    dexydstrain = self.O3
     dezzdstrain = self.c*(dexxdstrain+deyydstrain)
 
-    depsdstrain = zeros(3)
-
     dI1dstrain = dexxdstrain+deyydstrain+dezzdstrain
 
     dJ2dstrain  = self.sc*(2.*exx-eyy-ezz)*dexxdstrain
@@ -153,7 +149,7 @@ class PlaneStrainDamage( BaseMaterial ):
 
       detadstrain = detadI1*dI1dstrain + detadJ2*dJ2dstrain
 
-    return eps , depsdstrain
+    return eps , detadstrain
 
 #------------------------------------------------------------------------------
 #  pre:  equivalent strain term kappa
@@ -174,3 +170,110 @@ class PlaneStrainDamage( BaseMaterial ):
       domegadkappa = 0.
 
     return omega , domegadkappa
+
+#------------------------------------------------------------------------------
+#  Batched version of getStress for the material points with history rows
+#  points. The strains have the shape ( nPoints , 3 ). The tangent is 
+#  returned once when none of the points is damaged, otherwise as a stack.
+#------------------------------------------------------------------------------
+
+  def getStresses( self, strains , dstrains , points ):
+
+    hist = self.historyManager
+
+    kappa = hist.getParameters( points , 'kappa' )
+
+    eps , detadstrain = self.getEquivStrains( strains )
+
+    progDam = ( eps > kappa ).nonzero()[0]
+
+    kappa[progDam] = eps[progDam]
+
+    hist.setParameters( points , 'kappa' , kappa )
+
+    omega , domegadkappa = self.getDamages( kappa )
+
+    effStress = dot( strains , self.De.T )
+
+    stress = ( 1. - omega )[:,None] * effStress
+
+    if omega.any():
+      tang = ( 1. - omega )[:,None,None] * self.De
+    else:
+      tang = self.De
+
+    if domegadkappa[progDam].any():
+      if tang.ndim == 2:
+        tang = zeros( shape=( len(points) , 3 , 3 ) ) + self.De
+
+      tang[progDam] -= domegadkappa[progDam,None,None] * \
+        einsum( 'pi,pj->pij' , effStress[progDam] , detadstrain[progDam] )
+
+    self.outData = zeros( shape=( len(points) , 4 ) )
+
+    self.outData[:,:3] = stress
+    self.outData[:,3]  = omega
+
+    return stress , tang
+
+#------------------------------------------------------------------------------
+#  pre:  strains of a number of points (array of shape ( nPoints , 3 ))
+#  post: equivalent strains (eps) and their derivatives w.r.t. the strains
+#------------------------------------------------------------------------------
+
+  def getEquivStrains( self , strains ):
+
+    exx = strains[:,0]
+    eyy = strains[:,1]
+    exy = strains[:,2]
+    ezz = self.c*(exx+eyy)
+
+    I1 = exx+eyy+ezz
+    J2 = (exx**2+eyy**2+ezz**2-exx*eyy-eyy*ezz-exx*ezz)/3.0+exy**2
+
+    dI1dstrain = (1.+self.c)*(self.O1+self.O2)
+
+    dJ2dstrain  = outer( self.sc*(2.*exx-eyy-ezz) , self.O1 )
+    dJ2dstrain += outer( self.sc*(2.*eyy-exx-ezz) , self.O2 )
+    dJ2dstrain += outer( self.sc*(2.*ezz-exx-eyy) , self.c*(self.O1+self.O2) )
+    dJ2dstrain += outer( 2.*exy , self.O3 )
+
+    disc  = (self.a2*I1)**2+self.a3*J2
+    small = disc < 1e-16
+
+    tmp = where( small , 1. , disc )**0.5
+
+    dtmpdI1 = (0.5/tmp)*2.*self.a2**2*I1
+    dtmpdJ2 = (0.5/tmp)*self.a3
+
+    tmp[small] = 0.
+
+    eps = self.a1*( self.a2*I1 + tmp )
+
+    detadstrain  = outer( self.a1*(self.a2+dtmpdI1) , dI1dstrain )
+    detadstrain += (self.a1*dtmpdJ2)[:,None]*dJ2dstrain
+
+    detadstrain[small] = self.a1*self.a2*dI1dstrain + self.a1*self.O4
+
+    return eps , detadstrain
+
+#------------------------------------------------------------------------------
+#  pre:  equivalent strain terms kappa of a number of points
+#  post: damage (omega) and its derivative w.r.t. kappa (domegadkappa)
+#------------------------------------------------------------------------------
+
+  def getDamages( self , kappa ):
+
+    omega        = zeros( len(kappa) )
+    domegadkappa = zeros( len(kappa) )
+
+    soft = ( ( kappa > self.kappa0 ) & ( kappa < self.kappac ) ).nonzero()[0]
+
+    fac = self.kappac/kappa[soft]
+
+    omega[soft]        = fac*(kappa[soft]-self.kappa0)/(self.kappac-self.kappa0)
+    domegadkappa[soft] = fac/(self.kappac-self.kappa0)-(omega[soft]/kappa[soft])
+
+    omega[kappa >= self.kappac] = 1.
+
+    return omega , domegadkappa
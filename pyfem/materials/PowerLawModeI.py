@@ -25,11 +25,12 @@
 ############################################################################
 
 from pyfem.materials.BaseMaterial import BaseMaterial
-from numpy import zeros
-from math  import exp 
+from numpy import zeros, exp
 
 class PowerLawModeI( BaseMaterial ):
 
+  stateless = True
+
   def __init__ ( self, props ):
 
     #Call the BaseMaterial constructor
@@ -58,3 +59,22 @@ class PowerLawModeI( BaseMaterial ):
    self.outData = stress
 
    return stress,tang
+
+#------------------------------------------------------------------------------
+#  Batched version of getStress for the openings of a number of points, 
+#  strains has the shape ( nPoints , 2 ).
+#------------------------------------------------------------------------------
+
+  def getStresses( self, strains ):
+
+    stress = zeros( strains.shape )
+    tang   = zeros( strains.shape + (2,) )
+
+    jump = strains[:,0]
+
+    stress[:,0] = self.Gc/self.deltan2*exp(-jump/self.deltan)*jump
+    tang[:,0,0] = self.Gc/self.deltan2*exp(-jump/self.deltan)*(1.0-jump/self.deltan)
+
+    self.outData = stress
+
+    return stress,tang
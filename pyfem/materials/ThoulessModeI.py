@@ -26,10 +26,11 @@
 
 from pyfem.materials.BaseMaterial import BaseMaterial
 from numpy import zeros
-from math  import exp 
 
 class ThoulessModeI( BaseMaterial ):
 
+  stateless = True
+
   def __init__ ( self, props ):
 
     #Call the BaseMaterial constructor
@@ -65,6 +66,33 @@ class ThoulessModeI( BaseMaterial ):
       stress[0] = 0.0
       tang[0,0] = 0.0
 
-    self.outData = trac
+    self.outData = stress
+
+    return stress,tang
+
+#------------------------------------------------------------------------------
+#  Batched version of getStress for the openings of a number of points, 
+#  strains has the shape ( nPoints , 2 ).
+#------------------------------------------------------------------------------
+
+  def getStresses( self, strains ):
+ 
+    stress = zeros( strains.shape )
+    tang   = zeros( strains.shape + (2,) )
+
+    jump = strains[:,0]
+
+    elastic   = jump < self.d1
+    softening = ( jump >= self.d2 ) & ( jump < self.d3 )
+
+    stress[elastic,0] = self.dummy * jump[elastic]
+    tang[elastic,0,0] = self.dummy
+
+    stress[( jump >= self.d1 ) & ( jump < self.d2 ),0] = self.Tult
+
+    stress[softening,0] = self.Tult* ( 1.0 - ( jump[softening] - self.d2 ) / ( self.d3-self.d2 ) )
+    tang[softening,0,0] = self.Tult* ( - 1.0 ) / ( self.d3 - self.d2 )
+
+    self.outData = stress
 
     return stress,tang
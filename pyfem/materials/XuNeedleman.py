@@ -25,11 +25,12 @@
 ############################################################################
 
 from pyfem.materials.BaseMaterial import BaseMaterial
-from numpy import zeros
-from math  import exp 
+from numpy import zeros, exp
 
 class XuNeedleman( BaseMaterial ):
 
+  stateless = True
+
   def __init__ ( self, props ):
 
     #Call the BaseMaterial constructor
@@ -96,3 +97,57 @@ class XuNeedleman( BaseMaterial ):
     self.outData = stress
 
     return stress,tang
+
+#------------------------------------------------------------------------------
+#  Batched version of getStress for the openings of a number of points, 
+#  strains has the shape ( nPoints , 2 ).
+#------------------------------------------------------------------------------
+
+  def getStresses( self, strains ):
+ 
+    stress = zeros( strains.shape )
+    tang   = zeros( strains.shape + (2,) )
+
+    t1 = 1.0/self.vnmax
+    t3 = strains[:,0]*t1
+    t4 = exp(-t3)
+    t6 = 1.0-self.q
+    t9 = 1.0/(self.r-1.0)
+    t12 = (self.r-self.q)*t9
+    t14 = self.q+t12*t3
+    t15 = strains[:,1]*strains[:,1]
+    t16 = self.vtmax*self.vtmax
+    t17 = 1.0/t16
+    t18 = 0.0
+    t19 = exp(-t15*t17)
+    t24 = self.Gc*t4
+
+    stress[:,0] = -t4*((1.0-self.r+t3)*t6*t9-t14*t19)*self.Gc*t1+t24*(t1*t6*t9-t12*t1*t19)
+    stress[:,1] = 2.0*t24*t14*strains[:,1]*t17*t19
+
+    t1  = self.vnmax*self.vnmax
+    t4  = 1/self.vnmax
+    t5  = strains[:,0]*t4
+    t6  = exp(-t5)
+    t8  = 1.0-self.q
+    t11 = 1/(self.r-1.0)
+    t14 = (self.r-self.q)*t11
+    t16 = self.q+t14*t5
+    t17 = strains[:,1]*strains[:,1]
+    t18 = self.vtmax*self.vtmax
+    t19 = 1/t18
+    t21 = exp(-t17*t19)
+    t26 = self.Gc*t4
+    t38 = t19*t21
+    t41 = self.Gc*t6
+    t46 = -t26*t6*t16*strains[:,1]*t38+t41*t14*t4*strains[:,1]*t38
+    t52 = t18*t18
+    
+    tang[:,0,0] = self.Gc/t1*t6*((1.0-self.r+t5)*t8*t11-t16*t21)-2.0*t26*t6*(t4*t8*t11-t14*t4*t21)
+    tang[:,0,1] = 2.0*t46
+    tang[:,1,0] = 2.0*t46
+    tang[:,1,1] = 2.0*t41*t16*t19*t21-4.0*t41*t16*t17/t52*t21
+
+    self.outData = stress
+
+    return stress,tang
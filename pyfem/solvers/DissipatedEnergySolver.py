@@ -85,8 +85,10 @@ class DissipatedEnergySolver( BaseModule ):
         w  = -0.5 * dot ( (a-Da) , fhat )
         g  =  0.5 * dot ( ( lam0 * Da - self.Dlam * ( a[:] - Da[:] ) ) , fhat ) - globdat.dtau
   
-        d1 = globdat.dofs.solve( K , globdat.lam*fhat - fint )
-        d2 = globdat.dofs.solve( K , -1.0*fhat )
+        solver = globdat.dofs.factorize( K )
+
+        d1 = solver.solve( globdat.lam*fhat - fint )
+        d2 = solver.solve( -1.0*fhat )
 
         denom  = dot ( h , d2 ) - w
 
@@ -105,8 +105,10 @@ class RiksSolver( BaseModule ):
 
       stat.iiter += 1
 
-      d1 = globdat.dofs.solve( K , fhat )
-      d2 = globdat.dofs.solve( K , res )
+      solver = globdat.dofs.factorize( K )
+
+      d1 = solver.solve( fhat )
+      d2 = solver.solve( res )
        
       ddlam = -dot(Da1,d2)/dot(Da1,d1)
       dda   = ddlam*d1 + d2
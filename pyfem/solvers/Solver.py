@@ -40,6 +40,9 @@ class Solver:
 
     props.currentModule = "solver"
 
+    if hasattr( solverProps , "linearSolver" ):
+      globdat.dofs.setLinearSolver( solverProps.linearSolver )
+
     self.solver = eval(solverType+"( props , globdat )")
     
 #------------------------------------------------------------------------------
@@ -23,7 +23,7 @@
 #  free from errors. Furthermore, the authors shall not be liable in any   #
 #  event caused by the use of the program.                                 #
 ############################################################################
-from numpy import zeros
+from numpy import zeros, divide
 from pyfem.util.logger     import getLogger
 
 logger = getLogger()
@@ -235,18 +235,15 @@ class GlobalData ( Properties ):
     weights = getattr( self, outputName + 'Weights' )
 
     if type(inodes) is int:
-      i = list(self.nodes.keys()).index(inodes)
+      i = self.nodes.getIndices(inodes)
       return data[i] / weights[i]
     else:
-      outdata=[]
+      data    = data[inodes]
+      weights = weights[inodes]
 
-      for row,w in zip(data[inodes],weights[inodes]):
-        if w != 0:
-          outdata.append(row/w)
-        else:
-          outdata.append(row)
+      #Nodes without contributions keep their (zero) value
 
-      return outdata
+      return divide( data , weights , out = data.copy() , where = weights != 0 )
 
 #-------------------------------------------------------------------------------
 #
@@ -282,4 +279,27 @@ class elementData():
   def __str__( self ):
 
     return self.state
-     
+
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+
+class groupData():
+
+  '''Stacked data of all elements in an element group that is passed to the
+     group kernels of an element (e.g. getGroupTangentStiffness). The 
+     kernel stores its results in stiff ( nElem x nDof x nDof ),
+     fint ( nElem x nDof ), mass and lumped.'''
+
+  def __init__( self , grstate , grDstate ):
+
+    self.state  = grstate
+    self.Dstate = grDstate
+    self.stiff  = None
+    self.fint   = None
+    self.mass   = None
+    self.lumped = None
+
+  def __len__( self ):
+
+    return len(self.state)
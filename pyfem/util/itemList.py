@@ -23,6 +23,8 @@
 #  free from errors. Furthermore, the authors shall not be liable in any   #
 #  event caused by the use of the program.                                 #
 ############################################################################
+from numpy import array, asarray, full, integer
+
 class itemList ( dict ):
 
   def add ( self, ID, item ):
@@ -30,7 +32,72 @@ class itemList ( dict ):
     if ID in self:
       raise RuntimeError( 'ID ' + str(ID) + ' already exists in ' + type(self).__name__ )
 
-    self[ID] = item
+    self.getIndexMap()[ID] = len(self)
+
+    dict.__setitem__( self, ID, item )
+
+    self.__dict__.pop( 'indexTable' , None )
+
+  def __setitem__ ( self, ID, item ):
+
+    if ID not in self:
+      self.resetIndexMap()
+
+    dict.__setitem__( self, ID, item )
+
+  def __delitem__ ( self, ID ):
+
+    dict.__delitem__( self, ID )
+
+    self.resetIndexMap()
+
+  def pop ( self, ID, *default ):
+
+    if ID not in self and len(default) > 0:
+      return default[0]
+
+    item = self[ID]
+
+    del self[ID]
+
+    return item
+
+  def popitem ( self ):
+
+    if len(self) == 0:
+      raise KeyError( 'popitem(): ' + type(self).__name__ + ' is empty' )
+
+    ID = next( reversed( self.keys() ) )
+
+    return ID , self.pop( ID )
+
+  def clear ( self ):
+
+    dict.clear( self )
+
+    self.resetIndexMap()
+
+  def update ( self, *args, **kwargs ):
+
+    for ID,item in dict( *args, **kwargs ).items():
+      self[ID] = item
+
+  def setdefault ( self, ID, default = None ):
+
+    if ID not in self:
+      self[ID] = default
+
+    return self[ID]
+
+  def resetIndexMap ( self ):
+
+    '''Discards the map from the IDs to their positions and the lookup table
+       that is derived from it. Both are rebuilt when they are needed again.
+       This is called whenever IDs are removed, or added in another way
+       than through add.'''
+
+    self.__dict__.pop( 'indexMap'   , None )
+    self.__dict__.pop( 'indexTable' , None )
 
   def get ( self, IDs ):
 
@@ -41,11 +108,61 @@ class itemList ( dict ):
       
     raise RuntimeError('illegal argument for itemList.get')  
 
+  def getIndexMap ( self ):
+
+    '''Returns the dictionary that maps the IDs to their position in the 
+       list. The map is updated in add and it is rebuilt after the list has
+       been modified in another way, see resetIndexMap.'''
+
+    if 'indexMap' not in self.__dict__:
+      self.indexMap = dict( [ (ID,i) for i,ID in enumerate(self.keys()) ] )
+
+    return self.indexMap
+
   def getIndices ( self, IDs ):
     
-    if isinstance(IDs,int):
-      return list(self.keys()).index( IDs )
+    indexMap = self.getIndexMap()
+
+    if isinstance(IDs,(int,integer)):
+      return indexMap[IDs]
     elif isinstance(IDs,list):
-      return [ list(self.keys()).index( ID ) for ID in IDs ]
+      return [ indexMap[ID] for ID in IDs ]
       
     raise RuntimeError('illegal argument for itemList.getIndices')  
+
+  def getIndexArray ( self, IDs ):
+
+    '''Returns the positions of an array of IDs of arbitrary shape as an 
+       integer array of the same shape. When all IDs are non-negative 
+       integers that are not too sparse, the lookup is a single fancy index
+       in a table.'''
+
+    IDs = asarray( IDs )
+
+    if 'indexTable' not in self.__dict__:
+      indexMap = self.getIndexMap()
+      keys     = None
+
+      if len(indexMap) > 0 and all( [ isinstance(ID,(int,integer)) and ID >= 0 for ID in indexMap ] ):
+        keys = array( list(indexMap.keys()) , dtype=int )
+
+      if keys is not None and keys.max() < 4 * len(keys) + 1024:
+        self.indexTable = full( keys.max()+1 , -1 , dtype=int )
+        self.indexTable[keys] = list(indexMap.values())
+      else:
+        self.indexTable = None
+
+    if self.indexTable is not None and IDs.dtype.kind in 'iu':
+      if IDs.size > 0 and ( IDs.min() < 0 or IDs.max() >= len(self.indexTable) ):
+        raise KeyError( 'ID does not exist in ' + type(self).__name__ )
+
+      indices = self.indexTable[IDs]
+
+      if ( indices < 0 ).any():
+        raise KeyError( 'ID does not exist in ' + type(self).__name__ )
+
+      return indices
+
+    indexMap = self.getIndexMap()
+
+    return array( [ indexMap[ID] for ID in IDs.ravel().tolist() ] , dtype=int ).reshape( IDs.shape )
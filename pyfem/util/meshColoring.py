@@ -0,0 +1,92 @@
+############################################################################
+#  This Python file is part of PyFEM, the code that accompanies the book:  #
+#                                                                          #
+#    'Non-Linear Finite Element Analysis of Solids and Structures'         #
+#    R. de Borst, M.A. Crisfield, J.J.C. Remmers and C.V. Verhoosel        #
+#    John Wiley and Sons, 2012, ISBN 978-0470666449                        #
+#                                                                          #
+#  The code is written by J.J.C. Remmers, C.V. Verhoosel and R. de Borst.  #
+#                                                                          #
+#  The latest stable version can be downloaded from the web-site:          #
+#     http://www.wiley.com/go/deborst                                      #
+#                                                                          #
+#  A github repository, with the most up to date version of the code,      #
+#  can be found here:                                                      #
+#     https://github.com/jjcremmers/PyFEM                                  #
+#                                                                          #
+#  The code is open source and intended for educational and scientific     #
+#  purposes only. If you use PyFEM in your research, the developers would  #
+#  be grateful if you could cite the book.                                 #  
+#                                                                          #
+#  Disclaimer:                                                             #
+#  The authors reserve all rights but do not guarantee that the code is    #
+#  free from errors. Furthermore, the authors shall not be liable in any   #
+#  event caused by the use of the program.                                 #
+############################################################################
+
+from numpy import zeros, cumsum, where, full
+
+#-------------------------------------------------------------------------------
+#  Returns the element-to-node adjacency of a group in compressed form: the 
+#  node indices of element i are indices[indptr[i]:indptr[i+1]]. The 
+#  connectivity contains the node IDs of every element, see 
+#  ElementSet.getConnectivity.
+#-------------------------------------------------------------------------------
+
+def getElementNodeAdjacency( connectivity , nodes ):
+
+  indptr = zeros( len(connectivity)+1 , dtype=int )
+
+  if connectivity.dtype != object:
+    indptr[1:] = cumsum( full( len(connectivity) , connectivity.shape[1] ) )
+
+    return indptr , nodes.getIndexArray( connectivity ).ravel()
+
+  indptr[1:] = cumsum( [ len(elemNodes) for elemNodes in connectivity ] )
+
+  indices = nodes.getIndexArray( [ ID for elemNodes in connectivity for ID in elemNodes ] )
+
+  return indptr , indices
+
+#-------------------------------------------------------------------------------
+#  Greedy coloring of the elements of a group. Two elements that share a node 
+#  never get the same color. Returns the color of each element.
+#-------------------------------------------------------------------------------
+
+def getElementColors( connectivity , nodes ):
+
+  indptr , indices = getElementNodeAdjacency( connectivity , nodes )
+
+  nodeColors = [ set() for i in range(len(nodes)) ]
+  colors     = zeros( len(connectivity) , dtype=int )
+
+  for iElm in range(len(connectivity)):
+    elemNodes = indices[indptr[iElm]:indptr[iElm+1]]
+
+    used = set()
+
+    for iNod in elemNodes:
+      used.update( nodeColors[iNod] )
+
+    color = 0
+
+    while color in used:
+      color += 1
+
+    for iNod in elemNodes:
+      nodeColors[iNod].add( color )
+
+    colors[iElm] = color
+
+  return colors
+
+#-------------------------------------------------------------------------------
+#  Returns, for every color, the positions of the elements with that color.
+#-------------------------------------------------------------------------------
+
+def getColorGroups( colors ):
+
+  if len(colors) == 0:
+    return []
+
+  return [ where( colors == color )[0] for color in range( colors.max()+1 ) ]
@@ -24,16 +24,48 @@
 #  event caused by the use of the program.                                 #
 ############################################################################
 from math import sqrt
-from numpy import array, dot, ndarray, empty, zeros , ones
+from numpy import array, dot, ndarray, empty, zeros , ones, einsum, linalg, diff, full, arange
 from scipy.linalg import norm , det , inv
 from scipy.special.orthogonal import p_roots as gauss_scheme
+from threading import Lock
+from pyfem.util.logger import getLogger
+
+logger = getLogger()
 
 class shapeData:
   
   pass
+
+#----------------------------------------------------------------------
+
+class groupShapeData:
+
+  '''Shape data of all integration points of a group of elements of the
+     same type. The arrays are stacked as:
+       h      ( nIP , nNodes )
+       dhdxi  ( nIP , nNodes , rank )
+       dhdx   ( nElem , nIP , nNodes , rank )
+       weight ( nElem , nIP )
+       x      ( nElem , nIP , rank )'''
+
+  pass
    
 #----------------------------------------------------------------------
 
+class referenceShapeData:
+
+  '''Shape data in the integration points of a reference element:
+       xi     list of nIP integration point coordinates
+       h      ( nIP , nNodes )
+       dhdxi  ( nIP , nNodes , rank )
+       weight ( nIP )'''
+
+  pass
+
+referenceCache = {}
+
+#----------------------------------------------------------------------
+
 class elemShapeData:
 
   def __init__( self ):
@@ -568,6 +600,44 @@ def getIntegrationPoints( elemType , order , scheme ):
 #
 #------------------------------------------------------------------------------
 
+def getReferenceShapeData( elemType , order = 0 , method = 'Gauss' ):
+
+  '''Returns the shape functions and their derivatives in the integration
+     points of the reference element. The data is computed once per 
+     ( elemType , order , method ) and stored in referenceCache.'''
+
+  key = ( elemType , order , method )
+
+  if key not in referenceCache:
+    if 'getShape'+elemType not in globals():
+      raise NotImplementedError('Unknown type :'+elemType)
+
+    shapeFunction = globals()['getShape'+elemType]
+
+    (intCrds,intWghts) = getIntegrationPoints( elemType , order , method )
+
+    sData = [ shapeFunction( xi ) for xi in intCrds ]
+
+    rData = referenceShapeData()
+
+    rData.xi     = intCrds
+    rData.h      = array( [ s.h     for s in sData ] )
+    rData.dhdxi  = array( [ s.dhdxi for s in sData ] )
+    rData.weight = array( intWghts , dtype=float )
+
+    #The arrays are shared by all elements and may not be modified
+
+    for data in ( rData.h , rData.dhdxi , rData.weight ):
+      data.setflags( write = False )
+
+    referenceCache[key] = rData
+
+  return referenceCache[key]
+
+#------------------------------------------------------------------------------
+#
+#------------------------------------------------------------------------------
+
 def calcWeight( jac ):
 
   n = jac.shape
@@ -583,27 +653,442 @@ def calcWeight( jac ):
 
 def getElemShapeData( elemCoords , order = 0 , method = 'Gauss' , elemType = 'Default' ):
 
-  elemData = elemShapeData()
-  
   if elemType == 'Default':  
     elemType = getElemType( elemCoords )
     
-  (intCrds,intWghts) = getIntegrationPoints( elemType , order , method )
+  rData = getReferenceShapeData( elemType , order , method )
+
+  #Jacobians of all integration points at once
+  
+  jac = einsum( 'ni,gnj->gij' , elemCoords , rData.dhdxi )
+
+  dhdx = None
+
+  if jac.shape[1] == jac.shape[2]:
+    dhdx   = einsum( 'gnk,gkj->gnj' , rData.dhdxi , linalg.inv( jac ) )
+    weight = abs( linalg.det( jac ) ) * rData.weight
+  elif jac.shape[1] == 2 and jac.shape[2] == 1:
+    weight = ( einsum( 'gij,gij->g' , jac , jac )**0.5 ) * rData.weight
+  else:
+    weight = [ calcWeight( j ) * w for j,w in zip( jac , rData.weight ) ]
+
+  x = dot( rData.h , elemCoords )
     
-  for xi,weight in zip( intCrds , intWghts ):    
-    try:
-      sData = eval( 'getShape'+elemType+'(xi)' )
-    except:
-      raise NotImplementedError('Unknown type :'+elemType)
+  return fillElemShapeData( rData , dhdx , weight , x )
+
+#------------------------------------------------------------------------------
+#  Creates the elemShapeData object of an element from the reference data and
+#  the arrays dhdx ( nIP , nNodes , rank ), weight ( nIP ) and x ( nIP , rank )
+#------------------------------------------------------------------------------
+
+def fillElemShapeData( rData , dhdx , weight , x ):
 
-    jac = dot ( elemCoords.transpose() , sData.dhdxi )
+  elemData = elemShapeData()
+
+  for i in range(len(rData.weight)):
+    sData = shapeData()
+
+    sData.h     = rData.h[i]
+    sData.dhdxi = rData.dhdxi[i]
+    sData.xi    = rData.xi[i]
 
-    if jac.shape[0] == jac.shape[1]:
-      sData.dhdx = dot ( sData.dhdxi , inv( jac ) )
+    if dhdx is not None:
+      sData.dhdx = dhdx[i]
 
-    sData.weight = calcWeight( jac ) * weight
-    sData.x      = dot(sData.h,elemCoords)
+    sData.weight = weight[i]
+    sData.x      = x[i]
 
     elemData.sData.append(sData)
 
   return elemData
+
+#------------------------------------------------------------------------------
+#
+#------------------------------------------------------------------------------
+
+def getGroupShapeData( groupCoords , order = 0 , method = 'Gauss' , elemType = 'Default' ):
+
+  '''Returns the shape data of a group of elements with the same element
+     type. groupCoords is an array with shape ( nElem , nNodes , rank ).'''
+
+  gData = groupShapeData()
+
+  if elemType == 'Default':
+    elemType = getElemType( groupCoords[0] )
+
+  rData = getReferenceShapeData( elemType , order , method )
+
+  gData.h     = rData.h
+  gData.dhdxi = rData.dhdxi
+
+  jac = einsum( 'eni,gnj->egij' , groupCoords , gData.dhdxi )
+
+  if jac.shape[2] == jac.shape[3]:
+    gData.dhdx   = einsum( 'gnk,egkj->egnj' , gData.dhdxi , linalg.inv( jac ) )
+    gData.weight = abs( linalg.det( jac ) ) * rData.weight
+  elif jac.shape[2] == 2 and jac.shape[3] == 1:
+    gData.weight = ( einsum( 'egij,egij->eg' , jac , jac )**0.5 ) * rData.weight
+
+  gData.x = einsum( 'gn,eni->egi' , gData.h , groupCoords )
+
+  return gData
+
+#------------------------------------------------------------------------------
+#  Geometry cache. The shape data of elements with a fixed geometry, such as 
+#  the small strain continuum elements, does not change during the analysis.
+#  When the cache is enabled in the properties of the element group, the 
+#  derivatives dhdx, the weights and the global coordinates of the 
+#  integration points are computed on first use and stored in one row of 
+#  compact arrays per element type:
+#
+#    ContElem = { type = "SmallStrainContinuum"; geometryCache = true;
+#                 cacheMemory = 200.; };
+#
+#  The optional cacheMemory is the memory budget of the group in MB. Elements
+#  that do not fit in the budget are evaluated every time.
+#
+#  With matrixCache = true, the arrays that the element derives from dhdx,
+#  such as the B matrices of the SmallStrainContinuum element, are stored as
+#  well, see getCachedGroupShapeData. The memory that is used by the arrays
+#  is reported in the log when they are created.
+#------------------------------------------------------------------------------
+
+class shapeDataStore:
+
+  '''Cached shape data of the elements of one type:
+       dhdx   ( nSlots , nIP , nNodes , rank )
+       weight ( nSlots , nIP )
+       x      ( nSlots , nIP , rank )
+     Only the first count rows are in use. The derived arrays, e.g. the B
+     matrices ( nSlots , nIP , nstr , nDof ), are stored in arrays. The 
+     first filled[name] rows of these arrays are in use.'''
+
+  def __init__( self , rData ):
+
+    self.rData  = rData
+    self.count  = 0
+    self.dhdx   = None
+    self.arrays = {}
+    self.filled = {}
+
+#------------------------------------------------------------------------------
+#
+#------------------------------------------------------------------------------
+
+class shapeDataCache:
+
+  def __init__( self , budget = None , storeArrays = False ):
+
+    self.budget      = budget
+    self.nBytes      = 0
+    self.full        = False
+    self.stores      = {}
+    self.storeArrays = storeArrays
+    self.skipped     = set()
+    self.lock        = Lock()
+
+#------------------------------------------------------------------------------
+#  The lock can not be pickled, e.g. when the elements are sent to the 
+#  workers of the ProcessPoolAssembler
+#------------------------------------------------------------------------------
+
+  def __getstate__( self ):
+
+    state = self.__dict__.copy()
+    del state['lock']
+
+    return state
+
+  def __setstate__( self , state ):
+
+    self.__dict__.update( state )
+    self.lock = Lock()
+
+#------------------------------------------------------------------------------
+#  Returns the rows in the store of the elements in rows of a group, or None
+#  when not all elements are in the cache. The elements that are not in the
+#  cache are stored first, as far as the memory budget allows. The rows in 
+#  the store are kept in the array shapeSlots of owner, with -1 for the 
+#  elements that are not stored. The owner is the element on which the group
+#  kernels are called, or a single element with rows [0].
+#------------------------------------------------------------------------------
+
+  def getSlots( self , store , owner , rows , groupCoords ):
+
+    table = owner.__dict__.get( 'shapeSlots' )
+
+    if table is not None and len(table) > rows.max():
+      slots = table[rows]
+
+      if slots.min() >= 0:
+        return slots
+
+    if self.full:
+      return None
+
+    #Several threads may evaluate the same group, see ThreadPoolAssembler
+
+    with self.lock:
+      table = owner.__dict__.get( 'shapeSlots' )
+
+      if table is None or len(table) <= rows.max():
+        grown = full( max( rows.max() + 1 , 2 * len(table) if table is not None else 0 ) , -1 , dtype=int )
+
+        if table is not None:
+          grown[:len(table)] = table
+
+        owner.shapeSlots = table = grown
+
+      slots = table[rows]
+      new   = ( slots < 0 ).nonzero()[0]
+
+      if len(new) > 0:
+        gData = getGroupShapeData( groupCoords[new] )
+
+        if not hasattr( gData , 'dhdx' ):
+          return None
+
+        nBytes = ( gData.dhdx.nbytes + gData.weight.nbytes + gData.x.nbytes ) // len(new)
+        nNew   = len(new)
+
+        if self.budget is not None:
+          nNew = max( 0 , min( nNew , int( ( self.budget - self.nBytes ) // nBytes ) ) )
+          self.full = nNew < len(new)
+
+          if self.full:
+            logger.info("Geometry cache is full, %i elements are not stored" % ( len(new) - nNew ) )
+
+        if nNew > 0:
+          self.addRows( store , gData , nNew )
+          self.nBytes += nNew * nBytes
+
+          #The rows are assigned after the data is stored, other threads may
+          #read the rows without the lock
+
+          slots[new[:nNew]]       = arange( store.count , store.count + nNew )
+          table[rows[new[:nNew]]] = slots[new[:nNew]]
+          store.count            += nNew
+
+    if slots.min() < 0:
+      return None
+
+    return slots
+
+#------------------------------------------------------------------------------
+#  Appends the first n elements of gData to the store. The arrays are doubled
+#  in size when they are full; the old arrays remain valid for other threads.
+#------------------------------------------------------------------------------
+
+  def addRows( self , store , gData , n ):
+
+    if store.dhdx is None or store.count + n > len(store.dhdx):
+      size = max( store.count + n , 2 * store.count )
+
+      dhdx   = empty( ( size, ) + gData.dhdx.shape[1:] )
+      weight = empty( ( size, ) + gData.weight.shape[1:] )
+      x      = empty( ( size, ) + gData.x.shape[1:] )
+
+      if store.count > 0:
+        dhdx  [:store.count] = store.dhdx  [:store.count]
+        weight[:store.count] = store.weight[:store.count]
+        x     [:store.count] = store.x     [:store.count]
+
+      store.dhdx,store.weight,store.x = dhdx,weight,x
+
+    store.dhdx  [store.count:store.count+n] = gData.dhdx  [:n]
+    store.weight[store.count:store.count+n] = gData.weight[:n]
+    store.x     [store.count:store.count+n] = gData.x     [:n]
+
+#------------------------------------------------------------------------------
+#  Returns the array name of the elements in slots. The array is computed 
+#  from the stored dhdx with func on first use. None is returned when the
+#  array does not fit in the memory budget.
+#------------------------------------------------------------------------------
+
+  def getArray( self , store , name , func , slots ):
+
+    #The number of filled rows is read before the array, since the array is
+    #replaced by a larger one before the number of filled rows is updated
+
+    if store.filled.get( name , 0 ) > slots.max():
+      return takeRows( store.arrays[name] , slots )
+    elif name in self.skipped:
+      return None
+
+    with self.lock:
+      filled = store.filled.get( name , 0 )
+
+      if filled < store.count:
+        new = func( store.dhdx[filled:store.count] )
+
+        if self.budget is not None and self.nBytes + new.nbytes > self.budget:
+          logger.info("Geometry cache is full, %s arrays of %i elements ( %.1f MB ) are not stored" % \
+                      ( name , store.count - filled , new.nbytes / 1024.**2 ) )
+          self.skipped.add( name )
+          return None
+
+        data = store.arrays.get( name )
+
+        if data is None or len(data) < store.count:
+          grown = empty( ( len(store.dhdx), ) + new.shape[1:] )
+
+          if data is None:
+            logger.info("Storing %s arrays %s of %i elements ( %.1f MB ) in geometry cache" % \
+                        ( name , str(new.shape[1:]) , store.count - filled , new.nbytes / 1024.**2 ) )
+          else:
+            grown[:filled] = data[:filled]
+
+          store.arrays[name] = data = grown
+
+        data[filled:store.count] = new
+
+        self.nBytes        += new.nbytes
+        store.filled[name]  = store.count
+
+    return takeRows( store.arrays[name] , slots )
+
+#------------------------------------------------------------------------------
+#
+#------------------------------------------------------------------------------
+
+  def getStore( self , elemType ):
+
+    if elemType not in self.stores:
+      with self.lock:
+        if elemType not in self.stores:
+          self.stores[elemType] = shapeDataStore( getReferenceShapeData( elemType ) )
+
+    return self.stores[elemType]
+
+#------------------------------------------------------------------------------
+#
+#------------------------------------------------------------------------------
+
+  def getElemShapeData( self , element , elemCoords ):
+
+    store = self.getStore( getElemType( elemCoords ) )
+    slots = self.getSlots( store , element , zeros( 1 , dtype=int ) , elemCoords.reshape( (1,) + elemCoords.shape ) )
+
+    if slots is None:
+      return getElemShapeData( elemCoords )
+
+    slot = slots[0]
+
+    return fillElemShapeData( store.rData , store.dhdx[slot] , store.weight[slot] , store.x[slot] )
+
+#------------------------------------------------------------------------------
+#
+#------------------------------------------------------------------------------
+
+  def getGroupShapeData( self , element , rows , groupCoords , arrays = {} ):
+
+    store = self.getStore( getElemType( groupCoords[0] ) )
+    slots = self.getSlots( store , element , rows , groupCoords )
+
+    if slots is None:
+      return addGroupArrays( getGroupShapeData( groupCoords ) , arrays )
+
+    gData = groupShapeData()
+
+    gData.h      = store.rData.h
+    gData.dhdxi  = store.rData.dhdxi
+    gData.dhdx   = takeRows( store.dhdx   , slots )
+    gData.weight = takeRows( store.weight , slots )
+    gData.x      = takeRows( store.x      , slots )
+
+    for name,func in arrays.items():
+      data = None
+
+      if self.storeArrays:
+        data = self.getArray( store , name , func , slots )
+
+      if data is None:
+        data = func( gData.dhdx )
+
+      setattr( gData , name , data )
+
+    return gData
+
+#------------------------------------------------------------------------------
+#  Returns the rows slots of data. The elements of a group are usually stored
+#  in consecutive rows, in which case a view is returned instead of a copy.
+#  The returned arrays may not be modified.
+#------------------------------------------------------------------------------
+
+def takeRows( data , slots ):
+
+  if slots[-1] - slots[0] == len(slots) - 1 and ( diff( slots ) == 1 ).all():
+    return data[slots[0]:slots[-1]+1]
+
+  return data[slots]
+
+#------------------------------------------------------------------------------
+#  Adds the arrays that are derived from dhdx to gData, see 
+#  getCachedGroupShapeData.
+#------------------------------------------------------------------------------
+
+def addGroupArrays( gData , arrays ):
+
+  for name,func in arrays.items():
+    setattr( gData , name , func( gData.dhdx ) )
+
+  return gData
+
+#------------------------------------------------------------------------------
+#  Returns the geometry cache of an element group, or None when the cache is 
+#  not enabled in the group properties. The cache is stored in the shared 
+#  group properties as shapeCache.
+#------------------------------------------------------------------------------
+
+def getShapeDataCache( props ):
+
+  storeArrays = getattr( props , 'matrixCache' , False )
+
+  if not getattr( props , 'geometryCache' , False ) and not storeArrays:
+    return None
+
+  if not hasattr( props , 'shapeCache' ):
+    with cacheLock:
+      if not hasattr( props , 'shapeCache' ):
+        budget = getattr( props , 'cacheMemory' , None )
+
+        if budget is not None:
+          budget = budget * 1024**2
+
+        props.shapeCache = shapeDataCache( budget , storeArrays )
+
+  return props.shapeCache
+
+cacheLock = Lock()
+
+#------------------------------------------------------------------------------
+#  Returns the shape data of an element with a fixed geometry, taken from the
+#  geometry cache of its group when enabled.
+#------------------------------------------------------------------------------
+
+def getCachedElemShapeData( element , elemCoords ):
+
+  cache = getShapeDataCache( element.groupProps )
+
+  if cache is None:
+    return getElemShapeData( elemCoords )
+
+  return cache.getElemShapeData( element , elemCoords )
+
+#------------------------------------------------------------------------------
+#  Group version of getCachedElemShapeData, see getGroupShapeData, for the 
+#  elements in rows of the group of element, see pyfem.fem.Assembly. The 
+#  optional arrays is a dictionary of functions that compute an array with 
+#  shape ( nElem , nIP , ... ) from dhdx, e.g. { 'B' : getGroupBmatrix }. The
+#  result of each function is added to the shape data as an attribute with 
+#  the given name, and is stored in the cache when matrixCache is set.
+#------------------------------------------------------------------------------
+
+def getCachedGroupShapeData( element , rows , groupCoords , arrays = {} ):
+
+  cache = getShapeDataCache( element.groupProps )
+
+  if cache is None:
+    return addGroupArrays( getGroupShapeData( groupCoords ) , arrays )
+
+  return cache.getGroupShapeData( element , rows , groupCoords , arrays )